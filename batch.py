@@ -0,0 +1,40 @@
+import argparse
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+load_dotenv(".env")
+
+from src.batch import format_batch_report, load_households, run_batch
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="複数世帯のパイプラインを並列に実行します。")
+    parser.add_argument('households', help="世帯ごとのディレクトリを含むディレクトリ、またはマニフェスト（JSON）のパス")
+    parser.add_argument('--workers', type=int, default=None, help="同時に実行するプロセス数（既定はCPUコア数）")
+    parser.add_argument('--mode', choices=['full', 'delta'], default=os.getenv('RECORD_MODE', 'full'),
+                        help="recordデータの挿入モード（既定: RECORD_MODE または full）")
+    parser.add_argument('--dry-run', action='store_true', help="DBに接続せず、書き込む行数の表示だけを行う")
+    args = parser.parse_args()
+
+    db_config = {
+        'host': os.getenv('DB_HOST'),
+        'port': os.getenv('DB_PORT'),
+        'dbname': os.getenv('DB_NAME'),
+        'user': os.getenv('DB_USER'),
+        'password': os.getenv('DB_PASSWORD')
+    }
+
+    households = load_households(args.households)
+    print(f"🏠 {len(households)} 世帯を処理します。")
+
+    start = time.perf_counter()
+    results = run_batch(households, db_config, max_workers=args.workers, record_mode=args.mode, dry_run=args.dry_run)
+    print(format_batch_report(results, time.perf_counter() - start))
+
+    return 0 if all(result['ok'] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
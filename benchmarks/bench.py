@@ -0,0 +1,209 @@
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import pandas as pd
+from typing import Any, Callable
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from dotenv import load_dotenv
+
+from benchmarks.generate_data import generate_kakei_data
+from src.schema import BALANCE_SCHEMA, RECORD_SCHEMA, TRANSFER_SCHEMA, read_typed_csv
+from src.pipeline import load_meta, run_pipeline
+from src.transfer import process_transfer_df
+from src.add_card_info import process_record_df
+from src.make_final_balance import build_final_balance_df
+from src.record2db import RECORD_COLUMNS, _prepare_record_rows, insert_record_df_to_postgres
+from src.finalbalance2db import insert_final_balance_df_to_db
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+DEFAULT_SCALES = [1_000, 10_000, 100_000]
+BENCH_YEARS = 5
+
+
+def _timed(timings: dict[str, float], name: str, func: Callable[[], Any], repeat: int = 1) -> Any:
+    """func を repeat 回実行して最短時間を timings[name] に記録し、最後の戻り値を返す"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        best = min(best, time.perf_counter() - start)
+    timings[name] = best
+    print(f"  {name:<30} {best:>9.3f} 秒")
+    return value
+
+
+def _dry_run_sink(record_df: pd.DataFrame, final_df: pd.DataFrame) -> int:
+    """DBの代わりに、COPYに渡すのと同じCSVをメモリ上に書き出す（DBへの投入の前処理とシリアライズの時間を測る）"""
+    records = _prepare_record_rows(record_df)
+    buffer = io.StringIO()
+    records[list(RECORD_COLUMNS) + ['fingerprint']].to_csv(buffer, index=False, header=False)
+    final_df.to_csv(buffer, index=False, header=False)
+    return buffer.tell()
+
+
+def ensure_dataset(data_dir: str, scale: int, seed: int) -> str:
+    """record.csv がおよそ scale 行のデータセットを生成する（既にあれば再利用する）"""
+    out_dir = os.path.join(data_dir, f"scale_{scale}_seed_{seed}")
+    if not os.path.exists(os.path.join(out_dir, 'csvoutputs', 'balance.csv')):
+        print(f"🧪 {scale:,} 行のデータを生成中...")
+        generate_kakei_data(out_dir, years=BENCH_YEARS, tx_per_day=scale / (365 * BENCH_YEARS), seed=seed)
+    return out_dir
+
+
+def bench_scale(
+        data_dir: str,
+        scale: int,
+        seed: int,
+        db_config: dict[str, Any] | None,
+        repeat: int
+    ) -> dict[str, Any]:
+    """
+    1つの規模について、各ステージと全体の実行時間を測定する関数
+
+    Args:
+        data_dir (str): 生成データの保存先
+        scale (int): record.csv のおおよその行数
+        seed (int): 乱数のシード
+        db_config (dict[str, Any] | None): DB接続情報。None の場合はDBの代わりにメモリ上に書き出し、
+            run_pipeline は dry_run で実行する
+        repeat (int): 各ステージの繰り返し回数（最短時間を記録）
+
+    Returns:
+        dict[str, Any]: 規模・行数・ステージごとの時間
+    """
+    out_dir = ensure_dataset(data_dir, scale, seed)
+    csv_dir = os.path.join(out_dir, 'csvoutputs')
+    paths = {name: os.path.join(csv_dir, f"{name}.csv") for name in ('transfer', 'record', 'balance')}
+    meta_path = os.path.join(out_dir, 'meta.json')
+    meta = load_meta(meta_path)
+
+    print(f"📏 scale={scale:,}")
+    timings: dict[str, float] = {}
+    record_df = _timed(timings, 'read_record_csv',
+                       lambda: read_typed_csv(paths['record'], RECORD_SCHEMA, encoding='utf-8'), repeat)
+    transfer_df = _timed(timings, 'read_transfer_csv',
+                         lambda: read_typed_csv(paths['transfer'], TRANSFER_SCHEMA, encoding='utf-8'), repeat)
+    balance_df = _timed(timings, 'read_balance_csv', lambda: read_typed_csv(paths['balance'], BALANCE_SCHEMA), repeat)
+
+    bank_closures = meta.get('bank_closures', [])
+    transfer_flow_df = _timed(timings, 'process_transfer_df',
+                              lambda: process_transfer_df(transfer_df, meta['card_settings'], bank_closures=bank_closures), repeat)
+    record_flow_df = _timed(timings, 'process_record_df',
+                            lambda: process_record_df(record_df, meta['card_settings'], bank_closures), repeat)
+    final_df = _timed(
+        timings, 'build_final_balance_df',
+        lambda: build_final_balance_df(balance_df, [transfer_flow_df, record_flow_df], meta['accounts_ja_en']),
+        repeat
+    )
+
+    if db_config is None:
+        _timed(timings, 'sink_dry_run', lambda: _dry_run_sink(record_df, final_df), repeat)
+    else:
+        _timed(timings, 'insert_record_df_to_postgres',
+               lambda: insert_record_df_to_postgres(db_config, record_df, 'bench_kakeibo', 'full'), repeat)
+        _timed(timings, 'insert_final_balance_df_to_db',
+               lambda: insert_final_balance_df_to_db(db_config, final_df, meta['accounts_ja_en'], 'bench_kakeibo_2'), repeat)
+
+    # 全体の時間は、CSVの読み込みからDBへの投入（DBなしの場合は dry_run）までを run_pipeline で通しで測る
+    _timed(timings, 'run_pipeline', lambda: run_pipeline(
+        db_config or {}, paths['transfer'], paths['record'], paths['balance'], meta_path,
+        table_name_record='bench_kakeibo', table_name_final='bench_kakeibo_2', record_mode='full',
+        dry_run=db_config is None
+    ), repeat)
+
+    return {
+        'scale': scale,
+        'seed': seed,
+        'rows': {'record': len(record_df), 'transfer': len(transfer_df), 'balance': len(balance_df)},
+        'timings': timings,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(current: dict[str, Any], baseline: dict[str, Any]) -> None:
+    """
+    ベースラインの結果と比較し、ステージごとの時間の比を表示する関数
+    出力が変わっていないことは、テスト（tests/test_equivalence.py）で確認します。
+    """
+    baseline_runs = {(run['scale'], run['seed']): run for run in baseline['runs']}
+    print(f"🔍 ベースライン {baseline.get('label')} ({baseline.get('git_commit')}) との比較")
+    for run in current['runs']:
+        base = baseline_runs.get((run['scale'], run['seed']))
+        if base is None:
+            continue
+        print(f"📏 scale={run['scale']:,}")
+        for name, seconds in run['timings'].items():
+            if name in base['timings'] and base['timings'][name] > 0:
+                ratio = seconds / base['timings'][name]
+                print(f"  {name:<30} {base['timings'][name]:>9.3f} → {seconds:>9.3f} 秒（×{ratio:.2f}）")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="パイプラインの各ステージの実行時間を測定します。")
+    parser.add_argument('--scales', default=','.join(str(s) for s in DEFAULT_SCALES),
+                        help="record.csv の行数（カンマ区切り、例: 1000,10000,100000,1000000,10000000）")
+    parser.add_argument('--seed', type=int, default=0, help="データ生成の乱数シード")
+    parser.add_argument('--repeat', type=int, default=1, help="各ステージの繰り返し回数（最短時間を記録）")
+    parser.add_argument('--data-dir', default=os.path.join(RESULTS_DIR, 'data'), help="生成データの保存先")
+    parser.add_argument('--label', default=None, help="結果ファイルの名前（既定はgitのコミット）")
+    parser.add_argument('--db', action='store_true', help=".env のDBに実際に投入する（bench_kakeibo テーブルを使用）")
+    parser.add_argument('--baseline', default=None, help="比較するベースラインの結果ファイル")
+    args = parser.parse_args()
+
+    db_config = None
+    if args.db:
+        load_dotenv(os.path.join(ROOT_DIR, '.env'))
+        db_config = {
+            'host': os.getenv('DB_HOST'),
+            'port': os.getenv('DB_PORT'),
+            'dbname': os.getenv('DB_NAME'),
+            'user': os.getenv('DB_USER'),
+            'password': os.getenv('DB_PASSWORD')
+        }
+
+    commit = _git_commit()
+    result = {
+        'label': args.label or commit or 'unknown',
+        'git_commit': commit,
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'sink': 'postgres' if db_config else 'dry_run',
+        'runs': [
+            bench_scale(args.data_dir, int(scale), args.seed, db_config, args.repeat)
+            for scale in args.scales.split(',')
+        ],
+    }
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    result_path = os.path.join(RESULTS_DIR, f"{result['label']}.json")
+    with open(result_path, 'w') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"💾 {result_path} に保存しました。")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        compare_results(result, baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
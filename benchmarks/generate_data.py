@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+from typing import Any
+
+# カードの締め日・支払日のパターン（締め日, 支払月のオフセット, 支払日）
+# 月末締め（-1）、31日払い（短い月は月末）、翌々月払いを含めて add_credit_withdrawal_info の分岐を網羅する
+CARD_RULES = [
+    (15, 1, 10),
+    (-1, 1, 27),
+    (28, 2, 31),
+    (5, 1, 26),
+    (20, 2, 4),
+]
+
+# 支出・収入のカテゴリとサブカテゴリ
+EXPENSE_CATEGORIES = {
+    '食費': ['スーパー', '外食', 'カフェ', ''],
+    '日用品': ['ドラッグストア', '100円ショップ', ''],
+    '交通費': ['電車', 'バス', 'タクシー'],
+    '趣味・娯楽': ['書籍', '映画', ''],
+    '水道・光熱費': ['電気代', 'ガス代', '水道代'],
+}
+INCOME_CATEGORIES = {
+    '給与': ['給料', '賞与'],
+    'その他': ['', 'ポイント'],
+}
+PLACES = ['コンビニ', 'スーパーA', 'ドラッグストアB', '駅前', '', '']
+MEMOS = ['', '', '', 'まとめ買い', '立替分']
+
+
+def build_meta(n_banks: int = 2, n_cards: int = 3) -> dict[str, Any]:
+    """
+    生成するデータに対応する meta.json の内容を作る関数
+    口座は「財布」「銀行A」「銀行B」…、カードは「カードA」「カードB」…で、
+    カードの締め日・支払日は CARD_RULES を順に割り当て、引き落とし口座は銀行を順に割り当てます。
+
+    Args:
+        n_banks (int): 銀行口座の数
+        n_cards (int): クレジットカードの数
+
+    Returns:
+        dict[str, Any]: card_settings と accounts_ja_en を持つ設定
+    """
+    banks = [f"銀行{chr(ord('A') + i)}" for i in range(n_banks)]
+    cards = [f"カード{chr(ord('A') + i)}" for i in range(n_cards)]
+    card_settings = {}
+    for i, card in enumerate(cards):
+        closing_day, payment_offset, payment_day = CARD_RULES[i % len(CARD_RULES)]
+        card_settings[card] = {
+            'closing_day': closing_day,
+            'payment_offset_months': payment_offset,
+            'payment_day': payment_day,
+            'withdrawal_account': banks[i % n_banks],
+        }
+    accounts = {'財布': 'wallet'}
+    for i, name in enumerate(banks):
+        accounts[name] = f"bank_{chr(ord('a') + i)}"
+    for i, name in enumerate(cards):
+        accounts[name] = f"card_{chr(ord('a') + i)}"
+    return {'card_settings': card_settings, 'accounts_ja_en': accounts}
+
+
+def _records_for_days(rng: np.random.Generator, days: pd.DatetimeIndex, tx_per_day: float, meta: dict[str, Any]) -> pd.DataFrame:
+    """指定した日の収支レコードを、新しい日付が先頭になる順（カケイの出力と同じ順）で生成する"""
+    counts = rng.poisson(tx_per_day, len(days))
+    n = int(counts.sum())
+    day = np.repeat(days.to_numpy()[::-1], counts[::-1])
+    minutes = rng.integers(7 * 60, 24 * 60, n)
+    dates = pd.DatetimeIndex(day) + pd.to_timedelta(minutes, 'min')
+
+    is_income = rng.random(n) < 0.1
+    expense_category = rng.choice(list(EXPENSE_CATEGORIES), n)
+    income_category = rng.choice(list(INCOME_CATEGORIES), n)
+    category = np.where(is_income, income_category, expense_category)
+    subcategories = {**EXPENSE_CATEGORIES, **INCOME_CATEGORIES}
+    pick = rng.random(n)
+    sub_category = np.array([
+        subcategories[c][int(p * len(subcategories[c]))] for c, p in zip(category, pick)
+    ], dtype=object)
+
+    # 支出は数百円〜数万円、収入は数万円〜数十万円
+    amount = np.where(
+        is_income,
+        rng.lognormal(11.5, 0.6, n),
+        rng.lognormal(7.0, 1.1, n),
+    ).astype(np.int64).clip(1, 2_000_000)
+
+    banks = [name for name in meta['accounts_ja_en'] if name.startswith('銀行')]
+    cards = list(meta['card_settings'])
+    expense_accounts = ['財布'] + cards * 2 + banks
+    account = np.where(is_income, rng.choice(banks, n), rng.choice(expense_accounts, n))
+    payment_method = np.select(
+        [np.isin(account, cards), account == '財布'],
+        ['クレジットカード', '現金'],
+        default='口座振替',
+    )
+
+    return pd.DataFrame({
+        '日付': dates.strftime('%Y/%m/%d %H:%M'),
+        '収入/支出': np.where(is_income, '収入', '支出'),
+        'カテゴリ': category,
+        'サブカテゴリ': sub_category,
+        '金額': amount,
+        '店舗/場所': rng.choice(PLACES, n),
+        'メモ': rng.choice(MEMOS, n),
+        '入金/支払い方法': payment_method,
+        '銀行口座/カード等': account,
+        'タグ': '',
+    })
+
+
+def generate_kakei_data(
+        out_dir: str,
+        years: int = 5,
+        tx_per_day: float = 10.0,
+        n_banks: int = 2,
+        n_cards: int = 3,
+        start: str = '2019-01-01',
+        seed: int = 0,
+        chunk_days: int = 90
+    ) -> dict[str, Any]:
+    """
+    カケイの出力と同じ形式の balance.csv, record.csv, transfer.csv と meta.json を生成する関数
+    record.csv は chunk_days 日分ずつ生成して追記するため、行数が多くてもメモリ使用量は一定です。
+    同じ引数・seed からは常に同じファイルが生成されます。
+
+    Args:
+        out_dir (str): 出力ディレクトリ（{out_dir}/meta.json と {out_dir}/csvoutputs/*.csv を作成）
+        years (int): 生成する期間（年）
+        tx_per_day (float): 1日あたりの平均取引数
+        n_banks (int): 銀行口座の数
+        n_cards (int): クレジットカードの数
+        start (str): 開始日
+        seed (int): 乱数のシード
+        chunk_days (int): record.csv を一度に生成する日数
+
+    Returns:
+        dict[str, Any]: 生成したファイルの行数（record, transfer, balance）
+    """
+    rng = np.random.default_rng(seed)
+    csv_dir = os.path.join(out_dir, 'csvoutputs')
+    os.makedirs(csv_dir, exist_ok=True)
+
+    meta = build_meta(n_banks, n_cards)
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=4)
+
+    all_days = pd.date_range(start, periods=365 * years, freq='D')
+
+    # --- record.csv（新しい日付から順に追記） ---
+    record_rows = 0
+    record_path = os.path.join(csv_dir, 'record.csv')
+    with open(record_path, 'w', encoding='utf-8', newline='') as f:
+        for end in range(len(all_days), 0, -chunk_days):
+            chunk = _records_for_days(rng, all_days[max(end - chunk_days, 0):end], tx_per_day, meta)
+            chunk.to_csv(f, index=False, header=(record_rows == 0))
+            record_rows += len(chunk)
+
+    # --- transfer.csv（給料日後の現金の引き出しと、銀行間の振替） ---
+    banks = [name for name in meta['accounts_ja_en'] if name.startswith('銀行')]
+    n_transfers = max(len(all_days) // 7, 1)
+    transfer_days = all_days[np.sort(rng.integers(0, len(all_days), n_transfers))[::-1]]
+    from_account = rng.choice(banks, n_transfers)
+    to_account = np.where(rng.random(n_transfers) < 0.7, '財布', rng.choice(banks, n_transfers))
+    transfer = pd.DataFrame({
+        '日付': transfer_days.strftime('%Y/%m/%d'),
+        '金額': (rng.integers(1, 50, n_transfers) * 1000),
+        '出金': from_account,
+        '入金': to_account,
+        'メモ': rng.choice(['', 'ATM', '生活費'], n_transfers),
+    })
+    transfer = transfer[transfer['出金'] != transfer['入金']]
+    transfer.to_csv(os.path.join(csv_dir, 'transfer.csv'), index=False)
+
+    # --- balance.csv（各口座の残高を月に1回程度記録） ---
+    month_starts = pd.date_range(start, all_days[-1], freq='MS')
+    balance_rows = []
+    for account in meta['accounts_ja_en']:
+        offsets = rng.integers(0, 28, len(month_starts))
+        if account.startswith('カード'):
+            amounts = -rng.integers(0, 300_000, len(month_starts))
+        else:
+            amounts = rng.integers(0, 3_000_000, len(month_starts))
+        balance_rows.append(pd.DataFrame({
+            '日付': (month_starts + pd.to_timedelta(offsets, 'D')).strftime('%Y/%m/%d'),
+            '資産': account,
+            '金額': amounts,
+        }))
+    balance = pd.concat(balance_rows, ignore_index=True).sort_values('日付', ascending=False, kind='stable')
+    balance.to_csv(os.path.join(csv_dir, 'balance.csv'), index=False)
+
+    return {'record': record_rows, 'transfer': len(transfer), 'balance': len(balance)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="カケイ形式のテストデータを生成します。")
+    parser.add_argument('out_dir', help="出力ディレクトリ")
+    parser.add_argument('--years', type=int, default=5, help="期間（年）")
+    parser.add_argument('--tx-per-day', type=float, default=10.0, help="1日あたりの平均取引数")
+    parser.add_argument('--banks', type=int, default=2, help="銀行口座の数")
+    parser.add_argument('--cards', type=int, default=3, help="クレジットカードの数")
+    parser.add_argument('--start', default='2019-01-01', help="開始日")
+    parser.add_argument('--seed', type=int, default=0, help="乱数のシード")
+    args = parser.parse_args()
+
+    rows = generate_kakei_data(
+        args.out_dir, years=args.years, tx_per_day=args.tx_per_day,
+        n_banks=args.banks, n_cards=args.cards, start=args.start, seed=args.seed
+    )
+    print(f"✅ {args.out_dir} に生成しました: {rows}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,166 @@
+import argparse
 import os
+import sys
+import time
+from typing import Any, Callable
 from dotenv import load_dotenv
 
 load_dotenv(".env")
 
-from src import (
-    process_transfer_csv,
-    process_and_save_kakeibo_data,
-    generate_final_balance_df,
-    insert_final_balance_to_db,
-    insert_csv_to_postgres
+# pandas などを読み込む src.pipeline / src.streaming は、実行する時に初めて読み込む
+# （--help・--check・入力が変わっていない場合は数十ミリ秒で終わる）
+from src.config import (
+    PIPELINE_STAGES,
+    load_meta,
+    missing_input_files,
+    pipeline_stage_keys,
+    select_stages,
+    target_tables,
+    validate_meta,
 )
+from src.metrics import PipelineMetrics, recording
+from src.stage_cache import StageCache
 
-def main():
-    # 振替CSVファイルの処理
-    # input paths
-    input_transfer_path = './data/csvoutputs/transfer.csv'
-    input_record_path = './data/csvoutputs/record.csv'
-    input_balance_path="./data/csvoutputs/balance.csv"
 
-    # output paths
-    output_transfer_path = './output/transfer.csv'
-    output_record_path = './output/record.csv'
-    output_final_balance_path = './output/final_balance.csv'
+def stage_name(value: str) -> str:
+    """ステージ名、または PIPELINE_STAGES の番号（1始まり）をステージ名にする"""
+    if value.isdigit() and 1 <= int(value) <= len(PIPELINE_STAGES):
+        return PIPELINE_STAGES[int(value) - 1]
+    if value in PIPELINE_STAGES:
+        return value
+    raise argparse.ArgumentTypeError(f"存在しないステージです: {value}（--list-stages で一覧を表示します）")
 
-    # setting paths
-    card_settings_path = './meta.json'
-    table_name_record = 'kakeibo'
-    table_name_final = 'kakeibo_2'
+
+def tables_have_rows(db_config: dict[str, Any], tables: list[str]) -> bool | None:
+    """
+    テーブルが全て存在し、1行以上あるかを返す関数（pandas を読み込まずに psycopg2 だけで確認する）
+
+    Args:
+        db_config (dict[str, Any]): データベース接続情報
+        tables (list[str]): テーブル名
+
+    Returns:
+        bool | None: 全て存在して行があれば True、無いか空のテーブルがあれば False、DBに接続できなければ None
+    """
+    import psycopg2
+
+    try:
+        conn = psycopg2.connect(**db_config, connect_timeout=5)
+    except psycopg2.Error as e:
+        print(f"⚠️ テーブルを確認できません: {e}")
+        return None
+    try:
+        with conn.cursor() as cur:
+            for table in tables:
+                cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+                if not cur.fetchone()[0]:
+                    return False
+                cur.execute(f"SELECT EXISTS (SELECT 1 FROM {table})")
+                if not cur.fetchone()[0]:
+                    return False
+        return True
+    finally:
+        conn.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="カケイのCSVを変換してPostgreSQLに保存します。")
+
+    group = parser.add_argument_group("実行するステージ")
+    group.add_argument('--stage', dest='stages', action='append', type=stage_name, metavar='STAGE',
+                       help="このステージだけを実行する（名前または番号、複数指定可）。指定したステージはキャッシュを使わずに実行します")
+    group.add_argument('--from-stage', type=stage_name, metavar='STAGE', help="このステージ以降を実行する")
+    group.add_argument('--dry-run', action='store_true', help="DBに接続せず、書き込む行数の表示だけを行う")
+    group.add_argument('--force', action='store_true',
+                       help="キャッシュ・完了の記録・最終残高の差分計算の状態を使わず、全ステージを実行し直す")
+    group.add_argument('--check', action='store_true', help="設定と入力ファイルを確認するだけで終了する")
+    group.add_argument('--list-stages', action='store_true', help="ステージの一覧を表示して終了する")
+
+    group = parser.add_argument_group("入力・出力")
+    group.add_argument('--input-dir', default='./data/csvoutputs', help="カケイのCSVのディレクトリ（既定: %(default)s）")
+    group.add_argument('--transfer', help="transfer.csv のパス（既定: {input-dir}/transfer.csv）")
+    group.add_argument('--record', help="record.csv のパス（既定: {input-dir}/record.csv）")
+    group.add_argument('--balance', help="balance.csv のパス（既定: {input-dir}/balance.csv）")
+    group.add_argument('--meta', default='./meta.json', help="meta.json のパス（既定: %(default)s）")
+    group.add_argument('--state', default='./data/final_balance_state.json',
+                       help="最終残高の差分計算の状態ファイル（既定: %(default)s、空文字で毎回全期間を計算）")
+    group.add_argument('--cache-dir', default='./data/stage_cache',
+                       help="ステージキャッシュの保存先（既定: %(default)s、空文字でキャッシュを使わない）")
+    group.add_argument('--export-dir', default=os.getenv('EXPORT_DIR'), help="中間データの出力先（既定: EXPORT_DIR）")
+
+    group = parser.add_argument_group("データベース")
+    group.add_argument('--table-record', default='kakeibo', help="recordデータのテーブル名（既定: %(default)s）")
+    group.add_argument('--table-final', default='kakeibo_2', help="最終残高データのテーブル名（既定: %(default)s）")
+    group.add_argument('--record-mode', choices=['full', 'delta'], default=os.getenv('RECORD_MODE', 'full'),
+                       help="recordデータの挿入モード（既定: RECORD_MODE または full。delta は追加・削除された行だけを反映する）")
+    group.add_argument('--layout', choices=['wide', 'long', 'sparse'], default=os.getenv('FINAL_BALANCE_LAYOUT', 'wide'),
+                       help="最終残高データのレイアウト（既定: FINAL_BALANCE_LAYOUT または wide）")
+    group.add_argument('--chunk-size', type=int, default=os.getenv('RECORD_CHUNK_SIZE') or None,
+                       help="指定すると入力をこの行数ずつ読み込む省メモリモードで実行する（既定: RECORD_CHUNK_SIZE）")
+    return parser
+
+
+def main(
+        metrics: PipelineMetrics | None = None,
+        argv: list[str] | None = None,
+        on_final_balance: Callable[[Any, dict[str, str], Any], Any] | None = None
+    ) -> int:
+    """
+    パイプラインを実行する
+    webhook.py・watch.py からは引数なし（既定の設定）で呼び出されます。呼び出し方によらず、
+    設定・入力ファイルの問題は例外ではなく終了コード 2 で返すため、呼び出し側で終了コードを確認してください。
+
+    Args:
+        metrics (PipelineMetrics | None): 計測値の記録先。指定しない場合は trigger='cli' で作成する
+        argv (list[str] | None): コマンドライン引数。None の場合は既定の設定
+        on_final_balance (Callable | None): 最終残高データをDBに反映した後に呼び出す関数（run_pipeline に渡す）
+
+    Returns:
+        int: 終了コード（0: 成功・何もしない場合、2: 設定または入力ファイルに問題がある場合）
+    """
+    start = time.perf_counter()
+    parser = build_parser()
+    args = parser.parse_args([] if argv is None else argv)
+
+    if args.list_stages:
+        for number, stage in enumerate(PIPELINE_STAGES, start=1):
+            print(f"{number}. {stage}")
+        return 0
+
+    chunk_mode = bool(args.chunk_size)
+    if chunk_mode and (args.stages or args.from_stage):
+        parser.error("--chunk-size（省メモリモード）では、ステージを指定できません。")
+    if args.force and (args.stages or args.from_stage):
+        parser.error("--force は全ステージを実行するため、ステージを指定できません。")
+    stages = None if not (args.stages or args.from_stage) else select_stages(args.stages, args.from_stage)
+    if stages == []:
+        parser.error("実行するステージがありません。")
+
+    input_transfer_path = args.transfer or os.path.join(args.input_dir, 'transfer.csv')
+    input_record_path = args.record or os.path.join(args.input_dir, 'record.csv')
+    input_balance_path = args.balance or os.path.join(args.input_dir, 'balance.csv')
+    balance_state_path = args.state or None
+    stage_cache_dir = args.cache_dir or None
+
+    # --- 設定の確認（pandas を読み込む前に行う） ---
+    errors = [
+        f"入力ファイルがありません: {path}"
+        for path in missing_input_files([input_transfer_path, input_record_path, input_balance_path, args.meta])
+    ]
+    meta = None
+    if args.meta not in missing_input_files([args.meta]):
+        try:
+            meta = load_meta(args.meta)
+            errors.extend(validate_meta(meta))
+        except ValueError as e:
+            errors.append(f"meta.json を読み込めません: {e}")
+    if errors:
+        for error in errors:
+            print(f"❌ {error}")
+        return 2
+    if args.check:
+        print("✅ 設定と入力ファイルに問題はありません。")
+        return 0
 
     db_config = {
         'host': os.getenv('DB_HOST'),
@@ -36,45 +170,83 @@ def main():
         'password': os.getenv('DB_PASSWORD')
     }
 
-    # record.csvをPostgreSQLにインサート
-    insert_csv_to_postgres(
-        db_config, 
-        input_record_path=input_record_path,
-        table_name=table_name_record,
-    )
-    
-    # transfer(振替)データにクレジットカード情報を追加してCSV出力
-    process_transfer_csv(
-        input_transfer_path, 
-        card_settings_path, 
-        output_transfer_path
-    )
+    # 前回成功時と入力・設定が同じで、テーブルにもデータがあれば、pandas などを読み込まずに終了する
+    # （テーブルが削除された・空にされた場合は、キャッシュの記録によらず全ステージを実行し直す）
+    force = args.force
+    if not force and stages is None and not args.dry_run and not chunk_mode and stage_cache_dir:
+        cache = StageCache(stage_cache_dir)
+        keys = pipeline_stage_keys(
+            input_transfer_path, input_record_path, input_balance_path, meta,
+            args.table_record, args.table_final, args.record_mode, balance_state_path, args.layout
+        )
+        if all(cache.is_done(stage, keys[stage]) for stage in ('insert_csv_to_postgres', 'insert_final_balance_to_db')):
+            tables = target_tables(args.table_record, args.table_final, args.layout)
+            if tables_have_rows(db_config, tables) is False:
+                print(f"⚠️ {'・'.join(tables)} のいずれかが無いか空のため、全ステージを実行し直します。")
+                force = True
+            elif metrics is None:
+                print(f"⏭️ 入力が変わっていないため、何もしません（{time.perf_counter() - start:.3f} 秒）。")
+                return 0
 
-    # record(収支)データにクレジットカード情報を追加し、CSV出力
-    process_and_save_kakeibo_data(
-        input_record_path, 
-        output_record_path, 
-        card_settings_path
-    )
+    if force:
+        stages = list(PIPELINE_STAGES)
+        if balance_state_path and os.path.exists(balance_state_path) and not args.dry_run:
+            os.remove(balance_state_path)
+            print(f"🗑️ {balance_state_path} を削除し、最終残高データを全期間で作り直します。")
 
-    # 最終残高データの生成
-    final_balance_df = generate_final_balance_df(
-        balance_csv_path=input_balance_path,
-        transfer_csv_path=output_transfer_path,
-        record_csv_path=output_record_path,
-        meta_json_path=card_settings_path,
-        output_csv_path=output_final_balance_path
+    # 実行ごとの計測値は pipeline_runs / pipeline_stage_metrics テーブルに保存（ドライランでは表示のみ）
+    # PROFILE_DIR を設定すると、最も遅いステージの cProfile の結果をそこに保存
+    # コマンドラインから実行した場合（1回で終わるプロセス）だけ、ステージごとにピークメモリをリセットして測る
+    metrics = metrics or PipelineMetrics(
+        trigger='cli', profile_dir=os.getenv('PROFILE_DIR'), reset_peak_memory=argv is not None
     )
-    print("✅ 最終残高データの生成が完了しました。")
 
-    insert_final_balance_to_db(
-        db_config=db_config,
-        csv_file_path=output_final_balance_path,
-        meta_json_path=card_settings_path,
-        table_name=table_name_final,
-    )
+    import_start = time.perf_counter()
+    from src import run_pipeline, run_pipeline_streaming
+    import_seconds = time.perf_counter() - import_start
 
+    try:
+        with recording(metrics, db_config, save=not args.dry_run):
+            if chunk_mode:
+                run_pipeline_streaming(
+                    db_config,
+                    input_transfer_path=input_transfer_path,
+                    input_record_path=input_record_path,
+                    input_balance_path=input_balance_path,
+                    meta=meta,
+                    table_name_record=args.table_record,
+                    table_name_final=args.table_final,
+                    record_mode=args.record_mode,
+                    chunk_size=args.chunk_size,
+                    metrics=metrics,
+                    final_layout=args.layout,
+                    dry_run=args.dry_run,
+                    on_final_balance=on_final_balance,
+                )
+            else:
+                # 入力の読み込みからDBへの投入までをメモリ上で実行
+                run_pipeline(
+                    db_config,
+                    input_transfer_path=input_transfer_path,
+                    input_record_path=input_record_path,
+                    input_balance_path=input_balance_path,
+                    meta_json_path=args.meta,
+                    table_name_record=args.table_record,
+                    table_name_final=args.table_final,
+                    record_mode=args.record_mode,
+                    export_dir=args.export_dir,
+                    state_path=balance_state_path,
+                    cache_dir=stage_cache_dir,
+                    metrics=metrics,
+                    final_layout=args.layout,
+                    stages=stages,
+                    dry_run=args.dry_run,
+                    on_final_balance=on_final_balance,
+                )
+    finally:
+        print(f"⏱️ 合計 {time.perf_counter() - start:.2f} 秒（うちライブラリの読み込み {import_seconds:.2f} 秒）")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main(argv=sys.argv[1:]))
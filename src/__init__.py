@@ -1,5 +1,28 @@
-from src.transfer import process_transfer_csv
-from src.add_card_info import process_and_save_kakeibo_data
-from src.make_final_balance import generate_final_balance_df
-from src.finalbalance2db import insert_final_balance_to_db
-from src.record2db import insert_csv_to_postgres
\ No newline at end of file
+import importlib
+
+# 公開している関数と定義しているモジュールの対応
+# pandas・psycopg2 などの読み込みに時間がかかるため、参照された時に初めてモジュールを読み込む
+_EXPORTS = {
+    'process_transfer_csv': 'transfer',
+    'process_and_save_kakeibo_data': 'add_card_info',
+    'generate_final_balance_df': 'make_final_balance',
+    'insert_final_balance_to_db': 'finalbalance2db',
+    'insert_csv_to_postgres': 'record2db',
+    'load_meta': 'config',
+    'run_pipeline': 'pipeline',
+    'run_pipeline_streaming': 'streaming',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
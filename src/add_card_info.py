@@ -1,9 +1,31 @@
-import calendar
-import datetime
 import json
+import numpy as np
 import pandas as pd
 from typing import Any
 
+try:
+    from .dates import parse_kakei_dates
+    from .jp_calendar import roll_forward_to_business_day
+    from .schema import RECORD_SCHEMA, read_typed_csv
+except ImportError:  # src/ の中でスクリプトとして実行した場合（transfer.py の __main__）
+    from dates import parse_kakei_dates
+    from jp_calendar import roll_forward_to_business_day
+    from schema import RECORD_SCHEMA, read_typed_csv
+
+# record.csv のカラム名（英語）
+RECORD_COLUMNS_EN = [
+    'date', 
+    'type', 
+    'category', 
+    'subcategory', 
+    'amount',
+    'place', 
+    'memo', 
+    'payment_method', 
+    'account', 
+    'tag'
+]
+
 def load_and_process_csv(
         csv_file_path: str, 
         card_settings_path: str
@@ -19,88 +41,113 @@ def load_and_process_csv(
     """
     # JSONファイルの読み込みとカード設定取得
     with open(card_settings_path, "r") as f:
-        card_settings = json.load(f)["card_settings"]
+        meta = json.load(f)
 
     # CSV読み込み
-    df = pd.read_csv(csv_file_path, encoding='utf-8', parse_dates=['日付'])
+    df = read_typed_csv(csv_file_path, RECORD_SCHEMA, encoding='utf-8')
+
+    return process_record_df(df, meta["card_settings"], meta.get("bank_closures"))
+
+
+def process_record_df(
+        record_df: pd.DataFrame, 
+        card_settings: dict[str, Any],
+        bank_closures: list[str] | None = None
+    ) -> pd.DataFrame:
+    """
+    読み込み済みのrecordデータに対して、カラム名の変換とクレジットカード情報の追加処理を行う
+    入力のデータフレームは変更しません。
+    
+    parameters:
+        record_df (pd.DataFrame): 日本語カラムのrecordデータ（RECORD_SCHEMA で読み込んだもの）
+        card_settings (dict[str, Any]): カード設定情報の辞書
+        bank_closures (list[str] | None): meta.json の bank_closures（祝日以外の銀行の休業日）
+    returns:
+        pd.DataFrame: 処理後のデータフレーム
+    """
     # カラム名変換（日本語 → 英語）
-    df.columns = [
-        'date', 
-        'type', 
-        'category', 
-        'subcategory', 
-        'amount',
-        'place', 
-        'memo', 
-        'payment_method', 
-        'account', 
-        'tag'
-    ]
+    df = record_df.copy()
+    df.columns = RECORD_COLUMNS_EN
 
     # クレジットカード関連情報を付加
-    df = add_credit_withdrawal_info(df, card_settings)
+    df = add_credit_withdrawal_info(df, card_settings, bank_closures)
 
     return df
 
 
+def _month_start(months: np.ndarray) -> np.ndarray:
+    """1970年1月からの経過月数を、その月の1日（datetime64[D]）に変換する"""
+    return months.astype('datetime64[M]').astype('datetime64[D]')
+
+
+def _days_in_month(months: np.ndarray) -> np.ndarray:
+    """1970年1月からの経過月数ごとに、その月の日数を返す"""
+    return (_month_start(months + 1) - _month_start(months)).astype(np.int64)
+
+
 def add_credit_withdrawal_info(
         df: pd.DataFrame, 
-        card_settings: dict[str, Any]
+        card_settings: dict[str, Any],
+        bank_closures: list[str] | None = None
     ) -> pd.DataFrame:
     """
     クレジットカードの引き落とし情報を付与する関数
     この関数は、データフレームの各行に対して、クレジットカードの引き落とし日と引き落とし口座を計算し、追加のカラムを生成します。
     もしアカウントがクレジットカード設定に存在しない場合は、元の引き落とし日と口座をそのまま使用します。
+    締め日・支払日の計算は行ごとのPythonループではなく、NumPyのdatetime64演算で列全体に対してまとめて行います。
+    支払日が銀行の休業日（土日・祝日・年末年始・bank_closures）の場合は、翌営業日を引き落とし日とします。
+    カード利用の行の日付が欠損している場合は、引き落とし日を計算できないため ValueError になります。
     
     parameters:
         df (pd.DataFrame): 入力のデータフレーム
         card_settings (dict[str, Any]): カード設定情報の辞書
+        bank_closures (list[str] | None): 祝日以外の銀行の休業日（'YYYY-MM-DD'）
     returns:
         pd.DataFrame: クレジットカード引き落とし情報を追加したデータフレーム
 """
-    def get_next_weekday(year, month, day):
-        """土日なら次の平日に"""
-        dt = datetime.date(year, month, day)
-        while dt.weekday() >= 5:  # 土日
-            dt += datetime.timedelta(days=1)
-        return dt
-
-    def calculate_withdrawal_info(row):
-        account = row['account']
-        tx_date = pd.to_datetime(row['date']).date()
-        if account in card_settings:
-            config = card_settings[account]
-            closing_day = config['closing_day']
-            payment_offset = config['payment_offset_months']
-            payment_day = config['payment_day']
-            withdrawal_account = config['withdrawal_account']
-
-            # 月末締めの場合
-            if closing_day == -1:
-                closing_day = calendar.monthrange(tx_date.year, tx_date.month)[1]
-
-            closing_date = datetime.date(tx_date.year, tx_date.month, closing_day)
-            if tx_date > closing_date:
-                next_month = tx_date.month + 1
-                next_year = tx_date.year + (next_month - 1) // 12
-                next_month = (next_month - 1) % 12 + 1
-                last_day = calendar.monthrange(next_year, next_month)[1]
-                real_closing_day = min(closing_day, last_day)
-                closing_date = datetime.date(next_year, next_month, real_closing_day)
-
-            payment_month = closing_date.month + payment_offset
-            payment_year = closing_date.year + (payment_month - 1) // 12
-            payment_month = (payment_month - 1) % 12 + 1
-
-            last_day = calendar.monthrange(payment_year, payment_month)[1]
-            raw_payment_day = min(payment_day, last_day)
-            payment_date = get_next_weekday(payment_year, payment_month, raw_payment_day)
-
-            return pd.Series([payment_date, withdrawal_account])
-        else:
-            return pd.Series([row['date'], row['account']])
-
-    df[['withdrawal_date', 'withdrawal_account']] = df.apply(calculate_withdrawal_info, axis=1)
+    account = df['account']
+    is_card = account.isin(list(card_settings.keys())).to_numpy()
+
+    # 日付の解析は列全体で1回だけ行い、カード以外の行は利用日時をそのまま引き落とし日とする
+    dates = parse_kakei_dates(df['date'])
+    withdrawal_date = dates.to_numpy(copy=True)
+    withdrawal_account = account.astype(object).to_numpy(copy=True)
+
+    if is_card.any():
+        # カード設定を表にして、カード利用行ごとの設定値を列として取り出す
+        settings = pd.DataFrame.from_dict(card_settings, orient='index').reindex(account[is_card].to_numpy())
+        closing_day = settings['closing_day'].to_numpy(np.int64)
+        payment_offset = settings['payment_offset_months'].to_numpy(np.int64)
+        payment_day = settings['payment_day'].to_numpy(np.int64)
+
+        tx_date = dates.to_numpy()[is_card].astype('datetime64[D]')
+        # NaT は datetime64 の演算では例外にならず、でたらめな支払日になるため先に確認する
+        missing = np.isnat(tx_date)
+        if missing.any():
+            raise ValueError(f"日付の無いカード利用の行があるため、引き落とし日を計算できません: {int(missing.sum())} 行")
+        tx_month = tx_date.astype('datetime64[M]').astype(np.int64)
+        tx_day = (tx_date - _month_start(tx_month)).astype(np.int64) + 1
+        tx_last_day = _days_in_month(tx_month)
+
+        # 月末締めの場合
+        closing_day = np.where(closing_day == -1, tx_last_day, closing_day)
+        if (closing_day > tx_last_day).any() or (closing_day < 1).any():
+            raise ValueError("day is out of range for month")
+
+        # 締め日を過ぎていれば翌月締め
+        closing_month = tx_month + (tx_day > closing_day)
+
+        payment_month = closing_month + payment_offset
+        raw_payment_day = np.minimum(payment_day, _days_in_month(payment_month))
+        payment_date = roll_forward_to_business_day(
+            _month_start(payment_month) + (raw_payment_day - 1), bank_closures or ()
+        )
+
+        withdrawal_date[is_card] = payment_date.astype(withdrawal_date.dtype)
+        withdrawal_account[is_card] = settings['withdrawal_account'].to_numpy(object)
+
+    df['withdrawal_date'] = pd.Series(withdrawal_date, index=df.index)
+    df['withdrawal_account'] = pd.Series(withdrawal_account, index=df.index, dtype=object)
     return df
 
 def process_and_save_kakeibo_data(
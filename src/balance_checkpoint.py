@@ -0,0 +1,220 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from typing import Any
+
+from .make_final_balance import prepare_balance_events, build_daily_balance_df
+
+# 状態ファイルの形式が変わった場合に上げる
+STATE_VERSION = 1
+
+
+def daily_event_digests(
+        flow_events: pd.DataFrame,
+        balance_events: pd.DataFrame
+    ) -> dict[str, str]:
+    """
+    日ごとのイベント内容のダイジェストを計算する関数
+    その日のイベント（アカウント・金額・残高）が1件でも変われば、その日のダイジェストも変わります。
+
+    Args:
+        flow_events (pd.DataFrame): prepare_balance_events が返す入出金イベント
+        balance_events (pd.DataFrame): prepare_balance_events が返す残高イベント
+
+    Returns:
+        dict[str, str]: 日付（YYYY-MM-DD）→ ダイジェスト（16進数）
+    """
+    events = pd.concat([flow_events, balance_events], ignore_index=True, sort=False)
+    events = events[events['event_date'].notna()]
+    if events.empty:
+        return {}
+
+    # 同日の残高イベントは後勝ちなので、出現順も内容に含める
+    ordinal = events.groupby(['account', 'event_date', 'is_balance_event'], observed=True).cumcount()
+    row_hash = pd.util.hash_pandas_object(
+        events[['account', 'event_date', '収支', 'is_balance_event', 'balance']].assign(
+            ordinal=ordinal.where(events['is_balance_event'] == 1, 0)
+        ),
+        index=False
+    )
+    # uint64 の和は順序に依存しない（桁あふれは 2**64 を法として扱う）
+    digests = row_hash.groupby(events['event_date'].dt.strftime('%Y-%m-%d')).sum()
+    return {day: f"{int(value):016x}" for day, value in digests.items()}
+
+
+def load_balance_state(state_path: str) -> dict[str, Any] | None:
+    """
+    前回実行時の最終残高の状態（ダイジェストとチェックポイント）を読み込む関数
+
+    Args:
+        state_path (str): 状態ファイルのパス
+
+    Returns:
+        dict[str, Any] | None: 状態。ファイルが無い、または形式が古い場合は None
+    """
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path, "r") as f:
+        state = json.load(f)
+    if state.get("version") != STATE_VERSION:
+        return None
+    return state
+
+
+def save_balance_state(state_path: str, state: dict[str, Any]) -> None:
+    """
+    最終残高の状態を書き出す関数
+    書きかけのファイルが残らないよう、一時ファイルに書いてから置き換えます。
+
+    Args:
+        state_path (str): 状態ファイルのパス
+        state (dict[str, Any]): build_final_balance_df_incremental が返す状態
+
+    Returns:
+        None
+    """
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, state_path)
+
+
+def _month_end_checkpoints(final_df: pd.DataFrame, account_names: list[str]) -> dict[str, dict[str, float | None]]:
+    """最終残高データから、月末時点の各アカウントの残高を取り出す"""
+    month_end = final_df[final_df['date'].dt.is_month_end]
+    balances = month_end[[f'{account}_残高' for account in account_names]].set_axis(account_names, axis=1)
+    balances.index = month_end['date'].dt.strftime('%Y-%m-%d')
+    balances = balances.astype(object).where(balances.notna(), None)
+    return balances.to_dict('index')
+
+
+def build_final_balance_df_incremental(
+        balance_df: pd.DataFrame,
+        flow_dfs: list[pd.DataFrame],
+        accounts: dict[str, str],
+        state: dict[str, Any] | None
+    ) -> tuple[pd.DataFrame, pd.Timestamp | None, dict[str, Any]]:
+    """
+    前回の状態を使って、変更のあった日以降だけ最終残高データを再計算する関数
+    日ごとのイベントのダイジェストを前回と比べて最も早く変わった日を求め、
+    その直前の月末チェックポイントの残高から再計算します。
+    前回の状態が無い場合や、アカウント構成・開始日が変わった場合は全期間を計算します。
+
+    Args:
+        balance_df (pd.DataFrame): balance.csv のデータ（日付は解析済み）
+        flow_dfs (list[pd.DataFrame]): クレジットカード情報付加済みの収支データ（振替・収支）のリスト
+        accounts (dict[str, str]): meta.json の accounts_ja_en
+        state (dict[str, Any] | None): load_balance_state で読み込んだ前回の状態
+
+    Returns:
+        tuple[pd.DataFrame, pd.Timestamp | None, dict[str, Any]]:
+            再計算した期間の最終残高データ、
+            その開始日（全期間を計算した場合は None）、
+            DBへの反映後に save_balance_state で保存する新しい状態
+    """
+    account_names = list(accounts.keys())
+    flow_events, balance_events, date_range = prepare_balance_events(balance_df, flow_dfs, accounts)
+    digests = daily_event_digests(flow_events, balance_events)
+
+    new_state = {
+        "version": STATE_VERSION,
+        "accounts": account_names,
+        "start_date": date_range[0].strftime('%Y-%m-%d') if len(date_range) else None,
+        "end_date": date_range[-1].strftime('%Y-%m-%d') if len(date_range) else None,
+        "day_digests": digests,
+    }
+
+    # --- 再計算の開始位置 ---
+    checkpoint_date = None
+    if (
+        state is not None
+        and state["accounts"] == account_names
+        and state["start_date"] == new_state["start_date"]
+    ):
+        old_digests = state["day_digests"]
+        changed_days = [
+            day for day in set(old_digests) | set(digests)
+            if old_digests.get(day) != digests.get(day)
+        ]
+        if not changed_days:
+            print("✅ 最終残高データに変更はありません。")
+            new_state["checkpoints"] = state["checkpoints"]
+            return build_daily_balance_df(
+                flow_events.iloc[:0], balance_events.iloc[:0], date_range[:0], account_names
+            ), date_range[-1] + pd.Timedelta(days=1), new_state
+
+        earliest_change = min(changed_days)
+        earlier_checkpoints = [day for day in state["checkpoints"] if day < earliest_change]
+        if earlier_checkpoints:
+            checkpoint_date = max(earlier_checkpoints)
+
+    if checkpoint_date is None:
+        final_df = build_daily_balance_df(flow_events, balance_events, date_range, account_names)
+        new_state["checkpoints"] = _month_end_checkpoints(final_df, account_names)
+        return final_df, None, new_state
+
+    # --- チェックポイントからの再計算 ---
+    checkpoint = pd.Timestamp(checkpoint_date, tz='UTC')
+    window_start = checkpoint + pd.Timedelta(days=1)
+    carried = {
+        account: balance
+        for account, balance in state["checkpoints"][checkpoint_date].items()
+        if balance is not None
+    }
+    # チェックポイント時点の残高を、チェックポイント日の残高イベントとして与える
+    carried_events = pd.DataFrame({
+        'account': list(carried.keys()),
+        'event_date': checkpoint,
+        '収支': 0.0,
+        'is_balance_event': 1,
+        'balance': np.array(list(carried.values()), dtype='float64'),
+    })
+    window_range = pd.date_range(start=checkpoint, end=date_range[-1], freq='D', tz='UTC')
+    window_df = build_daily_balance_df(
+        flow_events[flow_events['event_date'] >= window_start],
+        pd.concat([
+            carried_events,
+            balance_events[balance_events['event_date'] >= window_start]
+        ], ignore_index=True, sort=False),
+        window_range,
+        account_names
+    ).iloc[1:].reset_index(drop=True)
+
+    new_state["checkpoints"] = {
+        day: balances for day, balances in state["checkpoints"].items() if day <= checkpoint_date
+    }
+    new_state["checkpoints"].update(_month_end_checkpoints(window_df, account_names))
+    print(f"♻️ {window_start.strftime('%Y-%m-%d')} 以降の最終残高データを再計算しました。")
+    return window_df, window_start, new_state
+
+
+def merge_final_balance_window(
+        previous_df: pd.DataFrame | None,
+        window_df: pd.DataFrame,
+        from_date: pd.Timestamp,
+        state: dict[str, Any]
+    ) -> pd.DataFrame | None:
+    """
+    build_final_balance_df_incremental が再計算した期間の最終残高データを、前回の全期間の最終残高データの
+    from_date より前の行とつなげて、全期間の最終残高データにする関数
+
+    Args:
+        previous_df (pd.DataFrame | None): 前回の全期間の最終残高データ
+        window_df (pd.DataFrame): 再計算した from_date 以降の最終残高データ
+        from_date (pd.Timestamp): 再計算した期間の開始日
+        state (dict[str, Any]): build_final_balance_df_incremental が返した新しい状態
+
+    Returns:
+        pd.DataFrame | None: 全期間の最終残高データ。前回のデータが無い、または列・期間が合わない場合は None
+    """
+    if previous_df is None or list(previous_df.columns) != list(window_df.columns) or state["start_date"] is None:
+        return None
+    full_df = pd.concat([previous_df[previous_df['date'] < from_date], window_df], ignore_index=True)
+
+    # 開始日から終了日まで1日ずつ揃っていなければ使わない（前回のデータが一部の期間だけの場合など）
+    days = (pd.Timestamp(state["end_date"]) - pd.Timestamp(state["start_date"])).days + 1
+    if len(full_df) != days or full_df['date'].iloc[0].strftime('%Y-%m-%d') != state["start_date"]:
+        return None
+    return full_df
@@ -0,0 +1,245 @@
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from typing import Any, Callable
+
+from .db_utils import get_connection, release_connection
+
+DAY = pd.Timedelta(days=1)
+
+# 1系列あたりの点の数の上限（Grafana の maxDataPoints が指定されない場合）
+DEFAULT_MAX_POINTS = 1000
+
+
+def to_series_frame(final_df: pd.DataFrame, assets: dict[str, str]) -> pd.DataFrame:
+    """
+    最終残高データを、日付（UTC、タイムゾーンなし）のインデックスと {account}_flow / {account}_balance 列を持つ
+    float64 のデータフレームにする関数（列名は最終残高テーブルと同じ英語名）
+
+    Args:
+        final_df (pd.DataFrame): build_final_balance_df の出力（またはその一部の期間）
+        assets (dict[str, str]): meta.json の accounts_ja_en
+
+    Returns:
+        pd.DataFrame: 日付順の時系列データ
+    """
+    dates = pd.DatetimeIndex(final_df['date'])
+    if dates.tz is not None:
+        dates = dates.tz_convert('UTC').tz_localize(None)
+    columns = [f"{account}_{value}" for account in assets.values() for value in ["flow", "balance"]]
+    return pd.DataFrame(
+        final_df.iloc[:, 1:].to_numpy(dtype='float64', na_value=np.nan),
+        index=dates.rename('date'),
+        columns=columns,
+    )
+
+
+def load_series_frame_from_db(db_config: dict[str, Any], table_name: str) -> pd.DataFrame:
+    """
+    最終残高テーブル（横持ちのテーブル、または縦持ちレイアウトの互換ビュー）を to_series_frame と同じ形で読み込む関数
+
+    Args:
+        db_config (dict[str, Any]): データベース接続情報
+        table_name (str): 最終残高データのテーブル名
+
+    Returns:
+        pd.DataFrame: 日付順の時系列データ
+    """
+    conn = get_connection(db_config)
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT * FROM {table_name} ORDER BY date")
+        names = [column.name for column in cur.description]
+        df = pd.DataFrame(cur.fetchall(), columns=names)
+        conn.rollback()
+    finally:
+        cur.close()
+        release_connection(conn)
+    columns = [name for name in names if name not in ('id', 'date')]
+    return pd.DataFrame(
+        df[columns].to_numpy(dtype='float64', na_value=np.nan),
+        index=pd.DatetimeIndex(pd.to_datetime(df['date']), name='date'),
+        columns=columns,
+    )
+
+
+class BalanceSeriesStore:
+    """
+    最終残高データをメモリ上に持ち、Grafana からの期間・間隔を指定したクエリに答えるクラス
+    期間が長い場合は1系列 max_points 点以下に間引きます（残高は各区間の最終日の値、収支は区間の合計）。
+    間引いた結果は (データの世代, 系列, 期間, 区間の日数) ごとに LRU キャッシュに保存し、データを更新するとキャッシュを破棄します。
+    キャッシュには間引いた結果だけを保存し、データフレームは持ちません。
+    データが無い場合は、最初のクエリで loader から読み込みます。
+    """
+
+    def __init__(
+            self,
+            loader: Callable[[], pd.DataFrame] | None = None,
+            cache_size: int = 256,
+            max_points: int = DEFAULT_MAX_POINTS
+        ) -> None:
+        """
+        Args:
+            loader (Callable[[], pd.DataFrame] | None): データが無い時に時系列データを読み込む関数（load_series_frame_from_db など）
+            cache_size (int): キャッシュする間引き結果の件数
+            max_points (int): 1系列あたりの点の数の上限
+        """
+        self.loader = loader
+        self.max_points = max_points
+        self._lock = threading.Lock()
+        self._frame: pd.DataFrame | None = None
+        self._generation = 0
+        self._cache: OrderedDict[tuple, tuple[list[int], dict[str, list[float | None]]]] = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+    def replace(self, frame: pd.DataFrame | None) -> None:
+        """時系列データを入れ替え、キャッシュを破棄する（None の場合は次のクエリで loader から読み込む）"""
+        with self._lock:
+            self._frame = frame
+            self._generation += 1
+            self._cache.clear()
+
+    def update(self, final_df: pd.DataFrame, assets: dict[str, str], from_date: pd.Timestamp | None = None) -> None:
+        """
+        パイプラインの実行結果を反映する（run_pipeline の on_final_balance に渡す）
+        from_date を指定した場合は、from_date 以降の行だけを final_df で置き換えます。
+
+        Args:
+            final_df (pd.DataFrame): 最終残高データ（from_date を指定した場合は from_date 以降の行）
+            assets (dict[str, str]): meta.json の accounts_ja_en
+            from_date (pd.Timestamp | None): 置き換える期間の開始日。None の場合は全期間
+        """
+        frame = to_series_frame(final_df, assets)
+        with self._lock:
+            current = self._frame
+        if from_date is not None and current is not None and list(current.columns) == list(frame.columns):
+            start = pd.Timestamp(from_date)
+            if start.tz is not None:
+                start = start.tz_convert('UTC').tz_localize(None)
+            frame = pd.concat([current[current.index < start], frame])
+        elif from_date is not None:
+            # 前の期間のデータが無い（構成が違う）場合は、次のクエリでDBから読み込み直す
+            frame = None
+        self.replace(frame)
+
+    def _snapshot(self) -> tuple[int, pd.DataFrame]:
+        with self._lock:
+            if self._frame is None and self.loader is not None:
+                self._frame = self.loader()
+                self._generation += 1
+            frame = self._frame if self._frame is not None else pd.DataFrame(index=pd.DatetimeIndex([], name='date'))
+            return self._generation, frame
+
+    def series_names(self) -> list[str]:
+        """クエリできる系列名（{account}_flow / {account}_balance）"""
+        return list(self._snapshot()[1].columns)
+
+    def status(self) -> dict[str, Any]:
+        """データの件数とキャッシュの状態を返す"""
+        generation, frame = self._snapshot()
+        with self._lock:
+            cache = {
+                "hits": self._cache_hits, "misses": self._cache_misses,
+                "size": len(self._cache), "max_size": self._cache_size,
+            }
+        return {
+            "generation": generation,
+            "days": len(frame),
+            "series": len(frame.columns),
+            "cache": cache,
+        }
+
+    def query(
+            self,
+            series: list[str],
+            start: pd.Timestamp,
+            end: pd.Timestamp,
+            interval_ms: int | None = None,
+            max_points: int | None = None
+        ) -> tuple[list[int], dict[str, list[float | None]]]:
+        """
+        系列の start〜end の値を、間引いて返す関数
+        期間は日単位に丸めるため、Grafana の自動更新で期間の端が数秒ずれてもキャッシュを使えます。
+
+        Args:
+            series (list[str]): 系列名（{account}_flow / {account}_balance）
+            start (pd.Timestamp): 開始日時
+            end (pd.Timestamp): 終了日時
+            interval_ms (int | None): Grafana の intervalMs（1点あたりの間隔の目安、ミリ秒）
+            max_points (int | None): 1系列あたりの点の数の上限。None の場合は self.max_points
+
+        Returns:
+            tuple[list[int], dict[str, list[float | None]]]: 各点の日時（UNIXミリ秒）と、系列名ごとの値
+
+        Raises:
+            KeyError: 存在しない系列を指定した場合
+        """
+        generation, frame = self._snapshot()
+        unknown = [name for name in series if name not in frame.columns]
+        if unknown:
+            raise KeyError(f"存在しない系列です: {', '.join(unknown)}")
+
+        start_day = _utc_naive(start).floor('D')
+        end_day = _utc_naive(end).floor('D')
+        days = max((end_day - start_day) // DAY + 1, 1)
+        bucket_days = max(
+            1,
+            math.ceil((interval_ms or 0) / (DAY / pd.Timedelta(milliseconds=1))),
+            math.ceil(days / (max_points or self.max_points)),
+        )
+        key = (generation, tuple(series), start_day, end_day, bucket_days)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self._cache_hits += 1
+                return cached
+            self._cache_misses += 1
+
+        # 間引きはロックの外で、クエリの時点（generation）のデータに対して行う
+        result = self._downsample(frame, key[1], start_day, end_day, bucket_days)
+        with self._lock:
+            # 間引いている間に replace された場合は、古い世代の結果をキャッシュに戻さない
+            if generation == self._generation and self._cache_size > 0:
+                self._cache[key] = result
+                if len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        return result
+
+    def _downsample(
+            self,
+            frame: pd.DataFrame,
+            series: tuple[str, ...],
+            start_day: pd.Timestamp,
+            end_day: pd.Timestamp,
+            bucket_days: int
+        ) -> tuple[list[int], dict[str, list[float | None]]]:
+        """frame の start_day〜end_day の行を bucket_days 日ごとの区間にまとめる（キャッシュの中身）"""
+        window = frame.iloc[frame.index.searchsorted(start_day):frame.index.searchsorted(end_day, side='right')]
+        if window.empty:
+            return [], {name: [] for name in series}
+
+        buckets = ((window.index - window.index[0]) // DAY).to_numpy() // bucket_days
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(window)] - 1
+        timestamps = window.index[ends].as_unit('ms').asi8.tolist()
+
+        values = {}
+        for name in series:
+            column = window[name].to_numpy()
+            if name.endswith('_flow'):
+                reduced = np.add.reduceat(np.nan_to_num(column), starts)
+            else:
+                reduced = column[ends]
+            values[name] = [None if math.isnan(value) else value for value in reduced.tolist()]
+        return timestamps, values
+
+
+def _utc_naive(value: pd.Timestamp) -> pd.Timestamp:
+    """日時をUTCのタイムゾーンなしの値にする"""
+    value = pd.Timestamp(value)
+    return value.tz_convert('UTC').tz_localize(None) if value.tz is not None else value
@@ -0,0 +1,216 @@
+import json
+import os
+import re
+import time
+import traceback
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any
+
+from .pipeline import run_pipeline
+
+# 世帯名はテーブル名の接頭辞に使うため、英小文字・数字・アンダースコアに限定する
+HOUSEHOLD_NAME_PATTERN = re.compile(r'^[a-z][a-z0-9_]*$')
+
+
+def household_config(name: str, base_dir: str, **overrides: Any) -> dict[str, Any]:
+    """
+    世帯ごとの入力パス・テーブル名などの設定を作る関数
+    既定では main.py と同じ構成（{base_dir}/meta.json, {base_dir}/csvoutputs/*.csv）を使い、
+    テーブル名は「{世帯名}_kakeibo」「{世帯名}_kakeibo_2」になります。
+
+    Args:
+        name (str): 世帯名（テーブル名の接頭辞）
+        base_dir (str): 世帯の入力ディレクトリ
+        **overrides: 既定値を上書きする設定（transfer, record, balance, meta, table_name_record など）
+
+    Returns:
+        dict[str, Any]: 世帯の設定
+    """
+    if not HOUSEHOLD_NAME_PATTERN.match(name):
+        raise ValueError(f"世帯名は英小文字・数字・アンダースコアで指定してください: {name}")
+
+    config = {
+        'name': name,
+        'transfer': os.path.join(base_dir, 'csvoutputs', 'transfer.csv'),
+        'record': os.path.join(base_dir, 'csvoutputs', 'record.csv'),
+        'balance': os.path.join(base_dir, 'csvoutputs', 'balance.csv'),
+        'meta': os.path.join(base_dir, 'meta.json'),
+        'table_name_record': f"{name}_kakeibo",
+        'table_name_final': f"{name}_kakeibo_2",
+        'state_path': os.path.join(base_dir, 'final_balance_state.json'),
+        'cache_dir': os.path.join(base_dir, 'stage_cache'),
+    }
+    config.update(overrides)
+    return config
+
+
+def _household_or_error(name: str, base_dir: str, **overrides: Any) -> dict[str, Any]:
+    """
+    household_config を作る。世帯名が使えない場合は、実行せずに失敗として報告する世帯（name, error のみ）にする
+    """
+    try:
+        return household_config(name, base_dir, **overrides)
+    except ValueError as e:
+        print(f"⚠️ {e}（この世帯は失敗として扱い、他の世帯は処理します）")
+        return {'name': name, 'error': str(e)}
+
+
+def load_households(path: str) -> list[dict[str, Any]]:
+    """
+    世帯の一覧を読み込む関数
+    path がディレクトリの場合は、meta.json を含むサブディレクトリを1世帯として扱います（ディレクトリ名が世帯名）。
+    path がJSONファイルの場合は、{"households": [{"name": ..., "dir": ..., ...}]} 形式のマニフェストとして読み込みます。
+    マニフェストの相対パスはマニフェストのあるディレクトリからの相対パスです。
+    世帯名が HOUSEHOLD_NAME_PATTERN に合わない世帯は、他の世帯を止めないよう error を持つ設定にし、
+    run_household で失敗として報告します。
+
+    Args:
+        path (str): 世帯ディレクトリの親ディレクトリ、またはマニフェストのパス
+
+    Returns:
+        list[dict[str, Any]]: 世帯の設定のリスト
+    """
+    if os.path.isdir(path):
+        return [
+            _household_or_error(name, os.path.join(path, name))
+            for name in sorted(os.listdir(path))
+            if os.path.isfile(os.path.join(path, name, 'meta.json'))
+        ]
+
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    root = os.path.dirname(os.path.abspath(path))
+    households = []
+    for entry in manifest['households']:
+        entry = dict(entry)
+        name = entry.pop('name')
+        base_dir = os.path.join(root, entry.pop('dir', name))
+        for key in ('transfer', 'record', 'balance', 'meta', 'state_path', 'cache_dir'):
+            if key in entry and entry[key] is not None:
+                entry[key] = os.path.join(root, entry[key])
+        households.append(_household_or_error(name, base_dir, **entry))
+    return households
+
+
+def run_household(
+        household: dict[str, Any],
+        db_config: dict[str, Any],
+        record_mode: str = 'full',
+        dry_run: bool = False
+    ) -> dict[str, Any]:
+    """
+    1世帯分のパイプラインを実行する関数（プロセスプールのワーカーで実行されます）
+    例外はここで捕まえて結果に含めるため、1世帯の失敗が他の世帯の処理に影響することはありません。
+
+    Args:
+        household (dict[str, Any]): household_config で作った世帯の設定
+        db_config (dict[str, Any]): データベース接続情報
+        record_mode (str): recordデータの挿入モード（'full' または 'delta'）
+        dry_run (bool): True の場合はDBに書き込まない（run_pipeline の dry_run）
+
+    Returns:
+        dict[str, Any]: name, ok, seconds, rows（最終残高データの行数）, error を持つ実行結果
+    """
+    start = time.perf_counter()
+    result = {'name': household['name'], 'ok': False, 'seconds': 0.0, 'rows': None, 'error': None}
+    if household.get('error'):
+        # load_households で設定を作れなかった世帯
+        result['error'] = household['error']
+        return result
+    try:
+        final_df = run_pipeline(
+            db_config,
+            input_transfer_path=household['transfer'],
+            input_record_path=household['record'],
+            input_balance_path=household['balance'],
+            meta_json_path=household['meta'],
+            table_name_record=household['table_name_record'],
+            table_name_final=household['table_name_final'],
+            record_mode=record_mode,
+            state_path=household.get('state_path'),
+            cache_dir=household.get('cache_dir'),
+            dry_run=dry_run,
+        )
+        result['ok'] = True
+        result['rows'] = None if final_df is None else len(final_df)
+    except Exception:
+        result['error'] = traceback.format_exc()
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def run_batch(
+        households: list[dict[str, Any]],
+        db_config: dict[str, Any],
+        max_workers: int | None = None,
+        record_mode: str = 'full',
+        dry_run: bool = False
+    ) -> list[dict[str, Any]]:
+    """
+    複数世帯のパイプラインをプロセスプールで並列に実行する関数
+
+    Args:
+        households (list[dict[str, Any]]): 世帯の設定のリスト
+        db_config (dict[str, Any]): データベース接続情報
+        max_workers (int | None): 同時に実行するプロセス数。None の場合はCPUコア数（世帯数が少なければ世帯数）
+        record_mode (str): recordデータの挿入モード（'full' または 'delta'）
+        dry_run (bool): True の場合はDBに書き込まない（run_pipeline の dry_run）
+
+    Returns:
+        list[dict[str, Any]]: 世帯ごとの実行結果（households と同じ順）
+    """
+    if not households:
+        return []
+    max_workers = max_workers or min(len(households), os.cpu_count() or 1)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(run_household, household, db_config, record_mode, dry_run): household['name']
+            for household in households
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception:
+                # ワーカープロセス自体が異常終了した場合
+                results[name] = {'name': name, 'ok': False, 'seconds': 0.0, 'rows': None,
+                                 'error': traceback.format_exc()}
+            status = "✅" if results[name]['ok'] else "❌"
+            print(f"{status} {name}: {results[name]['seconds']:.2f} 秒")
+    return [results[household['name']] for household in households]
+
+
+def _pad(text: str, width: int, right: bool = False) -> str:
+    """全角文字を2文字分として、表示幅が width になるように空白で埋める"""
+    display_width = sum(2 if unicodedata.east_asian_width(c) in 'WF' else 1 for c in text)
+    padding = ' ' * max(width - display_width, 0)
+    return padding + text if right else text + padding
+
+
+def format_batch_report(results: list[dict[str, Any]], elapsed: float) -> str:
+    """
+    世帯ごとの実行結果を表形式の文字列にする関数
+
+    Args:
+        results (list[dict[str, Any]]): run_batch の戻り値
+        elapsed (float): バッチ全体の実行時間（秒）
+
+    Returns:
+        str: レポート
+    """
+    width = max([4] + [len(result['name']) for result in results])
+    lines = [f"{_pad('世帯', width)}  結果  {_pad('秒', 8, right=True)}  {_pad('行数', 6, right=True)}"]
+    for result in results:
+        rows = '-' if result['rows'] is None else str(result['rows'])
+        lines.append(
+            f"{_pad(result['name'], width)}  {'成功' if result['ok'] else '失敗'}  {result['seconds']:>8.2f}  {rows:>6}"
+        )
+    failed = [result for result in results if not result['ok']]
+    lines.append(f"合計 {len(results)} 世帯（失敗 {len(failed)}）: {elapsed:.2f} 秒")
+    for result in failed:
+        lines.append(f"--- {result['name']} ---")
+        lines.append(result['error'].rstrip())
+    return "\n".join(lines)
@@ -0,0 +1,154 @@
+import json
+import os
+from typing import Any, Iterable
+
+from .stage_cache import file_digest, stage_key
+
+# pandas などの重い依存を読み込まずに使える、パイプラインの設定とステージの定義
+# （main.py の --help・設定の確認・何もしない実行を速く終わらせるため）
+
+# パイプラインのステージ（実行順。ステージ名は計測値の stage と同じ）
+PIPELINE_STAGES = (
+    'insert_csv_to_postgres',
+    'process_transfer_csv',
+    'process_and_save_kakeibo_data',
+    'generate_final_balance_df',
+    'insert_final_balance_to_db',
+)
+
+# DBに書き込むステージ（ドライランでは実行しない）
+DB_STAGES = ('insert_csv_to_postgres', 'insert_final_balance_to_db')
+
+# meta.json に必須の項目
+REQUIRED_META_KEYS = ('card_settings', 'accounts_ja_en')
+
+
+def load_meta(meta_json_path: str) -> dict[str, Any]:
+    """
+    meta.json を読み込む関数
+
+    Args:
+        meta_json_path (str): meta.jsonのパス
+
+    Returns:
+        dict[str, Any]: card_settings / accounts_ja_en などを含む設定
+    """
+    with open(meta_json_path, "r") as f:
+        return json.load(f)
+
+
+def validate_meta(meta: dict[str, Any]) -> list[str]:
+    """
+    meta.json の内容を確認し、問題の一覧を返す関数（問題が無ければ空のリスト）
+
+    Args:
+        meta (dict[str, Any]): meta.json の内容
+
+    Returns:
+        list[str]: 問題の説明
+    """
+    errors = [f"meta.json に {key} がありません。" for key in REQUIRED_META_KEYS if key not in meta]
+    for card, settings in meta.get('card_settings', {}).items():
+        missing = [
+            key for key in ('closing_day', 'payment_offset_months', 'payment_day', 'withdrawal_account')
+            if key not in settings
+        ]
+        if missing:
+            errors.append(f"card_settings.{card} に {', '.join(missing)} がありません。")
+    if not isinstance(meta.get('bank_closures', []), list):
+        errors.append("bank_closures は 'YYYY-MM-DD' のリストで指定してください。")
+    return errors
+
+
+def select_stages(stages: Iterable[str] | None = None, from_stage: str | None = None) -> list[str]:
+    """
+    実行するステージを PIPELINE_STAGES の順に並べて返す関数
+
+    Args:
+        stages (Iterable[str] | None): 実行するステージ。None の場合は全てのステージ
+        from_stage (str | None): このステージ以降のステージだけを実行する
+
+    Returns:
+        list[str]: 実行するステージ
+
+    Raises:
+        ValueError: 存在しないステージを指定した場合
+    """
+    selected = set(PIPELINE_STAGES if stages is None else stages)
+    unknown = (selected | ({from_stage} if from_stage else set())) - set(PIPELINE_STAGES)
+    if unknown:
+        raise ValueError(f"存在しないステージです: {', '.join(sorted(unknown))}（{', '.join(PIPELINE_STAGES)}）")
+    if from_stage:
+        selected &= set(PIPELINE_STAGES[PIPELINE_STAGES.index(from_stage):])
+    return [stage for stage in PIPELINE_STAGES if stage in selected]
+
+
+def pipeline_stage_keys(
+        input_transfer_path: str,
+        input_record_path: str,
+        input_balance_path: str,
+        meta: dict[str, Any],
+        table_name_record: str,
+        table_name_final: str,
+        record_mode: str,
+        state_path: str | None,
+        final_layout: str,
+        use_digests: bool = True
+    ) -> dict[str, str]:
+    """
+    run_pipeline の各ステージのキャッシュキー（入力ファイルの内容とmeta.jsonの該当部分・設定値から決まる）を作る関数
+
+    Args:
+        input_transfer_path (str): transfer.csv のパス
+        input_record_path (str): record.csv のパス
+        input_balance_path (str): balance.csv のパス
+        meta (dict[str, Any]): meta.json の内容
+        table_name_record (str): recordデータの挿入先テーブル名
+        table_name_final (str): 最終残高データの挿入先テーブル名
+        record_mode (str): recordデータの挿入モード
+        state_path (str | None): 最終残高の差分計算に使う状態ファイルのパス
+        final_layout (str): 最終残高データのレイアウト
+        use_digests (bool): False の場合はファイルの内容を読まない（キャッシュを使わない場合）
+
+    Returns:
+        dict[str, str]: ステージ名とキーの対応
+    """
+    def digest(path: str) -> str | None:
+        return file_digest(path) if use_digests else None
+
+    card_settings = meta["card_settings"]
+    bank_closures = meta.get("bank_closures", [])
+    record_digest = digest(input_record_path)
+    transfer_key = stage_key('process_transfer_csv', digest(input_transfer_path), card_settings, bank_closures)
+    record_key = stage_key('process_and_save_kakeibo_data', record_digest, card_settings, bank_closures)
+    return {
+        'insert_csv_to_postgres': stage_key('insert_csv_to_postgres', record_digest, table_name_record, record_mode),
+        'process_transfer_csv': transfer_key,
+        'process_and_save_kakeibo_data': record_key,
+        'insert_final_balance_to_db': stage_key(
+            'generate_final_balance_df', digest(input_balance_path), transfer_key, record_key, meta["accounts_ja_en"],
+            state_path, table_name_final, final_layout
+        ),
+    }
+
+
+def target_tables(table_name_record: str, table_name_final: str, final_layout: str) -> list[str]:
+    """
+    パイプラインがデータを保存するテーブル名を返す関数
+    最終残高データは、レイアウトごとに実際に行を保存するテーブル（long_table_name・sparse_table_name と同じ名前）です。
+
+    Args:
+        table_name_record (str): recordデータのテーブル名
+        table_name_final (str): 最終残高データのテーブル名
+        final_layout (str): 最終残高データのレイアウト（'wide'、'long' または 'sparse'）
+
+    Returns:
+        list[str]: recordデータと最終残高データのテーブル名
+    """
+    suffix = {'wide': '', 'long': '_long', 'sparse': '_changes'}[final_layout]
+    return [table_name_record, f"{table_name_final}{suffix}"]
+
+
+def missing_input_files(paths: Iterable[str]) -> list[str]:
+    """存在しないファイルのパスを返す"""
+    return [path for path in paths if not os.path.isfile(path)]
@@ -0,0 +1,104 @@
+import datetime
+import pandas as pd
+
+# カケイのCSVの日付の書式（record.csv は日時、transfer.csv / balance.csv は日付）
+KAKEI_DATETIME_FORMAT = '%Y/%m/%d %H:%M'
+KAKEI_DATE_FORMAT = '%Y/%m/%d'
+
+# 先頭の値で書式を判定するときの候補（カケイの書式を優先し、ISO形式の中間ファイルにも対応する）
+DATE_FORMATS = [
+    KAKEI_DATETIME_FORMAT,
+    KAKEI_DATE_FORMAT,
+    '%Y/%m/%d %H:%M:%S',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%d',
+]
+
+# 入力の日時は日本時間、DBと日単位の集計はUTCで扱う
+LOCAL_TIMEZONE = 'Asia/Tokyo'
+
+
+def detect_date_format(values: pd.Series) -> str | None:
+    """
+    先頭の欠損でない値から、DATE_FORMATS のうち一致する書式を返す関数
+
+    Args:
+        values (pd.Series): 日付の文字列
+
+    Returns:
+        str | None: 一致した書式。一致しない場合は None
+    """
+    first = values.dropna()
+    if first.empty:
+        return None
+    first = str(first.iloc[0])
+    for date_format in DATE_FORMATS:
+        try:
+            datetime.datetime.strptime(first, date_format)
+            return date_format
+        except ValueError:
+            continue
+    return None
+
+
+def parse_kakei_dates(values: pd.Series, errors: str = 'coerce') -> pd.Series:
+    """
+    カケイの日付列を datetime64 に変換する関数
+    既に日時型ならそのまま返します。文字列の場合は先頭の値で書式を判定して、その書式で列全体をまとめて変換し、
+    書式が混在している場合だけ1件ずつ書式を推定する変換に切り替えます。
+
+    Args:
+        values (pd.Series): 日付の列
+        errors (str): 解釈できない値の扱い（'coerce' なら NaT、'raise' なら例外）
+
+    Returns:
+        pd.Series: datetime64 の列（タイムゾーンなし、日本時間）
+    """
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return values
+
+    date_format = detect_date_format(values)
+    if date_format is not None:
+        try:
+            return pd.to_datetime(values, format=date_format)
+        except (ValueError, TypeError):
+            pass
+    return pd.to_datetime(values, format='mixed', errors=errors)
+
+
+def jst_to_utc(dates: pd.Series) -> pd.Series:
+    """
+    日本時間の日時（タイムゾーンなし）をUTCのタイムゾーン付き日時に変換する関数
+    タイムゾーン付きの日時はUTCに変換するだけです。
+
+    Args:
+        dates (pd.Series): datetime64 の列
+
+    Returns:
+        pd.Series: UTCのタイムゾーン付き datetime64 の列
+    """
+    if isinstance(dates.dtype, pd.DatetimeTZDtype):
+        return dates.dt.tz_convert('UTC')
+    return dates.dt.tz_localize(LOCAL_TIMEZONE, ambiguous='NaT', nonexistent='shift_forward').dt.tz_convert('UTC')
+
+
+def jst_to_utc_day(dates: pd.Series) -> pd.Series:
+    """日本時間の日時をUTCに変換し、日単位に丸める（最終残高データの日付の単位）"""
+    return jst_to_utc(dates).dt.normalize()
+
+
+def utc_to_jst(dates: pd.Series) -> pd.Series:
+    """
+    UTCの日時（タイムゾーン付き、またはタイムゾーンなしのUTC）を日本時間のタイムゾーンなし日時に変換する関数
+
+    Args:
+        dates (pd.Series): datetime64 の列
+
+    Returns:
+        pd.Series: 日本時間のタイムゾーンなし datetime64 の列
+    """
+    if not isinstance(dates.dtype, pd.DatetimeTZDtype):
+        dates = dates.dt.tz_localize('UTC')
+    return dates.dt.tz_convert(LOCAL_TIMEZONE).dt.tz_localize(None)
+
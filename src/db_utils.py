@@ -0,0 +1,220 @@
+import io
+import threading
+import time
+import pandas as pd
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+from typing import Any
+
+from .metrics import record_io
+
+# 接続情報ごとの接続プール（同じプロセス内で接続を使い回す）
+MAX_POOLED_CONNECTIONS = 4
+_connection_pools: dict[tuple, ThreadedConnectionPool] = {}
+_connection_owners: dict[int, ThreadedConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection(db_config: dict[str, Any]):
+    """
+    接続プールからPostgreSQLの接続を取得する関数
+    webhook のように同じプロセスでパイプラインを繰り返し実行する場合、接続を張り直さずに使い回せます。
+    切断されている接続は破棄して接続し直します。使い終わったら release_connection で返却してください。
+
+    Args:
+        db_config (dict): データベース接続情報
+
+    Returns:
+        psycopg2の接続
+    """
+    key = tuple(sorted(db_config.items()))
+    with _pools_lock:
+        pool = _connection_pools.get(key)
+        if pool is None:
+            pool = ThreadedConnectionPool(0, MAX_POOLED_CONNECTIONS, **db_config)
+            _connection_pools[key] = pool
+
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        pool.putconn(conn, close=True)
+        conn = pool.getconn()
+
+    with _pools_lock:
+        _connection_owners[id(conn)] = pool
+    return conn
+
+
+def release_connection(conn) -> None:
+    """
+    get_connection で取得した接続をプールに返却する関数
+    未完了のトランザクションはロールバックされます。
+
+    Args:
+        conn: get_connection で取得した接続
+
+    Returns:
+        None
+    """
+    with _pools_lock:
+        pool = _connection_owners.pop(id(conn), None)
+    if pool is None:
+        conn.close()
+    else:
+        pool.putconn(conn, close=conn.closed != 0)
+
+
+def copy_dataframe(
+        cursor,
+        df: pd.DataFrame,
+        table_name: str,
+        columns: list[str] | None = None
+    ) -> int:
+    """
+    DataFrameを COPY ... FROM STDIN でPostgreSQLのテーブルに一括投入する関数
+    一時ファイルは作らず、メモリ上のCSVバッファからストリームします。
+    タイムゾーン付きの日時列はUTCに変換したうえでタイムゾーンなしの値として書き出し、
+    欠損値（NaN / None）はNULLとして投入します。
+
+    Args:
+        cursor: psycopg2のカーソル
+        df (pd.DataFrame): 投入するデータ（列の順序は columns と対応）
+        table_name (str): 投入先のテーブル名
+        columns (list[str] | None): 投入先のカラム名。省略時は df のカラム名を使用
+
+    Returns:
+        int: 投入した行数
+    """
+    columns = list(df.columns) if columns is None else columns
+
+    df = df.copy()
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.DatetimeTZDtype):
+            df[column] = df[column].dt.tz_convert('UTC').dt.tz_localize(None)
+
+    buffer = io.StringIO()
+    df.to_csv(buffer, header=False, index=False, na_rep='', date_format='%Y-%m-%d %H:%M:%S')
+    payload_size = buffer.tell()
+    buffer.seek(0)
+
+    start = time.perf_counter()
+    cursor.copy_expert(
+        f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+    elapsed = time.perf_counter() - start
+
+    rows_per_sec = len(df) / elapsed if elapsed > 0 else float('inf')
+    print(f"📦 {table_name}: {len(df)} 行をCOPYで投入しました（{rows_per_sec:,.0f} 行/秒）")
+    record_io(rows=len(df), bytes_written=payload_size)
+    return len(df)
+
+
+def relation_kind(cursor, name: str) -> str | None:
+    """
+    テーブル・ビューの種類（pg_class.relkind）を返す関数
+
+    Args:
+        cursor: psycopg2のカーソル
+        name (str): テーブル名・ビュー名
+
+    Returns:
+        str | None: 'r'（テーブル）、'p'（パーティションテーブル）、'v'（ビュー）など。存在しない場合は None
+    """
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def view_depends_on(cursor, view_name: str, table_name: str) -> bool:
+    """
+    ビューが指定したテーブル・ビューを参照しているかを返す関数
+    最終残高データの互換ビューが、どのレイアウトのテーブルから作られたものかの確認に使います。
+
+    Args:
+        cursor: psycopg2のカーソル
+        view_name (str): ビュー名
+        table_name (str): テーブル名・ビュー名
+
+    Returns:
+        bool: 参照している場合は True（ビューが存在しない場合は False）
+    """
+    cursor.execute(
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM pg_rewrite r
+            JOIN pg_depend d ON d.classid = 'pg_rewrite'::regclass AND d.objid = r.oid
+            WHERE r.ev_class = to_regclass(%s) AND d.refobjid = to_regclass(%s)
+        )
+        """,
+        (view_name, table_name)
+    )
+    return cursor.fetchone()[0]
+
+
+def drop_relation(cursor, name: str) -> None:
+    """
+    同じ名前のテーブルまたはビューがあれば、種類に合わせて削除する関数
+    最終残高データのように、同じ名前がテーブルの場合とビューの場合がある本番テーブルの入れ替えに使います。
+
+    Args:
+        cursor: psycopg2のカーソル
+        name (str): テーブル名・ビュー名
+
+    Returns:
+        None
+    """
+    kind = relation_kind(cursor, name)
+    if kind is None:
+        return
+    cursor.execute(f"DROP {'VIEW' if kind == 'v' else 'TABLE'} {name}")
+
+
+def staging_table_name(table_name: str) -> str:
+    """本番テーブルに対応するステージングテーブル名を返す"""
+    return f"{table_name}_staging"
+
+
+def swap_in_staging_table(cursor, table_name: str) -> None:
+    """
+    ステージングテーブルを本番テーブルと入れ替える関数
+    本番テーブルの削除とステージングテーブルのリネームを、呼び出し側のトランザクション内で行います。
+    コミットするまで読み取り側には入れ替え前のテーブルが見え、コミット後は新しいテーブルが見えるため、
+    テーブルが空・存在しない瞬間はありません。
+    ステージング側で作成したインデックスと id のシーケンスも本番テーブルの名前に合わせてリネームします。
+    本番テーブルの名前がビューになっている場合（最終残高データの縦持ちレイアウトの互換ビュー）は、ビューを削除します。
+
+    Args:
+        cursor: psycopg2のカーソル
+        table_name (str): 本番テーブル名（ステージングテーブルは staging_table_name で決まる名前）
+
+    Returns:
+        None
+    """
+    staging_table = staging_table_name(table_name)
+
+    drop_relation(cursor, table_name)
+    cursor.execute(f"ALTER TABLE {staging_table} RENAME TO {table_name}")
+
+    cursor.execute(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s",
+        (table_name,)
+    )
+    for (index_name,) in cursor.fetchall():
+        if index_name.startswith(staging_table):
+            cursor.execute(f"ALTER INDEX {index_name} RENAME TO {table_name}{index_name[len(staging_table):]}")
+
+    cursor.execute(
+        """
+        SELECT seq.relname FROM pg_class seq
+        JOIN pg_depend dep ON dep.objid = seq.oid AND dep.deptype IN ('a', 'i')
+        WHERE seq.relkind = 'S' AND dep.refobjid = %s::regclass
+        """,
+        (table_name,)
+    )
+    for (sequence_name,) in cursor.fetchall():
+        if sequence_name.startswith(staging_table):
+            cursor.execute(f"ALTER SEQUENCE {sequence_name} RENAME TO {table_name}{sequence_name[len(staging_table):]}")
@@ -1,9 +1,16 @@
 import pandas as pd
-import psycopg2
-import psycopg2.extras
 import json
 from typing import Any
 
+from .db_utils import (
+    copy_dataframe,
+    get_connection,
+    relation_kind,
+    release_connection,
+    staging_table_name,
+    swap_in_staging_table,
+)
+
 def insert_final_balance_to_db(
         db_config: dict[str, Any],
         csv_file_path: str,
@@ -13,7 +20,7 @@ def insert_final_balance_to_db(
     """
     最終残高データをPostgreSQLに高速インサートする関数
     この関数は、指定されたCSVファイルから最終残高データを読み込み、PostgreSQLデータベースに高速でインサートします。
-    テーブルが存在しない場合は新規作成し、既存のテーブルは削除してから作成します。
+    テーブルはステージングテーブルに投入してから既存のテーブルと入れ替えます。
     Args:
         db_config (dict): データベース接続情報
         csv_file_path (str): 最終残高データのCSVファイルパス
@@ -23,14 +30,35 @@ def insert_final_balance_to_db(
     Returns:
         None
     """
-    # PostgreSQL接続
-    conn = psycopg2.connect(**db_config)
-    cur = conn.cursor()
-
     # assets情報読み込み
     with open(meta_json_path, "r") as f:
         assets = json.load(f)["accounts_ja_en"]
 
+    # CSV読み込み
+    df = pd.read_csv(csv_file_path, encoding='utf-8', parse_dates=['date'])
+
+    insert_final_balance_df_to_db(db_config, df, assets, table_name)
+
+
+def insert_final_balance_df_to_db(
+        db_config: dict[str, Any],
+        final_df: pd.DataFrame,
+        assets: dict[str, str],
+        table_name: str,
+    ) -> None:
+    """
+    生成済みの最終残高データフレームをPostgreSQLに高速インサートする関数
+    ステージングテーブルに投入してから、1トランザクションで既存のテーブルと入れ替えます。
+    入力のデータフレームは変更しません。
+    Args:
+        db_config (dict): データベース接続情報
+        final_df (pd.DataFrame): generate_final_balance_df / build_final_balance_df の出力
+        assets (dict[str, str]): meta.json の accounts_ja_en
+        table_name (str): 挿入先のテーブル名
+        
+    Returns:
+        None
+    """
     # カラム名のSQL部分生成
     column_sql = ",\n".join(
         f"{account}_{flow_or_balance} NUMERIC" 
@@ -38,40 +66,94 @@ def insert_final_balance_to_db(
         for flow_or_balance in ["flow", "balance"]
     )
 
-    # テーブル作成SQL
+    # ステージングテーブル作成SQL
+    staging_table = staging_table_name(table_name)
     create_table_sql = f"""
-    DROP TABLE IF EXISTS {table_name};
-    CREATE TABLE {table_name} (
+    DROP TABLE IF EXISTS {staging_table};
+    CREATE TABLE {staging_table} (
         id SERIAL PRIMARY KEY,
         date DATE,
         {column_sql}
     );
     """
-    cur.execute(create_table_sql)
-    conn.commit()
-
-    # CSV読み込み
-    df = pd.read_csv(csv_file_path, encoding='utf-8', parse_dates=['date'])
 
     # DataFrameカラム名の変換
-    df.columns = ['date'] + [f"{account}_{flow_or_balance}" for account in assets.values() for flow_or_balance in ["flow", "balance"]]
-
-    # バルクインサート用SQL
-    insert_sql = f"""
-        INSERT INTO {table_name} ({', '.join(df.columns)})
-        VALUES %s
-    """
-
-    # 高速バルクインサート
-    psycopg2.extras.execute_values(
-        cur, insert_sql, df.values.tolist(), page_size=100
+    df = final_df.set_axis(
+        ['date'] + [f"{account}_{flow_or_balance}" for account in assets.values() for flow_or_balance in ["flow", "balance"]],
+        axis=1
     )
 
-    conn.commit()
-    cur.close()
-    conn.close()
+    # PostgreSQL接続
+    conn = get_connection(db_config)
+    cur = conn.cursor()
+    try:
+        # ステージングテーブルを作り直し、COPYで一括投入し、インデックスを作成してから本番テーブルと入れ替える
+        cur.execute(create_table_sql)
+        copy_dataframe(cur, df, staging_table)
+        cur.execute(f"CREATE UNIQUE INDEX {staging_table}_date_idx ON {staging_table} (date)")
+        swap_in_staging_table(cur, table_name)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        release_connection(conn)
 
     print("✅ 高速インサート完了！")
     
+def upsert_final_balance_df_to_db(
+        db_config: dict[str, Any],
+        final_df: pd.DataFrame,
+        assets: dict[str, str],
+        table_name: str,
+        from_date: pd.Timestamp,
+    ) -> bool:
+    """
+    最終残高データのうち from_date 以降の行だけをPostgreSQLのテーブルに反映する関数
+    既存テーブルの from_date 以降の行を削除し、final_df の行を投入する処理を1トランザクションで行います。
+    テーブルが存在しない（縦持ちレイアウトの互換ビューの場合を含む）、またはカラム構成が accounts_ja_en と一致しない場合は
+    何もせず False を返します。
+    Args:
+        db_config (dict): データベース接続情報
+        final_df (pd.DataFrame): from_date 以降の最終残高データ
+        assets (dict[str, str]): meta.json の accounts_ja_en
+        table_name (str): 反映先のテーブル名
+        from_date (pd.Timestamp): 置き換える期間の開始日
+
+    Returns:
+        bool: 反映した場合は True
+    """
+    columns = ['date'] + [f"{account}_{flow_or_balance}" for account in assets.values() for flow_or_balance in ["flow", "balance"]]
+
+    conn = get_connection(db_config)
+    cur = conn.cursor()
+    try:
+        if relation_kind(cur, table_name) != 'r':
+            return False
+        cur.execute(
+            """
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s
+            ORDER BY ordinal_position
+            """,
+            (table_name,)
+        )
+        if [row[0] for row in cur.fetchall()] != ['id'] + [column.lower() for column in columns]:
+            return False
+
+        cur.execute(f"DELETE FROM {table_name} WHERE date >= %s", (from_date.date(),))
+        deleted = cur.rowcount
+        copy_dataframe(cur, final_df.set_axis(columns, axis=1), table_name)
+        conn.commit()
+        print(f"✅ {from_date.strftime('%Y-%m-%d')} 以降の {deleted} 行を {len(final_df)} 行で置き換えました。")
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        release_connection(conn)
+
 if __name__ == '__main__':
     pass
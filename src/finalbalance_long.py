@@ -0,0 +1,200 @@
+import numpy as np
+import pandas as pd
+from typing import Any
+
+from .db_utils import copy_dataframe, drop_relation, get_connection, relation_kind, release_connection, view_depends_on
+
+# 最終残高データのレイアウト
+# - wide: 日付ごとに1行、アカウントごとに {account}_flow / {account}_balance の列を持つテーブル（従来の kakeibo_2）
+# - long: (date, account, flow, balance) の縦持ちテーブル。同じ名前で wide と同じ形の互換ビューを作る
+# - sparse: 収支・残高に変化のあった日だけの縦持ちテーブル。前方補完するビューで wide と同じ形の互換ビューを作る
+FINAL_LAYOUTS = ('wide', 'long', 'sparse')
+
+
+def long_table_name(table_name: str) -> str:
+    """最終残高データのテーブル名に対応する縦持ちテーブル名を返す"""
+    return f"{table_name}_long"
+
+
+def to_long_balance_df(final_df: pd.DataFrame, assets: dict[str, str]) -> pd.DataFrame:
+    """
+    最終残高データ（日付 × アカウントの横持ち）を (date, account, flow, balance) の縦持ちに変換する関数
+    account には accounts_ja_en の英語名を使います（横持ちテーブルの列名の接頭辞と同じ）。
+
+    Args:
+        final_df (pd.DataFrame): build_final_balance_df の出力
+        assets (dict[str, str]): meta.json の accounts_ja_en
+
+    Returns:
+        pd.DataFrame: アカウント・日付順の縦持ちデータ
+    """
+    n = len(final_df)
+    dates = pd.DatetimeIndex(final_df['date'])
+    if dates.tz is not None:
+        dates = dates.tz_convert('UTC').tz_localize(None)
+    return pd.DataFrame({
+        'date': np.tile(dates.to_numpy(), len(assets)),
+        'account': np.repeat(np.array(list(assets.values()), dtype=object), n),
+        'flow': np.concatenate([final_df[f"{account}_収支"].to_numpy() for account in assets] or [[]]),
+        'balance': np.concatenate([final_df[f"{account}_残高"].to_numpy() for account in assets] or [[]]),
+    })
+
+
+def create_long_balance_table(cursor, table_name: str) -> bool:
+    """
+    縦持ちの最終残高テーブルが無ければ作成する関数
+    日付の年ごとのレンジパーティションに分けるため、期間を指定したクエリは該当する年のパーティションだけを読みます。
+    主キー (account, date) のインデックスで、1アカウントのパネルはそのアカウントの行だけを読みます。
+
+    Args:
+        cursor: psycopg2のカーソル
+        table_name (str): 縦持ちテーブル名
+
+    Returns:
+        bool: テーブルを新しく作成した場合は True
+    """
+    if relation_kind(cursor, table_name) is not None:
+        return False
+    cursor.execute(f"""
+    CREATE TABLE {table_name} (
+        date DATE NOT NULL,
+        account VARCHAR(255) NOT NULL,
+        flow NUMERIC,
+        balance NUMERIC,
+        PRIMARY KEY (account, date)
+    ) PARTITION BY RANGE (date);
+    """)
+    return True
+
+
+def ensure_year_partitions(cursor, table_name: str, years: list[int]) -> None:
+    """
+    縦持ちテーブルに、指定した年のパーティションが無ければ作成する関数
+
+    Args:
+        cursor: psycopg2のカーソル
+        table_name (str): 縦持ちテーブル名
+        years (list[int]): 必要な年
+
+    Returns:
+        None
+    """
+    for year in sorted(set(years)):
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table_name}_y{year} PARTITION OF {table_name}
+        FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')
+        """)
+
+
+def create_wide_balance_view(cursor, view_name: str, table_name: str, assets: dict[str, str]) -> None:
+    """
+    縦持ちテーブルから、横持ちの最終残高テーブルと同じ列（id, date, {account}_flow, {account}_balance）を持つビューを作る関数
+    同じ名前のテーブル・ビューがあれば削除してから作り直します（アカウントが変わると列が変わるため）。
+
+    Args:
+        cursor: psycopg2のカーソル
+        view_name (str): ビュー名（従来の最終残高テーブル名）
+        table_name (str): 縦持ちテーブル名
+        assets (dict[str, str]): meta.json の accounts_ja_en
+
+    Returns:
+        None
+    """
+    column_sql = ",\n".join(
+        f"MAX({value}) FILTER (WHERE account = %s) AS {account}_{value}"
+        for account in assets.values()
+        for value in ["flow", "balance"]
+    )
+    params = [account for account in assets.values() for _ in ["flow", "balance"]]
+
+    drop_relation(cursor, view_name)
+    cursor.execute(f"""
+    CREATE VIEW {view_name} AS
+    SELECT (ROW_NUMBER() OVER (ORDER BY date))::integer AS id,
+           date{',' if column_sql else ''}
+           {column_sql}
+    FROM {table_name}
+    GROUP BY date
+    ORDER BY date
+    """, params)
+
+
+def upsert_long_balance_df_to_db(
+        db_config: dict[str, Any],
+        final_df: pd.DataFrame,
+        assets: dict[str, str],
+        table_name: str,
+        from_date: pd.Timestamp | None = None,
+    ) -> bool:
+    """
+    最終残高データを縦持ちテーブル（{table_name}_long）に反映し、table_name に横持ちの互換ビューを作る関数
+    final_df の行は (account, date) が既存の行と一致すれば値が変わった場合だけ更新し、無ければ追加します。
+    from_date を指定した場合は from_date 以降、指定しない場合は全期間について、final_df に無い行を削除します。
+    アカウントの追加・削除はテーブルを作り直さず、行の追加・削除として反映されます。
+    全ての処理を1トランザクションで行います。
+
+    Args:
+        db_config (dict): データベース接続情報
+        final_df (pd.DataFrame): 最終残高データ（from_date を指定した場合は from_date 以降の行）
+        assets (dict[str, str]): meta.json の accounts_ja_en
+        table_name (str): 従来の最終残高テーブル名（互換ビューの名前）
+        from_date (pd.Timestamp | None): 置き換える期間の開始日。None の場合は全期間
+
+    Returns:
+        bool: 反映した場合は True。from_date を指定したが前回が縦持ちでの反映でない場合は何もせず False
+    """
+    long_table = long_table_name(table_name)
+    long_df = to_long_balance_df(final_df, assets)
+
+    conn = get_connection(db_config)
+    cur = conn.cursor()
+    try:
+        # 前回も縦持ちで反映していなければ（互換ビューが縦持ちテーブルのものでなければ）、縦持ちテーブルが古い可能性があるので
+        # 期間の一部だけを反映せず、全期間で作り直してもらう
+        if from_date is not None and not view_depends_on(cur, table_name, long_table):
+            return False
+        create_long_balance_table(cur, long_table)
+
+        dates = pd.DatetimeIndex(long_df['date'])
+        ensure_year_partitions(cur, long_table, dates.year.unique().tolist())
+
+        incoming_table = f"{long_table}_incoming"
+        cur.execute(f"""
+        CREATE TEMP TABLE {incoming_table} (
+            date DATE NOT NULL,
+            account VARCHAR(255) NOT NULL,
+            flow NUMERIC,
+            balance NUMERIC
+        ) ON COMMIT DROP
+        """)
+        copy_dataframe(cur, long_df, incoming_table)
+        cur.execute(f"ANALYZE {incoming_table}")
+
+        cur.execute(f"""
+        INSERT INTO {long_table} AS t (date, account, flow, balance)
+        SELECT date, account, flow, balance FROM {incoming_table}
+        ON CONFLICT (account, date) DO UPDATE
+        SET flow = EXCLUDED.flow, balance = EXCLUDED.balance
+        WHERE (t.flow, t.balance) IS DISTINCT FROM (EXCLUDED.flow, EXCLUDED.balance)
+        """)
+        upserted = cur.rowcount
+
+        window_sql = "t.date >= %s AND" if from_date is not None else ""
+        cur.execute(f"""
+        DELETE FROM {long_table} t
+        WHERE {window_sql} NOT EXISTS (
+            SELECT 1 FROM {incoming_table} i WHERE i.account = t.account AND i.date = t.date
+        )
+        """, (from_date.date(),) if from_date is not None else None)
+        deleted = cur.rowcount
+
+        create_wide_balance_view(cur, table_name, long_table, assets)
+        conn.commit()
+        print(f"✅ {long_table}: 追加・更新 {upserted} 行 / 削除 {deleted} 行")
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        release_connection(conn)
@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+from typing import Any
+
+from .db_utils import copy_dataframe, drop_relation, get_connection, release_connection, staging_table_name, swap_in_staging_table
+from .finalbalance_long import create_wide_balance_view, to_long_balance_df
+
+
+def sparse_table_name(table_name: str) -> str:
+    """最終残高データのテーブル名に対応する、変化のあった日だけを保存するテーブル名を返す"""
+    return f"{table_name}_changes"
+
+
+def dense_view_name(table_name: str) -> str:
+    """変化のあった日だけのテーブルを、毎日1行に戻した縦持ちビューの名前を返す"""
+    return f"{table_name}_dense"
+
+
+def series_function_name(table_name: str) -> str:
+    """1アカウント・期間を指定して毎日の残高を返すSQL関数の名前を返す"""
+    return f"{table_name}_series"
+
+
+def to_sparse_balance_df(final_df: pd.DataFrame, assets: dict[str, str]) -> pd.DataFrame:
+    """
+    最終残高データ（日付 × アカウントの横持ち）から、アカウントごとに収支が0でない日・残高が前日から変わった日だけを
+    (date, account, flow, balance) の縦持ちで取り出す関数
+    期間の初日と最終日は変化が無くても残すため、densify_balance_df で元の毎日のデータに戻せます。
+
+    Args:
+        final_df (pd.DataFrame): build_final_balance_df の出力
+        assets (dict[str, str]): meta.json の accounts_ja_en
+
+    Returns:
+        pd.DataFrame: アカウント・日付順の、変化のあった日だけの縦持ちデータ
+    """
+    long_df = to_long_balance_df(final_df, assets)
+    n = len(final_df)
+    if n == 0:
+        return long_df
+
+    flow = long_df['flow'].to_numpy().reshape(len(assets), n)
+    balance = long_df['balance'].to_numpy(dtype='float64').reshape(len(assets), n)
+
+    changed = flow != 0
+    changed[:, [0, -1]] = True
+    previous, current = balance[:, :-1], balance[:, 1:]
+    changed[:, 1:] |= ~((previous == current) | (np.isnan(previous) & np.isnan(current)))
+    return long_df[changed.ravel()].reset_index(drop=True)
+
+
+def densify_balance_df(sparse_df: pd.DataFrame, assets: dict[str, str]) -> pd.DataFrame:
+    """
+    to_sparse_balance_df の出力を、build_final_balance_df と同じ毎日1行の横持ちの最終残高データに戻す関数
+    記録の無い日は、収支は0、残高はそのアカウントの直前の記録の値になります。
+
+    Args:
+        sparse_df (pd.DataFrame): (date, account, flow, balance) の変化のあった日だけの縦持ちデータ
+        assets (dict[str, str]): meta.json の accounts_ja_en
+
+    Returns:
+        pd.DataFrame: date（UTC）、{アカウント}_収支、{アカウント}_残高 の列を持つ最終残高データ
+    """
+    sparse_df = sparse_df.sort_values(['account', 'date'], kind='stable')
+    sparse_dates = pd.DatetimeIndex(sparse_df['date'])
+    if len(sparse_dates):
+        dates = pd.date_range(sparse_dates.min(), sparse_dates.max(), freq='D', unit=sparse_dates.unit)
+    else:
+        dates = pd.DatetimeIndex([], dtype='datetime64[us]')
+
+    rows = dates.get_indexer(sparse_dates)
+    cols = pd.Index(list(assets.values())).get_indexer(sparse_df['account'])
+    known = cols >= 0
+
+    flow_values = sparse_df['flow'].to_numpy()
+    flows = np.zeros((len(dates), len(assets)), dtype=flow_values.dtype)
+    flows[rows[known], cols[known]] = flow_values[known]
+
+    # 各日について、その日以前の最後の記録の位置（記録が無ければ -1 → NaN）
+    recorded = np.full((len(dates), len(assets)), -1)
+    recorded[rows[known], cols[known]] = np.arange(len(sparse_df))[known]
+    recorded = np.maximum.accumulate(recorded, axis=0) if len(dates) else recorded
+    balances = np.append(sparse_df['balance'].to_numpy(dtype='float64'), np.nan)[recorded]
+
+    data = {'date': dates.tz_localize('UTC')}
+    for i, account in enumerate(assets):
+        data[f"{account}_収支"] = flows[:, i]
+        data[f"{account}_残高"] = balances[:, i]
+    return pd.DataFrame(data)
+
+
+def create_sparse_balance_objects(cursor, table_name: str, assets: dict[str, str]) -> None:
+    """
+    変化のあった日だけのテーブル（{table_name}_changes）を毎日1行に戻して読むためのビュー・関数を作る関数
+    - {table_name}_dense: (date, account, flow, balance) の毎日1行の縦持ちビュー
+    - {table_name}: 横持ちの最終残高テーブルと同じ列（id, date, {account}_flow, {account}_balance）の互換ビュー
+    - {table_name}_series(account, from, to): 1アカウントの期間内の毎日の (date, flow, balance) を返す関数。
+      期間内の日だけを生成するので、Grafana のパネルからはこの関数を使うと速く読めます。
+    記録の無い日は、収支は0、残高は直前の記録の値（前方補完）になります。
+
+    Args:
+        cursor: psycopg2のカーソル
+        table_name (str): 最終残高データのテーブル名（互換ビューの名前）
+        assets (dict[str, str]): meta.json の accounts_ja_en
+
+    Returns:
+        None
+    """
+    sparse_table = sparse_table_name(table_name)
+    dense_view = dense_view_name(table_name)
+
+    drop_relation(cursor, table_name)
+    drop_relation(cursor, dense_view)
+    cursor.execute(f"""
+    CREATE VIEW {dense_view} AS
+    SELECT d.day::date AS date, a.account, COALESCE(c.flow, 0) AS flow, last.balance
+    FROM (SELECT DISTINCT account FROM {sparse_table}) a
+    CROSS JOIN generate_series(
+        (SELECT MIN(date) FROM {sparse_table}), (SELECT MAX(date) FROM {sparse_table}), INTERVAL '1 day'
+    ) AS d(day)
+    LEFT JOIN {sparse_table} c ON c.account = a.account AND c.date = d.day::date
+    LEFT JOIN LATERAL (
+        SELECT p.balance FROM {sparse_table} p
+        WHERE p.account = a.account AND p.date <= d.day::date
+        ORDER BY p.date DESC LIMIT 1
+    ) last ON true
+    """)
+    create_wide_balance_view(cursor, table_name, dense_view, assets)
+
+    cursor.execute(f"""
+    CREATE OR REPLACE FUNCTION {series_function_name(table_name)}(p_account VARCHAR, p_from DATE, p_to DATE)
+    RETURNS TABLE (date DATE, flow NUMERIC, balance NUMERIC)
+    LANGUAGE sql STABLE AS $$
+        SELECT d.day::date, COALESCE(c.flow, 0), last.balance
+        FROM generate_series(
+            GREATEST(p_from, (SELECT MIN(s.date) FROM {sparse_table} s WHERE s.account = p_account)),
+            LEAST(p_to, (SELECT MAX(s.date) FROM {sparse_table} s WHERE s.account = p_account)),
+            INTERVAL '1 day'
+        ) AS d(day)
+        LEFT JOIN {sparse_table} c ON c.account = p_account AND c.date = d.day::date
+        LEFT JOIN LATERAL (
+            SELECT p.balance FROM {sparse_table} p
+            WHERE p.account = p_account AND p.date <= d.day::date
+            ORDER BY p.date DESC LIMIT 1
+        ) last ON true
+        ORDER BY 1
+    $$
+    """)
+
+
+def insert_sparse_balance_df_to_db(
+        db_config: dict[str, Any],
+        final_df: pd.DataFrame,
+        assets: dict[str, str],
+        table_name: str,
+    ) -> int:
+    """
+    最終残高データのうち変化のあった日だけを {table_name}_changes に保存し、前方補完するビュー・関数を作り直す関数
+    ステージングテーブルに投入してから、ビューの削除・テーブルの入れ替え・ビューの作成を1トランザクションで行うため、
+    コミットするまで読み取り側には入れ替え前のデータが見えます。
+
+    Args:
+        db_config (dict): データベース接続情報
+        final_df (pd.DataFrame): build_final_balance_df の出力（全期間）
+        assets (dict[str, str]): meta.json の accounts_ja_en
+        table_name (str): 最終残高データのテーブル名（互換ビューの名前）
+
+    Returns:
+        int: 保存した行数
+    """
+    sparse_df = to_sparse_balance_df(final_df, assets)
+    sparse_table = sparse_table_name(table_name)
+    staging_table = staging_table_name(sparse_table)
+
+    conn = get_connection(db_config)
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+        DROP TABLE IF EXISTS {staging_table};
+        CREATE TABLE {staging_table} (
+            date DATE NOT NULL,
+            account VARCHAR(255) NOT NULL,
+            flow NUMERIC,
+            balance NUMERIC
+        );
+        """)
+        copy_dataframe(cur, sparse_df, staging_table)
+        cur.execute(f"ALTER TABLE {staging_table} ADD CONSTRAINT {staging_table}_pkey PRIMARY KEY (account, date)")
+
+        # 入れ替えるテーブルに依存するビューを削除してから入れ替え、作り直す
+        drop_relation(cur, table_name)
+        drop_relation(cur, dense_view_name(table_name))
+        swap_in_staging_table(cur, sparse_table)
+        create_sparse_balance_objects(cur, table_name, assets)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        release_connection(conn)
+
+    dense_rows = len(final_df) * len(assets)
+    print(f"✅ {sparse_table}: {len(sparse_df):,} 行（毎日1行の場合の {len(sparse_df) / max(dense_rows, 1):.1%}）")
+    return len(sparse_df)
@@ -0,0 +1,216 @@
+import datetime
+import functools
+import math
+import numpy as np
+from typing import Iterable
+
+# 祝日法の施行（1948年7月）以降で、春分・秋分の日の計算式が使える範囲
+MIN_YEAR = 1949
+MAX_YEAR = 2150
+
+# 振替休日・国民の休日の施行日
+SUBSTITUTE_HOLIDAY_START = datetime.date(1973, 4, 12)
+CITIZENS_HOLIDAY_START = datetime.date(1985, 12, 27)
+# 振替休日が「翌日」から「その後の最も近い祝日でない日」に変わった改正祝日法の施行日
+SUBSTITUTE_HOLIDAY_REVISION = datetime.date(2007, 1, 1)
+
+# 銀行の休業日（土日祝日のほか、12月31日〜1月3日は銀行法で休業日とされている）
+BANK_CLOSURE_DAYS = [(12, 31), (1, 2), (1, 3)]
+
+# 一度だけの祝日（皇室の行事など）
+SPECIAL_HOLIDAYS = {
+    datetime.date(1959, 4, 10): '皇太子明仁親王の結婚の儀',
+    datetime.date(1989, 2, 24): '昭和天皇の大喪の礼',
+    datetime.date(1990, 11, 12): '即位礼正殿の儀',
+    datetime.date(1993, 6, 9): '皇太子徳仁親王の結婚の儀',
+    datetime.date(2019, 5, 1): '天皇の即位の日',
+    datetime.date(2019, 10, 22): '即位礼正殿の儀',
+}
+
+# 東京オリンピック・パラリンピックに合わせて移動した祝日（年 → {祝日名: 日付}）
+MOVED_HOLIDAYS = {
+    2020: {'海の日': (7, 23), 'スポーツの日': (7, 24), '山の日': (8, 10)},
+    2021: {'海の日': (7, 22), 'スポーツの日': (7, 23), '山の日': (8, 8)},
+}
+
+
+def _nth_monday(year: int, month: int, n: int) -> datetime.date:
+    """year年month月の第n月曜日"""
+    first = datetime.date(year, month, 1)
+    return first + datetime.timedelta(days=(7 - first.weekday()) % 7 + 7 * (n - 1))
+
+
+def _equinox_day(year: int, spring: bool) -> int:
+    """春分の日・秋分の日の日（国立天文台の暦要項に基づく近似式）"""
+    # 閏年の補正項は0に向かって切り捨てる（1980年より前は負になる）
+    if year < 1980:
+        base, leap = (20.8357, 23.2588)[not spring], int((year - 1983) / 4)
+    elif year < 2100:
+        base, leap = (20.8431, 23.2488)[not spring], int((year - 1980) / 4)
+    else:
+        base, leap = (21.8510, 24.2488)[not spring], int((year - 1980) / 4)
+    return math.floor(base + 0.242194 * (year - 1980) - leap)
+
+
+def _statutory_holidays(year: int) -> dict[datetime.date, str]:
+    """振替休日・国民の休日を除く、year年の祝日"""
+    date = datetime.date
+    moved = MOVED_HOLIDAYS.get(year, {})
+
+    def on(name: str, default: datetime.date) -> tuple[datetime.date, str]:
+        return (date(year, *moved[name]) if name in moved else default), name
+
+    holidays = [
+        (date(year, 1, 1), '元日'),
+        (date(year, 1, 15) if year < 2000 else _nth_monday(year, 1, 2), '成人の日'),
+        (date(year, 3, _equinox_day(year, spring=True)), '春分の日'),
+        (date(year, 5, 3), '憲法記念日'),
+        (date(year, 5, 5), 'こどもの日'),
+        (date(year, 9, _equinox_day(year, spring=False)), '秋分の日'),
+        (date(year, 11, 3), '文化の日'),
+        (date(year, 11, 23), '勤労感謝の日'),
+    ]
+    if year >= 1967:
+        holidays.append((date(year, 2, 11), '建国記念の日'))
+
+    # 天皇誕生日と4月29日
+    if year <= 1988:
+        holidays.append((date(year, 4, 29), '天皇誕生日'))
+    else:
+        holidays.append((date(year, 4, 29), 'みどりの日' if year <= 2006 else '昭和の日'))
+        if year <= 2018:
+            holidays.append((date(year, 12, 23), '天皇誕生日'))
+        elif year >= 2020:
+            holidays.append((date(year, 2, 23), '天皇誕生日'))
+    if year >= 2007:
+        holidays.append((date(year, 5, 4), 'みどりの日'))
+
+    if year >= 1996:
+        holidays.append(on('海の日', date(year, 7, 20) if year <= 2002 else _nth_monday(year, 7, 3)))
+    if year >= 2016:
+        holidays.append(on('山の日', date(year, 8, 11)))
+    if year >= 1966:
+        holidays.append((date(year, 9, 15) if year <= 2002 else _nth_monday(year, 9, 3), '敬老の日'))
+        if year <= 1999:
+            holidays.append((date(year, 10, 10), '体育の日'))
+        elif year <= 2019:
+            holidays.append((_nth_monday(year, 10, 2), '体育の日'))
+        else:
+            holidays.append(on('スポーツの日', _nth_monday(year, 10, 2)))
+
+    result = dict(holidays)
+    result.update({day: name for day, name in SPECIAL_HOLIDAYS.items() if day.year == year})
+    return result
+
+
+def japanese_holidays(year: int) -> dict[datetime.date, str]:
+    """
+    year年の日本の祝日（振替休日・国民の休日を含む）を規則から計算する関数
+    振替休日は、2007年以降は「祝日が日曜日なら、その後の最も近い祝日でない日」、
+    2006年までは「祝日が日曜日なら、その翌日（翌日も祝日なら無し）」で計算します。
+    2006年までは振替休日が国民の休日より優先され、日曜日と振替休日は国民の休日になりません。
+
+    Args:
+        year (int): 年（MIN_YEAR〜MAX_YEAR）
+
+    Returns:
+        dict[datetime.date, str]: 日付 → 祝日名（日付順）
+    """
+    if not MIN_YEAR <= year <= MAX_YEAR:
+        raise ValueError(f"祝日を計算できるのは {MIN_YEAR}〜{MAX_YEAR} 年です: {year}")
+
+    statutory = _statutory_holidays(year)
+    holidays = dict(statutory)
+    one_day = datetime.timedelta(days=1)
+
+    # 振替休日（2006年まで）: 日曜日の祝日の翌日が祝日でなければ、その日
+    if year < SUBSTITUTE_HOLIDAY_REVISION.year:
+        for day in sorted(statutory):
+            substitute = day + one_day
+            if day.weekday() == 6 and day >= SUBSTITUTE_HOLIDAY_START and substitute not in statutory:
+                holidays[substitute] = '振替休日'
+
+    # 国民の休日: 前日と翌日が祝日の、日曜日・振替休日でない日
+    if year >= CITIZENS_HOLIDAY_START.year:
+        for day in sorted(statutory):
+            between = day + one_day
+            if (
+                between not in holidays
+                and between + one_day in statutory
+                and between.weekday() != 6
+                and between >= CITIZENS_HOLIDAY_START
+            ):
+                holidays[between] = '国民の休日'
+
+    # 振替休日（2007年以降）: 日曜日の祝日の後の、最も近い祝日でない日
+    if year >= SUBSTITUTE_HOLIDAY_REVISION.year:
+        for day in sorted(statutory):
+            if day.weekday() == 6:
+                substitute = day + one_day
+                while substitute in holidays:
+                    substitute += one_day
+                holidays[substitute] = '振替休日'
+
+    return dict(sorted(holidays.items()))
+
+
+def bank_holidays(start_year: int, end_year: int, closures: Iterable[str] = ()) -> np.ndarray:
+    """
+    start_year〜end_year 年の銀行の休業日（土日を除く）を、重複のない昇順の datetime64[D] 配列で返す関数
+    祝日と年末年始（BANK_CLOSURE_DAYS）に、closures で指定した休業日を加えます。
+
+    Args:
+        start_year (int): 開始年
+        end_year (int): 終了年（この年を含む）
+        closures (Iterable[str]): 追加の休業日（'YYYY-MM-DD'、meta.json の bank_closures）
+
+    Returns:
+        np.ndarray: 休業日の datetime64[D] 配列
+    """
+    days = []
+    for year in range(start_year, end_year + 1):
+        days.extend(japanese_holidays(year))
+        days.extend(datetime.date(year, month, day) for month, day in BANK_CLOSURE_DAYS)
+    return np.unique(np.concatenate([
+        np.array(days, dtype='datetime64[D]'),
+        np.array(list(closures), dtype='datetime64[D]'),
+    ]))
+
+
+@functools.lru_cache(maxsize=16)
+def business_day_calendar(start_year: int, end_year: int, closures: tuple[str, ...] = ()) -> np.busdaycalendar:
+    """
+    月〜金から bank_holidays の休業日を除いた営業日カレンダーを作る関数（同じ引数では作成済みのものを返します）
+
+    Args:
+        start_year (int): 開始年
+        end_year (int): 終了年（この年を含む）
+        closures (tuple[str, ...]): 追加の休業日（'YYYY-MM-DD'）
+
+    Returns:
+        np.busdaycalendar: np.busday_offset などに渡す営業日カレンダー
+    """
+    return np.busdaycalendar(weekmask='1111100', holidays=bank_holidays(start_year, end_year, closures))
+
+
+def roll_forward_to_business_day(dates: np.ndarray, closures: Iterable[str] = ()) -> np.ndarray:
+    """
+    日付の配列をまとめて、営業日ならそのまま、休業日（土日・祝日・年末年始・closures）なら次の営業日にする関数
+    カレンダーは日付の範囲の年（年末の繰り越し分として翌年を含む）について1回だけ作り、
+    np.busday_offset で列全体を一度に変換します。
+
+    Args:
+        dates (np.ndarray): datetime64[D] の配列
+        closures (Iterable[str]): 追加の休業日（'YYYY-MM-DD'、meta.json の bank_closures）
+
+    Returns:
+        np.ndarray: 営業日に繰り下げた datetime64[D] の配列
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    if dates.size == 0:
+        return dates
+    years = dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    calendar = business_day_calendar(
+        int(years.min()), min(int(years.max()) + 1, MAX_YEAR), tuple(sorted(set(closures)))
+    )
+    return np.busday_offset(dates, 0, roll='forward', busdaycal=calendar)
@@ -2,6 +2,57 @@ import pandas as pd
 import numpy as np
 import json
 
+from .dates import jst_to_utc_day, parse_kakei_dates
+from .schema import BALANCE_SCHEMA, FLOW_SCHEMA, read_typed_csv, to_amount
+
+def _replay_balances(all_events: pd.DataFrame) -> pd.DataFrame:
+    """
+    全アカウントのイベント列から、各イベント時点の残高をまとめて計算する関数
+    残高イベントで現在残高をリセットし、入出金イベントで加算する処理は、
+    「アカウント × 残高イベントで区切った区間」ごとの累積和と等価なので、groupby().cumsum() の1パスで計算します。
+    同日のイベントは残高イベントを先に処理します。
+
+    Args:
+        all_events (pd.DataFrame): account, event_date, 収支, is_balance_event, balance 列を持つイベントデータ
+
+    Returns:
+        pd.DataFrame: 並び替え済みのイベントデータに、各イベント処理後の残高 cur_balance 列を追加したもの
+    """
+    all_events = all_events.sort_values(
+        ['account', 'event_date', 'is_balance_event'], ascending=[True, True, False]
+    ).reset_index(drop=True)
+
+    is_balance_event = all_events['is_balance_event'] == 1
+    segment = is_balance_event.cumsum()
+    step = all_events['収支'].where(~is_balance_event, all_events['balance'])
+    all_events['cur_balance'] = step.groupby([all_events['account'], segment], observed=True).cumsum()
+    return all_events
+
+def _pivot_daily(
+        values: pd.Series,
+        date_range: pd.DatetimeIndex,
+        account_names: list[str],
+        fill_value: float
+    ) -> np.ndarray:
+    """
+    (アカウント, 日付) をキーとする集計済みSeriesを、日付 × アカウントの密な行列に展開する関数
+
+    Args:
+        values (pd.Series): (account, 日付) のMultiIndexを持つ集計値
+        date_range (pd.DatetimeIndex): 行に対応する日付範囲
+        account_names (list[str]): 列に対応するアカウント名
+        fill_value (float): 値のないセルの初期値（日付範囲外の値は無視します）
+
+    Returns:
+        np.ndarray: 形状 (日数, アカウント数) の行列
+    """
+    matrix = np.full((len(date_range), len(account_names)), fill_value, dtype=values.dtype)
+    rows = date_range.get_indexer(values.index.get_level_values(1))
+    cols = pd.Index(account_names).get_indexer(values.index.get_level_values(0))
+    inside = rows >= 0
+    matrix[rows[inside], cols[inside]] = values.to_numpy()[inside]
+    return matrix
+
 def generate_final_balance_df(
         balance_csv_path: str,
         transfer_csv_path: str,
@@ -24,87 +75,147 @@ def generate_final_balance_df(
         pd.DataFrame: 最終残高データを含むデータフレーム
     """
     # --- データ読み込み ---
-    data1 = pd.read_csv(balance_csv_path, parse_dates=["日付"])
-    transfer_df = pd.read_csv(transfer_csv_path, parse_dates=["withdrawal_date"])
-    record_df = pd.read_csv(record_csv_path, parse_dates=["withdrawal_date"])
-    data2 = pd.concat([transfer_df, record_df], axis=0)
-
-    # --- タイムゾーン処理 ---
-    data1['日付'] = pd.to_datetime(data1['日付']).dt.tz_localize(
-        'Asia/Tokyo', ambiguous='NaT', nonexistent='shift_forward'
-    ).dt.tz_convert('UTC').dt.normalize()
+    data1 = read_typed_csv(balance_csv_path, BALANCE_SCHEMA)
+    transfer_df = read_typed_csv(transfer_csv_path, FLOW_SCHEMA)
+    record_df = read_typed_csv(record_csv_path, FLOW_SCHEMA)
 
-    data2['withdrawal_date'] = pd.to_datetime(
-        data2['withdrawal_date'], format='mixed', errors='coerce'
-    ).dt.tz_localize('Asia/Tokyo', ambiguous='NaT', nonexistent='shift_forward').dt.tz_convert('UTC').dt.normalize()
-
-    # --- 日付範囲 ---
-    min_date = min(data1['日付'].min(), data2['withdrawal_date'].min())
-    max_date = max(data1['日付'].max(), data2['withdrawal_date'].max())
-    date_range = pd.date_range(start=min_date, end=max_date, freq='D', tz='UTC')
-    final_df = pd.DataFrame({'date': date_range})
-    
     # --- アカウント読み込み ---
     with open(meta_json_path, "r") as f:
         accounts = json.load(f)["accounts_ja_en"]
 
-    for account in accounts.keys():
-        # --- 入出金イベント ---
-        df = data2[data2["withdrawal_account"] == account].copy()
-        df['event_date'] = df['withdrawal_date']
-        df["amount"] = pd.to_numeric(df["amount"], errors="coerce").fillna(0)
-        df['収支'] = np.where(df['type'] == '収入', df['amount'], -df['amount'])
-        df['is_balance_event'] = 0
-
-        # --- 残高イベント ---
-        balance_df = data1[data1["資産"] == account][["日付", "金額"]].rename(
-            columns={'日付': 'event_date', '金額': 'balance'}
-        ).sort_values("event_date")
-        balance_df['収支'] = 0.0
-        balance_df['is_balance_event'] = 1
-
-        # --- イベント統合 ---
-        all_events = pd.concat([
-            df[['event_date', '収支', 'is_balance_event']],
-            balance_df[['event_date', '収支', 'is_balance_event', 'balance']]
-        ], ignore_index=True, sort=False).sort_values(['event_date', 'is_balance_event'], ascending=[True, False])
-        all_events.reset_index(drop=True, inplace=True)
-
-        # --- 残高計算 ---
-        cur_balance = 0
-        balances_by_datetime = []
-        for _, row in all_events.iterrows():
-            d = row['event_date']
-            if row['is_balance_event'] == 1:
-                cur_balance = row['balance']
-            else:
-                cur_balance += row['収支']
-            balances_by_datetime.append((d, cur_balance))
-
-        # --- 日別残高へ変換 ---
-        balance_df_by_day = pd.DataFrame(balances_by_datetime, columns=['datetime', 'balance'])
-        balance_df_by_day = balance_df_by_day.groupby(balance_df_by_day['datetime'].dt.normalize()).last()
-        daily_balance_series = pd.Series(index=date_range, dtype='float64')
-        daily_balance_series.update(balance_df_by_day['balance'])
-        daily_balance_series = daily_balance_series.ffill()
-
-        # --- 収支計算 ---
-        income_ts = pd.Series(0, index=date_range)
-        daily_income = df.groupby('event_date')['収支'].sum()
-        income_ts.update(daily_income)
-
-        temp_df = pd.DataFrame({
-            'date': date_range,
-            f'{account}_収支': income_ts.values,
-            f'{account}_残高': daily_balance_series.values
-        })
-        final_df = final_df.merge(temp_df, on='date', how='left')
+    final_df = build_final_balance_df(data1, [transfer_df, record_df], accounts)
 
     # --- 出力（任意） ---
     if output_csv_path:
         final_df.to_csv(output_csv_path, index=False)
 
     return final_df
+
+
+def build_final_balance_df(
+        balance_df: pd.DataFrame,
+        flow_dfs: list[pd.DataFrame],
+        accounts: dict[str, str]
+    ) -> pd.DataFrame:
+    """
+    読み込み済みの残高データと収支データから、最終残高データを生成する関数
+    入力のデータフレームは変更しません。
+
+    Args:
+        balance_df (pd.DataFrame): balance.csv のデータ（日付は解析済み）
+        flow_dfs (list[pd.DataFrame]): クレジットカード情報付加済みの収支データ（振替・収支）のリスト
+        accounts (dict[str, str]): meta.json の accounts_ja_en
+
+    Returns:
+        pd.DataFrame: 最終残高データを含むデータフレーム
+    """
+    flow_events, balance_events, date_range = prepare_balance_events(balance_df, flow_dfs, accounts)
+    return build_daily_balance_df(flow_events, balance_events, date_range, list(accounts.keys()))
+
+
+def prepare_balance_events(
+        balance_df: pd.DataFrame,
+        flow_dfs: list[pd.DataFrame],
+        accounts: dict[str, str]
+    ) -> tuple[pd.DataFrame, pd.DataFrame, pd.DatetimeIndex]:
+    """
+    残高データと収支データを、全アカウント分の入出金イベント・残高イベントに変換する関数
+    イベントの日付はJSTの日付をUTCに変換して日単位に丸めたものです。
+
+    Args:
+        balance_df (pd.DataFrame): balance.csv のデータ（日付は解析済み）
+        flow_dfs (list[pd.DataFrame]): クレジットカード情報付加済みの収支データ（振替・収支）のリスト
+        accounts (dict[str, str]): meta.json の accounts_ja_en
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame, pd.DatetimeIndex]: 入出金イベント、残高イベント、全データを含む日付範囲
+    """
+    data1 = normalize_balance_dates(balance_df)
+    data2 = normalize_flow_dates(pd.concat(flow_dfs, axis=0))
+
+    # --- 日付範囲 ---
+    min_date = min(data1['日付'].min(), data2['withdrawal_date'].min())
+    max_date = max(data1['日付'].max(), data2['withdrawal_date'].max())
+    date_range = pd.date_range(start=min_date, end=max_date, freq='D', tz='UTC')
+
+    return to_flow_events(data2, accounts), to_balance_events(data1, accounts), date_range
+
+
+def normalize_balance_dates(balance_df: pd.DataFrame) -> pd.DataFrame:
+    """残高データの日付（JST）をUTCに変換して日単位に丸めたコピーを返す"""
+    data1 = balance_df.copy()
+    data1['日付'] = jst_to_utc_day(parse_kakei_dates(data1['日付'], errors='raise'))
+    return data1
+
+
+def normalize_flow_dates(flow_df: pd.DataFrame) -> pd.DataFrame:
+    """収支データの引き落とし日（JST）をUTCに変換して日単位に丸めたコピーを返す"""
+    data2 = flow_df.copy()
+    data2['withdrawal_date'] = jst_to_utc_day(parse_kakei_dates(data2['withdrawal_date']))
+    return data2
+
+
+def to_flow_events(data2: pd.DataFrame, accounts: dict[str, str]) -> pd.DataFrame:
+    """日付を正規化済みの収支データから、対象アカウントの入出金イベントを作る"""
+    flow_df = data2[data2["withdrawal_account"].isin(accounts.keys())]
+    amount = to_amount(flow_df["amount"])
+    return pd.DataFrame({
+        'account': flow_df['withdrawal_account'],
+        'event_date': flow_df['withdrawal_date'],
+        '収支': np.where(flow_df['type'] == '収入', amount, -amount),
+        'is_balance_event': 0,
+    })
+
+
+def to_balance_events(data1: pd.DataFrame, accounts: dict[str, str]) -> pd.DataFrame:
+    """日付を正規化済みの残高データから、対象アカウントの残高イベントを作る"""
+    balance_rows = data1[data1["資産"].isin(accounts.keys())]
+    return pd.DataFrame({
+        'account': balance_rows['資産'],
+        'event_date': balance_rows['日付'],
+        '収支': 0.0,
+        'is_balance_event': 1,
+        'balance': balance_rows['金額'],
+    })
+
+
+def build_daily_balance_df(
+        flow_events: pd.DataFrame,
+        balance_events: pd.DataFrame,
+        date_range: pd.DatetimeIndex,
+        account_names: list[str]
+    ) -> pd.DataFrame:
+    """
+    入出金イベントと残高イベントから、日付 × アカウントの収支・残高データを生成する関数
+
+    Args:
+        flow_events (pd.DataFrame): prepare_balance_events が返す入出金イベント
+        balance_events (pd.DataFrame): prepare_balance_events が返す残高イベント
+        date_range (pd.DatetimeIndex): 出力する日付範囲
+        account_names (list[str]): 出力するアカウント名（日本語）
+
+    Returns:
+        pd.DataFrame: date, {account}_収支, {account}_残高 の列を持つデータフレーム
+    """
+    # --- 残高計算 ---
+    all_events = _replay_balances(pd.concat([flow_events, balance_events], ignore_index=True, sort=False))
+
+    # --- 日別 × アカウントの行列へ変換 ---
+    flow_matrix = _pivot_daily(
+        flow_events.groupby(['account', 'event_date'], observed=True)['収支'].sum(),
+        date_range, account_names, fill_value=0
+    )
+    balance_matrix = _pivot_daily(
+        all_events.groupby(['account', all_events['event_date'].dt.normalize()], observed=True)['cur_balance'].last(),
+        date_range, account_names, fill_value=np.nan
+    )
+    balance_matrix = pd.DataFrame(balance_matrix).ffill().to_numpy()
+
+    columns = {'date': date_range}
+    for i, account in enumerate(account_names):
+        columns[f'{account}_収支'] = flow_matrix[:, i]
+        columns[f'{account}_残高'] = balance_matrix[:, i]
+    return pd.DataFrame(columns)
     
 if __name__ == "__main__":
     final_balance_df = generate_final_balance_df(
@@ -0,0 +1,342 @@
+import contextvars
+import cProfile
+import datetime
+import os
+import resource
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+# 実行中のステージ（copy_dataframe などから record_io で計測値を加算するため）
+_current_stage: contextvars.ContextVar['StageMetrics | None'] = contextvars.ContextVar('current_stage', default=None)
+
+
+def _current_peak_rss() -> int:
+    """プロセスのピークメモリ（バイト）を返す。/proc が使えない場合は getrusage の値を使う"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _reset_peak_rss() -> None:
+    """
+    ステージごとのピークメモリを測るため、プロセスのピークメモリをリセットする（Linuxのみ、失敗しても無視）
+    プロセス全体の値をリセットするので、同じプロセスで同時に行っている他の計測にも影響します。
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def record_io(rows: int = 0, bytes_read: int = 0, bytes_written: int = 0) -> None:
+    """
+    実行中のステージに、DBへ投入した行数と読み書きしたバイト数を加算する関数
+    ステージの外で呼ばれた場合は何もしません。
+    """
+    stage = _current_stage.get()
+    if stage is None:
+        return
+    stage.db_rows += rows
+    stage.bytes_read += bytes_read
+    stage.bytes_written += bytes_written
+
+
+class StageMetrics:
+    """1ステージ分の計測値"""
+
+    def __init__(self, name: str, seq: int, parent: 'StageMetrics | None' = None) -> None:
+        self.name = name
+        self.seq = seq
+        self.parent = parent
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.status = 'running'
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rows_in: int | None = None
+        self.rows_out: int | None = None
+        self.peak_memory_bytes = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.db_rows = 0
+        self.profile: cProfile.Profile | None = None
+
+    @property
+    def db_rows_per_second(self) -> float | None:
+        if self.db_rows == 0 or self.wall_seconds <= 0:
+            return None
+        return self.db_rows / self.wall_seconds
+
+
+class PipelineMetrics:
+    """
+    パイプライン1回分の実行について、ステージごとの実行時間・CPU時間・行数・ピークメモリ・入出力量を記録するクラス
+    save で同じPostgreSQLの pipeline_runs / pipeline_stage_metrics テーブルに書き込むと、
+    Grafanaで家計のダッシュボードと並べてパイプラインの処理時間を確認できます。
+    enabled=False の場合は何も計測しません。
+    ステージのピークメモリは、既定ではステージ終了時点のプロセスのピークメモリ（それまでの最大値）です。
+    reset_peak_memory=True の場合は各ステージの開始時にプロセスのピークメモリをリセットし、ステージ中の最大値を測ります。
+    """
+
+    def __init__(
+            self,
+            trigger: str = 'cli',
+            profile_dir: str | None = None,
+            enabled: bool = True,
+            reset_peak_memory: bool = False
+        ) -> None:
+        """
+        Args:
+            trigger (str): 実行のきっかけ（'cli', 'webhook' など）
+            profile_dir (str | None): 指定すると各ステージを cProfile で計測し、最も遅いステージの結果をここに保存する
+            enabled (bool): False の場合は計測しない
+            reset_peak_memory (bool): ステージごとにプロセスのピークメモリをリセットする。
+                プロセス全体の値を変えるため、1回の実行で終わるプロセス（コマンドラインの実行）でのみ指定してください。
+                webhook.py・watch.py のような常駐プロセスでは、同時に動いている他の計測の値が変わってしまいます。
+        """
+        self.run_id = uuid.uuid4().hex
+        self.trigger = trigger
+        self.profile_dir = profile_dir
+        self.enabled = enabled
+        self.reset_peak_memory = reset_peak_memory
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.finished_at: datetime.datetime | None = None
+        self.status = 'running'
+        self.error: str | None = None
+        self.profile_path: str | None = None
+        self.stages: list[StageMetrics] = []
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int | None = None) -> Iterator[StageMetrics]:
+        """
+        ステージを計測するコンテキストマネージャ
+        ブロック内で rows_in / rows_out を設定できます。DBへの投入行数と読み書きのバイト数は record_io で加算されます。
+        ステージの中で別のステージを計測した場合、時間は親のステージにも含まれます（cProfile は最上位のステージのみ）。
+        CPU時間はプロセス全体の値なので、同時に動いているスレッドの分も含みます。
+
+        Args:
+            name (str): ステージ名
+            rows_in (int | None): 入力の行数
+
+        Yields:
+            StageMetrics: このステージの計測値
+        """
+        parent = _current_stage.get()
+        stage = StageMetrics(name, len(self.stages), parent)
+        stage.rows_in = rows_in
+        if not self.enabled:
+            yield stage
+            return
+
+        self.stages.append(stage)
+        if self.reset_peak_memory:
+            if parent is not None:
+                parent.peak_memory_bytes = max(parent.peak_memory_bytes, _current_peak_rss())
+            _reset_peak_rss()
+
+        if self.profile_dir and parent is None:
+            stage.profile = cProfile.Profile()
+            try:
+                stage.profile.enable()
+            except ValueError:
+                # 他のプロファイラが動いている場合
+                stage.profile = None
+
+        token = _current_stage.set(stage)
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield stage
+            stage.status = 'succeeded'
+        except BaseException:
+            stage.status = 'failed'
+            raise
+        finally:
+            stage.wall_seconds = time.perf_counter() - start_wall
+            stage.cpu_seconds = time.process_time() - start_cpu
+            _current_stage.reset(token)
+            if stage.profile is not None:
+                stage.profile.disable()
+            stage.peak_memory_bytes = max(stage.peak_memory_bytes, _current_peak_rss())
+            if parent is not None:
+                parent.peak_memory_bytes = max(parent.peak_memory_bytes, stage.peak_memory_bytes)
+
+    def finish(self, status: str, error: BaseException | None = None) -> None:
+        """
+        実行の終了を記録し、cProfile を有効にしていれば最も遅いステージの結果を保存する
+
+        Args:
+            status (str): 'succeeded' または 'failed'
+            error (BaseException | None): 失敗した場合の例外
+        """
+        self.finished_at = datetime.datetime.now(datetime.timezone.utc)
+        self.status = status
+        self.error = None if error is None else repr(error)
+        self.wall_seconds = time.perf_counter() - self._start_wall
+        self.cpu_seconds = time.process_time() - self._start_cpu
+
+        profiled = [stage for stage in self.stages if stage.profile is not None]
+        if profiled:
+            slowest = max(profiled, key=lambda stage: stage.wall_seconds)
+            os.makedirs(self.profile_dir, exist_ok=True)
+            self.profile_path = os.path.join(self.profile_dir, f"{self.run_id}_{slowest.name}.prof")
+            slowest.profile.dump_stats(self.profile_path)
+        for stage in profiled:
+            stage.profile = None
+
+    def summary(self) -> str:
+        """ステージごとの計測値を表形式の文字列にする"""
+        lines = [f"⏱️ run {self.run_id} ({self.trigger}): {self.status} {self.wall_seconds:.2f} 秒"]
+        for stage in self.stages:
+            indent = '  ' if stage.parent is None else '    '
+            rows = '' if stage.rows_out is None else f" {stage.rows_out:,} 行"
+            rate = '' if stage.db_rows_per_second is None else f" {stage.db_rows_per_second:,.0f} 行/秒"
+            lines.append(
+                f"{indent}{stage.name}: {stage.wall_seconds:.3f} 秒 (CPU {stage.cpu_seconds:.3f} 秒, "
+                f"{stage.peak_memory_bytes / 1024 / 1024:.0f} MB){rows}{rate}"
+            )
+        if self.profile_path:
+            lines.append(f"  🔬 {self.profile_path}")
+        return "\n".join(lines)
+
+    def save(self, db_config: dict[str, Any]) -> None:
+        """
+        計測値を pipeline_runs / pipeline_stage_metrics テーブルに書き込む関数（テーブルが無ければ作成する）
+        書き込みに失敗してもパイプラインの結果には影響させず、警告を表示するだけにします。
+
+        Args:
+            db_config (dict[str, Any]): データベース接続情報
+        """
+        if not self.enabled:
+            return
+        # db_utils は copy_dataframe から record_io を使うため、ここで読み込む
+        from .db_utils import get_connection, release_connection
+
+        try:
+            conn = get_connection(db_config)
+        except Exception as e:
+            print(f"⚠️ 計測値を保存できませんでした（接続エラー）: {e}")
+            return
+        cursor = conn.cursor()
+        try:
+            create_metrics_tables(cursor)
+            cursor.execute(
+                """
+                INSERT INTO pipeline_runs (
+                    run_id, trigger, started_at, finished_at, status, error,
+                    wall_seconds, cpu_seconds, peak_memory_bytes, profile_path
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """,
+                (
+                    self.run_id, self.trigger, self.started_at, self.finished_at, self.status, self.error,
+                    self.wall_seconds, self.cpu_seconds,
+                    max([stage.peak_memory_bytes for stage in self.stages], default=None), self.profile_path,
+                )
+            )
+            cursor.executemany(
+                """
+                INSERT INTO pipeline_stage_metrics (
+                    run_id, seq, stage, parent_stage, started_at, status, wall_seconds, cpu_seconds,
+                    rows_in, rows_out, peak_memory_bytes, bytes_read, bytes_written, db_rows, db_rows_per_second
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """,
+                [
+                    (
+                        self.run_id, stage.seq, stage.name, None if stage.parent is None else stage.parent.name,
+                        stage.started_at, stage.status, stage.wall_seconds, stage.cpu_seconds,
+                        stage.rows_in, stage.rows_out, stage.peak_memory_bytes,
+                        stage.bytes_read, stage.bytes_written, stage.db_rows, stage.db_rows_per_second,
+                    )
+                    for stage in self.stages
+                ]
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ 計測値を保存できませんでした: {e}")
+        finally:
+            cursor.close()
+            release_connection(conn)
+
+
+def create_metrics_tables(cursor) -> None:
+    """
+    計測値のテーブルが無ければ作成する関数
+    Args:
+        cursor: psycopg2のカーソル
+    Returns:
+        None
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS pipeline_runs (
+        run_id CHAR(32) PRIMARY KEY,
+        trigger VARCHAR(32) NOT NULL,
+        started_at TIMESTAMPTZ NOT NULL,
+        finished_at TIMESTAMPTZ,
+        status VARCHAR(16) NOT NULL,
+        error TEXT,
+        wall_seconds DOUBLE PRECISION,
+        cpu_seconds DOUBLE PRECISION,
+        peak_memory_bytes BIGINT,
+        profile_path TEXT
+    );
+    CREATE INDEX IF NOT EXISTS pipeline_runs_started_at_idx ON pipeline_runs (started_at);
+    CREATE TABLE IF NOT EXISTS pipeline_stage_metrics (
+        id SERIAL PRIMARY KEY,
+        run_id CHAR(32) NOT NULL REFERENCES pipeline_runs (run_id) ON DELETE CASCADE,
+        seq INTEGER NOT NULL,
+        stage VARCHAR(64) NOT NULL,
+        parent_stage VARCHAR(64),
+        started_at TIMESTAMPTZ NOT NULL,
+        status VARCHAR(16) NOT NULL,
+        wall_seconds DOUBLE PRECISION,
+        cpu_seconds DOUBLE PRECISION,
+        rows_in BIGINT,
+        rows_out BIGINT,
+        peak_memory_bytes BIGINT,
+        bytes_read BIGINT,
+        bytes_written BIGINT,
+        db_rows BIGINT,
+        db_rows_per_second DOUBLE PRECISION
+    );
+    CREATE INDEX IF NOT EXISTS pipeline_stage_metrics_run_id_idx ON pipeline_stage_metrics (run_id);
+    CREATE INDEX IF NOT EXISTS pipeline_stage_metrics_started_at_idx ON pipeline_stage_metrics (started_at, stage);
+    """)
+
+
+@contextmanager
+def recording(metrics: PipelineMetrics, db_config: dict[str, Any], save: bool = True) -> Iterator[PipelineMetrics]:
+    """
+    ブロックの実行を1回の実行として記録し、終了時（失敗した場合も）に計測値を表示・保存するコンテキストマネージャ
+
+    Args:
+        metrics (PipelineMetrics): 記録先
+        db_config (dict[str, Any]): 計測値を保存するデータベースの接続情報
+        save (bool): False の場合は表示だけを行い、DBには保存しない（ドライランなど）
+
+    Yields:
+        PipelineMetrics: metrics
+    """
+    try:
+        yield metrics
+    except BaseException as e:
+        metrics.finish('failed', e)
+        raise
+    else:
+        metrics.finish('succeeded')
+    finally:
+        if metrics.enabled:
+            print(metrics.summary())
+            if save:
+                metrics.save(db_config)
@@ -0,0 +1,307 @@
+import functools
+import os
+import pandas as pd
+from typing import Any, Callable
+
+from .add_card_info import process_record_df
+from .transfer import process_transfer_df
+from .make_final_balance import build_final_balance_df
+from .balance_checkpoint import (
+    build_final_balance_df_incremental,
+    load_balance_state,
+    merge_final_balance_window,
+    save_balance_state,
+)
+from .finalbalance2db import insert_final_balance_df_to_db, upsert_final_balance_df_to_db
+from .finalbalance_long import FINAL_LAYOUTS, upsert_long_balance_df_to_db
+from .finalbalance_sparse import insert_sparse_balance_df_to_db, to_sparse_balance_df
+from .record2db import insert_record_df_to_postgres
+from .stage_cache import StageCache
+from .metrics import PipelineMetrics
+from .config import load_meta, pipeline_stage_keys, select_stages
+from .schema import BALANCE_SCHEMA, RECORD_SCHEMA, TRANSFER_SCHEMA, read_typed_csv
+
+
+def export_frame(
+        df: pd.DataFrame,
+        export_dir: str,
+        name: str,
+        export_format: str = 'parquet'
+    ) -> str:
+    """
+    中間データをデバッグ・確認用にファイルへ書き出す関数
+    Parquet の書き出しには pyarrow が必要です。インストールされていない場合はCSVで書き出します。
+
+    Args:
+        df (pd.DataFrame): 書き出すデータ
+        export_dir (str): 出力ディレクトリ
+        name (str): ファイル名（拡張子なし）
+        export_format (str): 'parquet' または 'csv'
+
+    Returns:
+        str: 書き出したファイルのパス
+    """
+    os.makedirs(export_dir, exist_ok=True)
+
+    if export_format == 'parquet':
+        path = os.path.join(export_dir, f"{name}.parquet")
+        try:
+            df.to_parquet(path, index=False)
+            return path
+        except ImportError:
+            print("⚠️ pyarrow がインストールされていないため、CSVで書き出します。")
+
+    path = os.path.join(export_dir, f"{name}.csv")
+    df.to_csv(path, index=False)
+    return path
+
+
+def run_pipeline(
+        db_config: dict[str, Any],
+        input_transfer_path: str,
+        input_record_path: str,
+        input_balance_path: str,
+        meta_json_path: str,
+        table_name_record: str = 'kakeibo',
+        table_name_final: str = 'kakeibo_2',
+        record_mode: str = 'full',
+        export_dir: str | None = None,
+        export_format: str = 'parquet',
+        state_path: str | None = None,
+        cache_dir: str | None = None,
+        cache_max_entries: int = 20,
+        metrics: PipelineMetrics | None = None,
+        final_layout: str = 'wide',
+        stages: list[str] | None = None,
+        dry_run: bool = False,
+        on_final_balance: Callable[[pd.DataFrame, dict[str, str], pd.Timestamp | None], Any] | None = None
+    ) -> pd.DataFrame | None:
+    """
+    入力CSVとmeta.jsonを1回ずつ読み込み、各処理の間はDataFrameをメモリ上で受け渡してパイプライン全体を実行する関数
+    中間データ（振替・収支・最終残高）のファイル出力は export_dir を指定した場合のみ行います。
+    state_path を指定すると、最終残高データは前回実行時からイベントが変わった日以降だけを再計算し、
+    その期間の行だけをテーブルに反映します（この場合、出力される最終残高データと on_final_balance に渡すデータは
+    再計算した期間のみです。戻り値は前回の全期間のデータ（キャッシュ）とつなげた全期間のデータで、
+    キャッシュに無い場合は全期間を計算し直します）。
+    cache_dir を指定すると、入力ファイルの内容とmeta.jsonの該当部分が前回と同じステージはキャッシュを使うか
+    スキップし、変わった入力に依存するステージだけを実行します。
+    stages を指定すると、そのステージだけをキャッシュを使わずに実行します。指定しなかったステージのうち、
+    後のステージに必要なもの（振替・収支の変換）はキャッシュを使い、キャッシュに無ければ実行します。
+
+    Args:
+        db_config (dict[str, Any]): データベース接続情報
+        input_transfer_path (str): transfer.csv のパス
+        input_record_path (str): record.csv のパス
+        input_balance_path (str): balance.csv のパス
+        meta_json_path (str): meta.jsonのパス
+        table_name_record (str): recordデータの挿入先テーブル名
+        table_name_final (str): 最終残高データの挿入先テーブル名
+        record_mode (str): recordデータの挿入モード（'full' または 'delta'）
+        export_dir (str | None): 中間データの出力ディレクトリ。指定しない場合は出力しません。
+        export_format (str): 中間データの出力形式（'parquet' または 'csv'）
+        state_path (str | None): 最終残高の差分計算に使う状態ファイルのパス。指定しない場合は毎回全期間を計算します。
+        cache_dir (str | None): ステージキャッシュの保存先。指定しない場合はキャッシュを使いません。
+        cache_max_entries (int): ステージキャッシュに保存する出力の最大件数
+        metrics (PipelineMetrics | None): ステージごとの計測値の記録先。指定しない場合は計測しません。
+        final_layout (str): 最終残高データのレイアウト（'wide'、'long' または 'sparse'）。
+            'long' の場合は {table_name_final}_long に縦持ちで反映し、table_name_final は横持ちの互換ビューになります。
+            'sparse' の場合は変化のあった日だけを {table_name_final}_changes に保存し（毎回全期間）、
+            table_name_final は前方補完した横持ちの互換ビューになります。中間データの最終残高も変化のあった日だけを書き出します。
+        stages (list[str] | None): 実行するステージ（PIPELINE_STAGES の名前）。None の場合は全てのステージ
+        dry_run (bool): True の場合はDBに接続せず、DBに書き込むステージは書き込む行数の表示だけを行います。
+            状態ファイル・ステージの完了の記録も更新しません。
+        on_final_balance (Callable | None): 最終残高データをDBに反映した後に、
+            (最終残高データ, accounts_ja_en, 反映した期間の開始日（全期間の場合は None）) を渡して呼び出す関数
+
+    Returns:
+        pd.DataFrame | None: 全期間の最終残高データ。全ステージをスキップした場合はキャッシュに保存した前回の
+            全期間のデータ（最終残高を生成しない場合、全ステージをスキップしキャッシュにも無い場合は None）
+    """
+    if final_layout not in FINAL_LAYOUTS:
+        raise ValueError(f"final_layout は {', '.join(FINAL_LAYOUTS)} のいずれかを指定してください: {final_layout}")
+    selected = set(select_stages(stages))
+    cache = StageCache(cache_dir, max_entries=cache_max_entries)
+    metrics = metrics or PipelineMetrics(enabled=False)
+
+    def forced(stage_name: str) -> bool:
+        """明示的に指定されたステージは、キャッシュ・完了の記録を使わずに実行する"""
+        return stages is not None and stage_name in selected
+
+    # --- 入力読み込み（必要になった時に各1回） ---
+    meta = load_meta(meta_json_path)
+    card_settings = meta["card_settings"]
+    bank_closures = meta.get("bank_closures", [])
+    accounts = meta["accounts_ja_en"]
+
+    def read_csv(stage_name: str, path: str, schema: dict[str, str], **read_csv_kwargs) -> pd.DataFrame:
+        with metrics.stage(stage_name) as stage:
+            df = read_typed_csv(path, schema, **read_csv_kwargs)
+            stage.bytes_read = os.path.getsize(path)
+            stage.rows_out = len(df)
+        return df
+
+    @functools.cache
+    def read_record() -> pd.DataFrame:
+        return read_csv('read_record_csv', input_record_path, RECORD_SCHEMA, encoding='utf-8')
+
+    @functools.cache
+    def read_transfer() -> pd.DataFrame:
+        return read_csv('read_transfer_csv', input_transfer_path, TRANSFER_SCHEMA, encoding='utf-8')
+
+    @functools.cache
+    def read_balance() -> pd.DataFrame:
+        return read_csv('read_balance_csv', input_balance_path, BALANCE_SCHEMA)
+
+    # --- ステージのキャッシュキー（入力ファイルの内容とmeta.jsonの該当部分） ---
+    keys = pipeline_stage_keys(
+        input_transfer_path, input_record_path, input_balance_path, meta,
+        table_name_record, table_name_final, record_mode, state_path, final_layout,
+        use_digests=cache.enabled
+    )
+    final_key = keys['insert_final_balance_to_db']
+
+    # record.csvをPostgreSQLにインサート
+    if 'insert_csv_to_postgres' in selected:
+        with metrics.stage('insert_csv_to_postgres') as stage:
+            def insert_records() -> None:
+                record_df = read_record()
+                stage.rows_in = len(record_df)
+                if dry_run:
+                    print(f"🧪 ドライラン: {table_name_record} に {len(record_df):,} 行を投入します（{record_mode}）。")
+                    return
+                insert_record_df_to_postgres(db_config, record_df, table_name=table_name_record, mode=record_mode)
+
+            if dry_run:
+                insert_records()
+            elif forced('insert_csv_to_postgres'):
+                insert_records()
+                cache.mark_done('insert_csv_to_postgres', keys['insert_csv_to_postgres'])
+            else:
+                cache.run_once('insert_csv_to_postgres', keys['insert_csv_to_postgres'], insert_records)
+
+    if not selected - {'insert_csv_to_postgres'}:
+        return None
+
+    insert_final = 'insert_final_balance_to_db' in selected
+    needs_final = bool(selected & {'generate_final_balance_df', 'insert_final_balance_to_db'})
+
+    # 最終残高データの投入まで前回成功時と同じ入力なら、以降のステージは実行しない
+    if (
+        insert_final
+        and not dry_run
+        and not forced('insert_final_balance_to_db')
+        and cache.is_done('insert_final_balance_to_db', final_key)
+    ):
+        print("⏭️ 最終残高データ: 入力が変わっていないため、スキップします。")
+        return cache.get(final_key)
+
+    def cached_stage(stage_name: str, compute) -> pd.DataFrame:
+        """出力を持つステージを実行する（指定されたステージ以外はキャッシュがあればそれを使う）"""
+        with metrics.stage(stage_name) as stage:
+            if forced(stage_name):
+                df = compute(stage)
+                cache.put(keys[stage_name], df)
+            else:
+                df = cache.get_or_compute(stage_name, keys[stage_name], lambda: compute(stage))
+            stage.rows_out = len(df)
+        return df
+
+    frames = []
+
+    # transfer(振替)データを収支データに変換し、クレジットカード情報を追加
+    if needs_final or 'process_transfer_csv' in selected:
+        def process_transfers(stage) -> pd.DataFrame:
+            transfer_df = read_transfer()
+            stage.rows_in = len(transfer_df)
+            return process_transfer_df(transfer_df, card_settings, bank_closures=bank_closures)
+
+        transfer_flow_df = cached_stage('process_transfer_csv', process_transfers)
+        frames.append(('transfer', transfer_flow_df))
+        print("✅ 振替データの変換が完了しました。")
+
+    # record(収支)データにクレジットカード情報を追加
+    if needs_final or 'process_and_save_kakeibo_data' in selected:
+        def process_records(stage) -> pd.DataFrame:
+            record_df = read_record()
+            stage.rows_in = len(record_df)
+            return process_record_df(record_df, card_settings, bank_closures)
+
+        record_flow_df = cached_stage('process_and_save_kakeibo_data', process_records)
+        frames.append(('record', record_flow_df))
+
+    # 最終残高データの生成（状態ファイルによる差分計算は、DBに反映する場合のみ）
+    final_balance_df = None
+    balance_state = None
+    if needs_final:
+        balance_df = read_balance()
+        flow_dfs = [transfer_flow_df, record_flow_df]
+        from_date = None
+        with metrics.stage('generate_final_balance_df') as stage:
+            stage.rows_in = len(balance_df) + len(transfer_flow_df) + len(record_flow_df)
+            if state_path and insert_final and final_layout != 'sparse':
+                final_balance_df, from_date, balance_state = build_final_balance_df_incremental(
+                    balance_df, flow_dfs, accounts, load_balance_state(state_path)
+                )
+            else:
+                final_balance_df = build_final_balance_df(balance_df, flow_dfs, accounts)
+            stage.rows_out = len(final_balance_df)
+        frames.append((
+            'final_balance',
+            to_sparse_balance_df(final_balance_df, accounts) if final_layout == 'sparse' else final_balance_df
+        ))
+        print("✅ 最終残高データの生成が完了しました。")
+
+    def full_final_balance_df() -> pd.DataFrame:
+        """差分だけを再計算した場合も、戻り値とキャッシュは全期間の最終残高データにする"""
+        if from_date is None:
+            return final_balance_df
+        previous_df = None
+        previous_key = cache.done_key('insert_final_balance_to_db')
+        if previous_key is not None:
+            previous_df = cache.get(previous_key)
+        full_df = merge_final_balance_window(previous_df, final_balance_df, from_date, balance_state)
+        if full_df is None:
+            full_df = build_final_balance_df(balance_df, flow_dfs, accounts)
+        return full_df
+
+    if export_dir:
+        with metrics.stage('export_frames') as stage:
+            for name, df in frames:
+                path = export_frame(df, export_dir, name, export_format)
+                stage.bytes_written += os.path.getsize(path)
+                print(f"💾 {path} に書き出しました。")
+
+    if not insert_final:
+        return final_balance_df
+
+    with metrics.stage('insert_final_balance_to_db', rows_in=len(final_balance_df)):
+        if dry_run:
+            period = '全期間' if from_date is None else f"{from_date.date()} 以降"
+            print(
+                f"🧪 ドライラン: {table_name_final}（{final_layout}）に {len(final_balance_df):,} 日分を反映します（{period}）。"
+            )
+            return full_final_balance_df()
+        if final_layout == 'sparse':
+            insert_sparse_balance_df_to_db(db_config, final_balance_df, accounts, table_name_final)
+        elif final_layout == 'long':
+            if not upsert_long_balance_df_to_db(db_config, final_balance_df, accounts, table_name_final, from_date):
+                # 前回が縦持ちでの反映でない場合は全期間を反映し直す
+                final_balance_df, from_date = build_final_balance_df(balance_df, flow_dfs, accounts), None
+                upsert_long_balance_df_to_db(db_config, final_balance_df, accounts, table_name_final)
+        elif from_date is None:
+            insert_final_balance_df_to_db(db_config, final_balance_df, accounts, table_name_final)
+        elif not upsert_final_balance_df_to_db(db_config, final_balance_df, accounts, table_name_final, from_date):
+            # テーブルが無い・構成が違う場合は全期間を作り直す
+            final_balance_df, from_date = build_final_balance_df(balance_df, flow_dfs, accounts), None
+            insert_final_balance_df_to_db(db_config, final_balance_df, accounts, table_name_final)
+
+    # DBへの反映が終わってから状態を保存する（前回の全期間のデータを読むため、完了の記録より前に作る）
+    full_balance_df = full_final_balance_df()
+    if state_path and balance_state is not None:
+        save_balance_state(state_path, balance_state)
+    cache.put(final_key, full_balance_df)
+    cache.mark_done('insert_final_balance_to_db', final_key)
+    if on_final_balance is not None:
+        on_final_balance(final_balance_df, accounts, from_date)
+
+    return full_balance_df
@@ -1,32 +1,68 @@
+import hashlib
 import pandas as pd
-import psycopg2
-from psycopg2 import sql
-import pytz
-from typing import Any
+from typing import Any, Iterable
+
+from .dates import jst_to_utc, parse_kakei_dates
+from .schema import RECORD_SCHEMA, read_typed_csv, to_amount
+from .db_utils import copy_dataframe, get_connection, release_connection, staging_table_name, swap_in_staging_table
+from .record_rollup import LOCAL_DATE_SQL, changed_months, create_rollup_tables, refresh_record_rollups
+
+# record.csv のカラム（日本語）と kakeibo テーブルのカラムの対応
+RECORD_COLUMNS = {
+    '日付': 'date',
+    '収入/支出': 'income_or_expense',
+    'カテゴリ': 'category',
+    'サブカテゴリ': 'sub_category',
+    '金額': 'amount',
+    '店舗/場所': 'location',
+    'メモ': 'memo',
+    '入金/支払い方法': 'payment_method',
+    '銀行口座/カード等': 'bank_account_or_card',
+    'タグ': 'tag',
+}
+
+# フィンガープリントの計算に使うカラム（日付・収支・カテゴリ・金額・場所・メモ・口座）
+FINGERPRINT_COLUMNS = ['日付', '収入/支出', 'カテゴリ', '金額', '店舗/場所', 'メモ', '銀行口座/カード等']
+
+
+def add_record_fingerprint(df: pd.DataFrame, seen: dict[str, int] | None = None) -> pd.DataFrame:
+    """
+    各レコードに内容から決まるフィンガープリント（SHA-1）を付与する関数
+    同じ内容のレコードが複数ある場合（同じ時刻に同じ店で同じ金額など）は、出現順の連番を含めて区別します。
+    日付順のファイルを分割して処理する場合は、同じ seen を渡すと直前のチャンクから連番を引き継ぎます
+    （seen には直前のチャンクに現れた内容ごとの出現数だけが残ります）。
 
-def insert_csv_to_postgres(
-        db_config: dict[str, Any],
-        input_record_path: str,
-        table_name: str = 'kakeibo'
-        ) -> None:
-    """    recordファイルをPostgreSQLデータベースに挿入する関数
     Args:
-        db_config (dict): データベース接続情報
-        input_record_path (str): 生データのrecordファイルのパス
-        table_name (str): 挿入先のテーブル名（デフォルトは 'kakeibo'）
+        df (pd.DataFrame): 日本語カラムのrecordデータ
+        seen (dict[str, int] | None): 直前のチャンクまでの出現数。呼び出し後にこのチャンクの出現数で置き換えます
+    Returns:
+        pd.DataFrame: fingerprint 列を追加したデータフレーム
+    """
+    key = df[FINGERPRINT_COLUMNS[0]].dt.strftime('%Y-%m-%d %H:%M:%S').fillna('')
+    for column in FINGERPRINT_COLUMNS[1:]:
+        key = key.str.cat(df[column].astype(str).where(df[column].notna(), ''), sep='\x1f')
+    occurrence = key.groupby(key).cumcount()
+    if seen is not None:
+        occurrence = occurrence + key.map(seen).fillna(0).astype(int)
+        counts = (occurrence + 1).groupby(key).max()
+        seen.clear()
+        seen.update(counts.to_dict())
+    key = key.str.cat(occurrence.astype(str), sep='\x1f')
+    df['fingerprint'] = [hashlib.sha1(k.encode('utf-8')).hexdigest() for k in key]
+    return df
+
+
+def create_record_table(cursor, table_name: str) -> None:
+    """
+    kakeibo テーブルを（既存なら削除して）作成する関数
+    インデックスはデータ投入後に create_record_indexes で作成します。
+    Args:
+        cursor: psycopg2のカーソル
+        table_name (str): 作成するテーブル名
     Returns:
         None
     """
-    # 接続を確立
-    try:
-        conn = psycopg2.connect(**db_config)
-        cursor = conn.cursor()
-        print("PostgreSQLに接続しました。")
-    except Exception as e:
-        print(f"データベース接続エラー: {e}")
-        exit()
-    # テーブル作成SQL
-    create_table_sql = f"""
+    cursor.execute(f"""
     DROP TABLE IF EXISTS {table_name};
     CREATE TABLE {table_name} (
         id SERIAL PRIMARY KEY,
@@ -39,67 +75,272 @@ def insert_csv_to_postgres(
         memo TEXT,
         payment_method VARCHAR(255),
         bank_account_or_card VARCHAR(255),
-        tag TEXT
+        tag TEXT,
+        fingerprint CHAR(40) NOT NULL
     );
+    """)
+
+
+def create_record_indexes(cursor, table_name: str) -> None:
     """
+    kakeibo テーブルのインデックスを作成する関数
+    フィンガープリントの一意インデックスに加え、Grafana のパネルが絞り込み・集計に使う
+    日付、カテゴリ・サブカテゴリ、口座のインデックスを作成します。既にあるインデックスは作り直しません。
+    Args:
+        cursor: psycopg2のカーソル
+        table_name (str): 対象のテーブル名
+    Returns:
+        None
+    """
+    cursor.execute(f"""
+    CREATE UNIQUE INDEX IF NOT EXISTS {table_name}_fingerprint_idx ON {table_name} (fingerprint);
+    CREATE INDEX IF NOT EXISTS {table_name}_date_idx ON {table_name} (date);
+    CREATE INDEX IF NOT EXISTS {table_name}_category_idx ON {table_name} (category, sub_category, date);
+    CREATE INDEX IF NOT EXISTS {table_name}_account_idx ON {table_name} (bank_account_or_card, date);
+    """)
 
-    cursor.execute(create_table_sql)
-    conn.commit()
 
-    # CSVをDataFrameで読み込む
-    df = pd.read_csv(input_record_path, encoding='utf-8')
+def _has_fingerprint_column(cursor, table_name: str) -> bool:
+    """テーブルが存在し、fingerprint カラムを持っているかを返す"""
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s AND column_name = 'fingerprint'
+        """,
+        (table_name,)
+    )
+    return cursor.fetchone() is not None
+
+
+def _prepare_record_rows(record_df: pd.DataFrame, seen: dict[str, int] | None = None) -> pd.DataFrame:
+    """
+    recordデータにフィンガープリントを付与し、日付をUTC・金額を整数に変換したコピーを返す関数
+    Args:
+        record_df (pd.DataFrame): 日本語カラムのrecordデータ
+        seen (dict[str, int] | None): add_record_fingerprint に渡す出現数（チャンク処理用）
+    Returns:
+        pd.DataFrame: 変換後のデータフレーム
+    """
+    df = record_df.copy()
+
+    # 日付列を datetime に変換（解析済みならそのまま）
+    df['日付'] = parse_kakei_dates(df['日付'])
 
-    # 日付列を datetime に強制変換（formatが合ってる場合）
-    df['日付'] = pd.to_datetime(df['日付'], errors='coerce')
+    # 変換前（JST）の内容でフィンガープリントを付与
+    df = add_record_fingerprint(df, seen)
 
     # JST → UTC に変換
-    jst = pytz.timezone('Asia/Tokyo')
-    df['日付'] = df['日付'].apply(lambda d: jst.localize(d).astimezone(pytz.utc) if pd.isna(d.tzinfo) else d.astimezone(pytz.utc))
+    df['日付'] = jst_to_utc(df['日付'])
 
     # 金額を整数に変換（エラー処理付き）
-    df['金額'] = pd.to_numeric(df['金額'], errors='coerce').fillna(0).astype(int)
-
-    # 必要な列の順序でデータをタプルのリストに変換
-    records = list(df[
-        ['日付',
-         '収入/支出',
-         'カテゴリ',
-         'サブカテゴリ',
-         '金額',
-         '店舗/場所',
-         'メモ',
-         '入金/支払い方法',
-         '銀行口座/カード等',
-         'タグ']].itertuples(index=False, name=None))
-
-
-    # executemanyで一括INSERT
-    insert_query = sql.SQL(f"""
-        INSERT INTO {table_name} (
-            date,
-            income_or_expense,
-            category,
-            sub_category,
-            amount,
-            location,
-            memo,
-            payment_method,
-            bank_account_or_card,
-            tag
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """)
+    df['金額'] = to_amount(df['金額'])
+    return df
+
+
+def insert_csv_to_postgres(
+        db_config: dict[str, Any],
+        input_record_path: str,
+        table_name: str = 'kakeibo',
+        mode: str = 'full'
+        ) -> None:
+    """    recordファイルをPostgreSQLデータベースに挿入する関数
+    mode='full' では全件をステージングテーブルに投入してから本番テーブルと入れ替えます。
+    mode='delta' ではレコードのフィンガープリントを既存テーブルと比較し、
+    新しいレコードの挿入と消えたレコードの削除だけを1トランザクションで行います。
+    テーブルが存在しない、またはフィンガープリント列を持たない場合は full と同じ動作になります。
+    同じトランザクション内で集計テーブル（月別カテゴリ・月別口座・日別）も更新し、
+    delta では追加・削除のあった月だけを集計し直します。
+    Args:
+        db_config (dict): データベース接続情報
+        input_record_path (str): 生データのrecordファイルのパス
+        table_name (str): 挿入先のテーブル名（デフォルトは 'kakeibo'）
+        mode (str): 'full' または 'delta'（デフォルトは 'full'）
+    Returns:
+        None
+    """
+    # CSVをDataFrameで読み込む
+    df = read_typed_csv(input_record_path, RECORD_SCHEMA, encoding='utf-8')
+
+    insert_record_df_to_postgres(db_config, df, table_name=table_name, mode=mode)
+
 
+def insert_record_df_to_postgres(
+        db_config: dict[str, Any],
+        record_df: pd.DataFrame,
+        table_name: str = 'kakeibo',
+        mode: str = 'full'
+        ) -> None:
+    """    読み込み済みのrecordデータをPostgreSQLデータベースに挿入する関数
+    挿入の動作は insert_csv_to_postgres と同じです。入力のデータフレームは変更しません。
+    Args:
+        db_config (dict): データベース接続情報
+        record_df (pd.DataFrame): 日本語カラムのrecordデータ
+        table_name (str): 挿入先のテーブル名（デフォルトは 'kakeibo'）
+        mode (str): 'full' または 'delta'（デフォルトは 'full'）
+    Returns:
+        None
+    """
+    if mode not in ('full', 'delta'):
+        raise ValueError(f"mode は 'full' か 'delta' を指定してください: {mode}")
+
+    df = _prepare_record_rows(record_df)
+
+    # 接続を確立
     try:
+        conn = get_connection(db_config)
         cursor = conn.cursor()
-        cursor.executemany(insert_query, records)
+        print("PostgreSQLに接続しました。")
+    except Exception as e:
+        print(f"データベース接続エラー: {e}")
+        raise
+
+    try:
+        rollups_created = create_rollup_tables(cursor, table_name)
+        if mode == 'delta' and _has_fingerprint_column(cursor, table_name):
+            # 読み取りは許可しつつ、他の書き込みとは排他にする
+            cursor.execute(f"LOCK TABLE {table_name} IN SHARE ROW EXCLUSIVE MODE")
+            cursor.execute(f"SELECT fingerprint FROM {table_name}")
+            existing = pd.Index([row[0] for row in cursor.fetchall()])
+
+            vanished = existing.difference(df['fingerprint'])
+            vanished_dates = []
+            if len(vanished) > 0:
+                cursor.execute(
+                    f"DELETE FROM {table_name} WHERE fingerprint = ANY(%s) RETURNING date",
+                    (list(vanished),)
+                )
+                vanished_dates = [row[0] for row in cursor.fetchall()]
+            df = df[~df['fingerprint'].isin(existing)]
+            print(f"差分: 追加 {len(df)} 行 / 削除 {len(vanished)} 行")
+            # 以前のバージョンで作成したテーブルにもインデックスを追加する
+            create_record_indexes(cursor, table_name)
+            target_table = table_name
+        else:
+            # ステージングテーブルに投入してから本番テーブルと入れ替える
+            target_table = staging_table_name(table_name)
+            create_record_table(cursor, target_table)
+
+        # COPYで一括投入
+        copy_dataframe(
+            cursor,
+            df[list(RECORD_COLUMNS) + ['fingerprint']],
+            target_table,
+            columns=list(RECORD_COLUMNS.values()) + ['fingerprint']
+        )
+
+        if target_table != table_name:
+            create_record_indexes(cursor, target_table)
+            swap_in_staging_table(cursor, table_name)
+            refresh_record_rollups(cursor, table_name)
+        elif rollups_created:
+            refresh_record_rollups(cursor, table_name)
+        else:
+            months = changed_months(vanished_dates + list(df['日付']))
+            refresh_record_rollups(cursor, table_name, months)
+            print(f"📊 集計テーブルを {len(months)} か月分更新しました。")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print("エラーが発生:", e)
+        raise
+    finally:
+        cursor.close()
+        release_connection(conn)
+
+
+def insert_record_chunks_to_postgres(
+        db_config: dict[str, Any],
+        record_chunks: Iterable[pd.DataFrame],
+        table_name: str = 'kakeibo',
+        mode: str = 'full'
+        ) -> None:
+    """    チャンクに分割したrecordデータを、1チャンクずつCOPYしてPostgreSQLデータベースに挿入する関数
+    メモリ上に保持するのは1チャンク分だけなので、全体の行数によらずメモリ使用量はチャンクサイズで決まります。
+    mode='full' ではステージングテーブルに全チャンクを投入してから本番テーブルと入れ替えます。
+    mode='delta' では一時テーブルに全チャンクを投入し、既存テーブルとのフィンガープリントの比較と
+    追加・削除をデータベース側で行います。どちらも1トランザクションで、集計テーブルも同時に更新します。
+    record_chunks は日付順のファイルを順に分割したものを想定しています（同じ内容のレコードの連番を引き継ぐため）。
+    Args:
+        db_config (dict): データベース接続情報
+        record_chunks (Iterable[pd.DataFrame]): 日本語カラムのrecordデータのチャンク
+        table_name (str): 挿入先のテーブル名（デフォルトは 'kakeibo'）
+        mode (str): 'full' または 'delta'（デフォルトは 'full'）
+    Returns:
+        None
+    """
+    if mode not in ('full', 'delta'):
+        raise ValueError(f"mode は 'full' か 'delta' を指定してください: {mode}")
+
+    # 接続を確立
+    try:
+        conn = get_connection(db_config)
+        cursor = conn.cursor()
+        print("PostgreSQLに接続しました。")
+    except Exception as e:
+        print(f"データベース接続エラー: {e}")
+        raise
+
+    columns = list(RECORD_COLUMNS.values()) + ['fingerprint']
+    try:
+        rollups_created = create_rollup_tables(cursor, table_name)
+        delta = mode == 'delta' and _has_fingerprint_column(cursor, table_name)
+        if delta:
+            # 読み取りは許可しつつ、他の書き込みとは排他にする
+            cursor.execute(f"LOCK TABLE {table_name} IN SHARE ROW EXCLUSIVE MODE")
+            target_table = f"{table_name}_incoming"
+            cursor.execute(f"""
+            CREATE TEMP TABLE {target_table} ON COMMIT DROP AS
+            SELECT {', '.join(columns)} FROM {table_name} WITH NO DATA
+            """)
+        else:
+            target_table = staging_table_name(table_name)
+            create_record_table(cursor, target_table)
+
+        seen: dict[str, int] = {}
+        for chunk in record_chunks:
+            df = _prepare_record_rows(chunk, seen)
+            copy_dataframe(cursor, df[list(RECORD_COLUMNS) + ['fingerprint']], target_table, columns=columns)
+
+        if delta:
+            cursor.execute(f"CREATE INDEX ON {target_table} (fingerprint); ANALYZE {target_table};")
+            cursor.execute(f"""
+            WITH deleted AS (
+                DELETE FROM {table_name} t
+                WHERE NOT EXISTS (SELECT 1 FROM {target_table} i WHERE i.fingerprint = t.fingerprint)
+                RETURNING t.date
+            ), inserted AS (
+                INSERT INTO {table_name} ({', '.join(columns)})
+                SELECT {', '.join(columns)} FROM {target_table} i
+                WHERE NOT EXISTS (SELECT 1 FROM {table_name} t WHERE t.fingerprint = i.fingerprint)
+                RETURNING date
+            ), changed AS (
+                SELECT date FROM deleted UNION ALL SELECT date FROM inserted
+            )
+            SELECT
+                (SELECT COUNT(*) FROM inserted),
+                (SELECT COUNT(*) FROM deleted),
+                ARRAY(SELECT DISTINCT date_trunc('month', {LOCAL_DATE_SQL})::date FROM changed ORDER BY 1)
+            """)
+            inserted_count, deleted_count, months = cursor.fetchone()
+            print(f"差分: 追加 {inserted_count} 行 / 削除 {deleted_count} 行")
+            create_record_indexes(cursor, table_name)
+            if rollups_created:
+                refresh_record_rollups(cursor, table_name)
+            else:
+                refresh_record_rollups(cursor, table_name, months)
+                print(f"📊 集計テーブルを {len(months)} か月分更新しました。")
+        else:
+            create_record_indexes(cursor, target_table)
+            swap_in_staging_table(cursor, table_name)
+            refresh_record_rollups(cursor, table_name)
         conn.commit()
-        print(f"{len(records)} 行を一括挿入しました。")
     except Exception as e:
         conn.rollback()
         print("エラーが発生:", e)
+        raise
     finally:
         cursor.close()
-        conn.close()
+        release_connection(conn)
 
 if __name__ == '__main__':
     pass
\ No newline at end of file
@@ -0,0 +1,144 @@
+import pandas as pd
+from typing import Iterable
+
+from .dates import utc_to_jst
+
+# kakeibo テーブルの date は UTC で保存しているため、集計は日本時間に直した日付・月で行う
+LOCAL_DATE_SQL = "((date AT TIME ZONE 'UTC') AT TIME ZONE 'Asia/Tokyo')"
+
+
+def rollup_table_names(table_name: str) -> dict[str, str]:
+    """
+    recordテーブルに対応する集計テーブル名を返す関数
+    Args:
+        table_name (str): recordテーブル名
+    Returns:
+        dict[str, str]: 集計の種類と集計テーブル名の対応
+    """
+    return {
+        'monthly_category': f"{table_name}_monthly_category",
+        'monthly_account': f"{table_name}_monthly_account",
+        'daily': f"{table_name}_daily",
+    }
+
+
+def create_rollup_tables(cursor, table_name: str) -> bool:
+    """
+    集計テーブルが無ければ作成する関数
+    - {table}_monthly_category: 月・収支・カテゴリ・サブカテゴリごとの合計金額と件数
+    - {table}_monthly_account: 月・収支・口座ごとの合計金額と件数
+    - {table}_daily: 日ごとの収入・支出の合計金額と件数
+    Args:
+        cursor: psycopg2のカーソル
+        table_name (str): recordテーブル名
+    Returns:
+        bool: いずれかの集計テーブルを新しく作成した場合は True
+    """
+    names = rollup_table_names(table_name)
+    cursor.execute(
+        "SELECT tablename FROM pg_tables WHERE schemaname = current_schema() AND tablename = ANY(%s)",
+        (list(names.values()),)
+    )
+    existing = {row[0] for row in cursor.fetchall()}
+
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {names['monthly_category']} (
+        month DATE NOT NULL,
+        income_or_expense VARCHAR(255),
+        category VARCHAR(255),
+        sub_category VARCHAR(255),
+        amount BIGINT NOT NULL,
+        record_count INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS {names['monthly_category']}_month_idx ON {names['monthly_category']} (month);
+    CREATE TABLE IF NOT EXISTS {names['monthly_account']} (
+        month DATE NOT NULL,
+        income_or_expense VARCHAR(255),
+        bank_account_or_card VARCHAR(255),
+        amount BIGINT NOT NULL,
+        record_count INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS {names['monthly_account']}_month_idx ON {names['monthly_account']} (month);
+    CREATE TABLE IF NOT EXISTS {names['daily']} (
+        date DATE PRIMARY KEY,
+        income BIGINT NOT NULL,
+        expense BIGINT NOT NULL,
+        record_count INTEGER NOT NULL
+    );
+    """)
+    return len(existing) < len(names)
+
+
+def changed_months(dates: Iterable) -> list:
+    """
+    変更のあったレコードの日時（UTC）から、日本時間で集計し直す必要がある月の一覧を返す関数
+    Args:
+        dates (Iterable): 追加・削除したレコードの日時（UTC）
+    Returns:
+        list: 各月の1日（datetime.date）のリスト
+    """
+    utc = pd.to_datetime(pd.Series(list(dates), dtype=object), utc=True, errors='coerce').dropna()
+    months = utc_to_jst(utc).dt.to_period('M').unique()
+    return sorted(month.start_time.date() for month in months)
+
+
+def refresh_record_rollups(cursor, table_name: str, months: list | None = None) -> None:
+    """
+    集計テーブルを更新する関数
+    months を指定した場合はその月の集計だけを削除して作り直し、None の場合は全期間を作り直します。
+    呼び出し側のトランザクション内で実行するため、コミットまで読み取り側には更新前の集計が見えます。
+    Args:
+        cursor: psycopg2のカーソル
+        table_name (str): recordテーブル名
+        months (list | None): 集計し直す月（各月の1日）。None の場合は全期間
+    Returns:
+        None
+    """
+    names = rollup_table_names(table_name)
+
+    if months is None:
+        for rollup_table in names.values():
+            cursor.execute(f"DELETE FROM {rollup_table}")
+        # 全期間を対象にする
+        source = f"SELECT * FROM {table_name}"
+        params: tuple = ()
+    else:
+        if not months:
+            return
+        cursor.execute(f"DELETE FROM {names['monthly_category']} WHERE month = ANY(%s)", (months,))
+        cursor.execute(f"DELETE FROM {names['monthly_account']} WHERE month = ANY(%s)", (months,))
+        cursor.execute(
+            f"DELETE FROM {names['daily']} WHERE date_trunc('month', date)::date = ANY(%s)", (months,)
+        )
+        # 各月の日本時間での範囲をUTCに直し、date のインデックスで対象の行だけを読む
+        source = f"""
+        SELECT k.* FROM unnest(%s::date[]) AS m(month)
+        JOIN {table_name} k
+          ON k.date >= ((m.month::timestamp AT TIME ZONE 'Asia/Tokyo') AT TIME ZONE 'UTC')
+         AND k.date < (((m.month + INTERVAL '1 month')::timestamp AT TIME ZONE 'Asia/Tokyo') AT TIME ZONE 'UTC')
+        """
+        params = (months,)
+
+    cursor.execute(f"""
+    INSERT INTO {names['monthly_category']} (month, income_or_expense, category, sub_category, amount, record_count)
+    SELECT date_trunc('month', {LOCAL_DATE_SQL})::date, income_or_expense, category, sub_category,
+           SUM(amount), COUNT(*)
+    FROM ({source}) src
+    GROUP BY 1, 2, 3, 4
+    """, params)
+    cursor.execute(f"""
+    INSERT INTO {names['monthly_account']} (month, income_or_expense, bank_account_or_card, amount, record_count)
+    SELECT date_trunc('month', {LOCAL_DATE_SQL})::date, income_or_expense, bank_account_or_card,
+           SUM(amount), COUNT(*)
+    FROM ({source}) src
+    GROUP BY 1, 2, 3
+    """, params)
+    cursor.execute(f"""
+    INSERT INTO {names['daily']} (date, income, expense, record_count)
+    SELECT {LOCAL_DATE_SQL}::date,
+           COALESCE(SUM(amount) FILTER (WHERE income_or_expense = '収入'), 0),
+           COALESCE(SUM(amount) FILTER (WHERE income_or_expense = '支出'), 0),
+           COUNT(*)
+    FROM ({source}) src
+    GROUP BY 1
+    """, params)
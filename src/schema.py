@@ -0,0 +1,165 @@
+import importlib.util
+import pandas as pd
+from typing import Iterator
+
+try:
+    from .dates import parse_kakei_dates
+except ImportError:  # src/ の中でスクリプトとして実行した場合（transfer.py の __main__）
+    from dates import parse_kakei_dates
+
+# 列の型の種類
+# - date: parse_kakei_dates で datetime64 に変換する日付・日時
+# - category: 種類の少ない文字列（口座・カテゴリなど）。category 型で読み込む
+# - amount: 金額。数値に変換できない値・欠損は0として int64 にする
+# - string: 自由入力の文字列（メモ・場所など）。全て空の列でも文字列型にする
+# - optional_string: string と同じだが、CSVに列が無くてもよい（無い場合は空文字の列にする）
+BALANCE_SCHEMA = {
+    '日付': 'date',
+    '資産': 'category',
+    '金額': 'amount',
+}
+
+RECORD_SCHEMA = {
+    '日付': 'date',
+    '収入/支出': 'category',
+    'カテゴリ': 'category',
+    'サブカテゴリ': 'category',
+    '金額': 'amount',
+    '店舗/場所': 'string',
+    'メモ': 'string',
+    '入金/支払い方法': 'category',
+    '銀行口座/カード等': 'category',
+    'タグ': 'string',
+}
+
+TRANSFER_SCHEMA = {
+    '日付': 'date',
+    '金額': 'amount',
+    '出金': 'category',
+    '入金': 'category',
+    'メモ': 'optional_string',
+}
+
+# クレジットカード情報付加済みの収支データ（output/transfer.csv・output/record.csv）のうち、最終残高の計算に使う列
+FLOW_SCHEMA = {
+    'type': 'category',
+    'amount': 'amount',
+    'withdrawal_date': 'date',
+    'withdrawal_account': 'category',
+}
+
+AMOUNT_DTYPE = 'int64'
+
+# pd.read_csv で型を指定する種類
+STRING_DTYPES = {'category': 'category', 'string': 'str', 'optional_string': 'str'}
+OPTIONAL_KINDS = {'optional_string'}
+
+# pyarrow がインストールされていればマルチスレッドのCSVパーサを使う（チャンク読み込みは C パーサのみ対応）
+CSV_ENGINE = 'pyarrow' if importlib.util.find_spec('pyarrow') is not None else 'c'
+
+
+def to_amount(values: pd.Series) -> pd.Series:
+    """
+    金額の列を int64 に変換する関数（数値に変換できない値・欠損は0）
+    既に整数型の場合はそのまま返します。
+
+    Args:
+        values (pd.Series): 金額の列
+
+    Returns:
+        pd.Series: int64 の列
+    """
+    if pd.api.types.is_integer_dtype(values.dtype) and not isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype(AMOUNT_DTYPE)
+    return pd.to_numeric(values, errors='coerce').fillna(0).astype(AMOUNT_DTYPE)
+
+
+def _read_csv_kwargs(path: str, schema: dict[str, str], engine: str = 'c', **read_csv_kwargs) -> dict:
+    """
+    スキーマから pd.read_csv に渡す列の指定と型を作る
+    CSVの見出し行を先に読み、必須の列が無ければエラーにし、無い省略可能な列は読み込む列から外します。
+
+    Raises:
+        ValueError: 必須の列がCSVに無い場合
+    """
+    header = set(pd.read_csv(path, nrows=0, **read_csv_kwargs).columns)
+    missing = [column for column, kind in schema.items() if kind not in OPTIONAL_KINDS and column not in header]
+    if missing:
+        raise ValueError(f"CSVに必要な列がありません: {path}: {', '.join(missing)}")
+    columns = {column: kind for column, kind in schema.items() if column in header}
+    dtype = {column: STRING_DTYPES[kind] for column, kind in columns.items() if kind in STRING_DTYPES}
+    if engine == 'pyarrow':
+        # pyarrow のパーサは、型を指定した場合に欠損のある整数の列を変換できないため、金額は文字列で読んで to_amount で変換する
+        dtype.update({column: 'str' for column, kind in columns.items() if kind == 'amount'})
+    return {'usecols': list(columns), 'dtype': dtype}
+
+
+def apply_schema(df: pd.DataFrame, schema: dict[str, str]) -> pd.DataFrame:
+    """
+    読み込んだデータフレームをスキーマの列順に並べ、日付と金額の列を変換する関数
+    category・string の列は pd.read_csv で変換済みのものとして扱います。無い省略可能な列は空文字の列にします。
+
+    Args:
+        df (pd.DataFrame): スキーマの列を含むデータフレーム
+        schema (dict[str, str]): 列名と型の種類の対応
+
+    Returns:
+        pd.DataFrame: 変換後のデータフレーム
+    """
+    missing = [column for column, kind in schema.items() if kind in OPTIONAL_KINDS and column not in df.columns]
+    if missing:
+        df = df.assign(**{column: pd.Series('', index=df.index, dtype='str') for column in missing})
+    df = df[list(schema)]
+    for column, kind in schema.items():
+        if kind == 'date':
+            df[column] = parse_kakei_dates(df[column])
+        elif kind == 'amount':
+            df[column] = to_amount(df[column])
+    return df
+
+
+def read_typed_csv(path: str, schema: dict[str, str], **read_csv_kwargs) -> pd.DataFrame:
+    """
+    スキーマの列だけを読み込み、列の型を揃えたデータフレームを返す関数
+    種類の少ない文字列は category 型、金額は int64、日付は datetime64 になるので、
+    以降のステージは読み込み直しや型の変換をせずにこのデータフレームを使えます。
+
+    Args:
+        path (str): CSVファイルのパス
+        schema (dict[str, str]): 列名と型の種類の対応（BALANCE_SCHEMA など）
+        **read_csv_kwargs: pd.read_csv に渡す引数
+
+    Returns:
+        pd.DataFrame: 読み込んだデータ
+
+    Raises:
+        ValueError: 必須の列がCSVに無い場合
+    """
+    csv_kwargs = _read_csv_kwargs(path, schema, CSV_ENGINE, **read_csv_kwargs)
+    df = pd.read_csv(path, engine=CSV_ENGINE, **csv_kwargs, **read_csv_kwargs)
+    return apply_schema(df, schema)
+
+
+def iter_typed_csv(
+        path: str,
+        schema: dict[str, str],
+        chunk_size: int,
+        **read_csv_kwargs
+    ) -> Iterator[pd.DataFrame]:
+    """
+    read_typed_csv と同じ型で、CSVを chunk_size 行ずつ読み込むジェネレータ
+    category 型のカテゴリはチャンクごとに異なります。
+
+    Args:
+        path (str): CSVファイルのパス
+        schema (dict[str, str]): 列名と型の種類の対応
+        chunk_size (int): 1チャンクあたりの行数
+        **read_csv_kwargs: pd.read_csv に渡す引数
+
+    Yields:
+        pd.DataFrame: 読み込んだチャンク
+    """
+    csv_kwargs = _read_csv_kwargs(path, schema, **read_csv_kwargs)
+    with pd.read_csv(path, chunksize=chunk_size, **csv_kwargs, **read_csv_kwargs) as reader:
+        for chunk in reader:
+            yield apply_schema(chunk, schema)
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import pickle
+from typing import Any, Callable
+
+# キャッシュファイルの形式が変わった場合に上げる
+CACHE_VERSION = 2
+
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    ファイル内容のSHA-256を返す関数
+
+    Args:
+        path (str): ファイルのパス
+        chunk_size (int): 読み込み単位（バイト）
+
+    Returns:
+        str: 16進数のダイジェスト
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stage_key(stage_name: str, *parts: Any) -> str:
+    """
+    ステージ名と入力（ファイルのダイジェスト・meta.jsonの該当部分・設定値など）からキャッシュキーを作る関数
+
+    Args:
+        stage_name (str): ステージ名
+        *parts (Any): JSONにできる入力
+
+    Returns:
+        str: 16進数のキー
+    """
+    payload = json.dumps([CACHE_VERSION, stage_name, *parts], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    """
+    パイプラインの各ステージの出力を、入力から決まるキーでローカルに保存するキャッシュ
+    出力を持つステージ（変換・集計）は結果をpickleで保存し、DBへの投入のような出力を持たないステージは
+    最後に成功したキーだけを記録します。保存件数が max_entries を超えた場合は、最後に使われてから
+    最も時間が経ったものから削除します。
+    cache_dir に None を指定すると、何も保存せず常にステージを実行する無効なキャッシュになります。
+    """
+
+    def __init__(self, cache_dir: str | None, max_entries: int = 20) -> None:
+        """
+        Args:
+            cache_dir (str | None): キャッシュの保存先ディレクトリ。None の場合はキャッシュを無効にする
+            max_entries (int): 保存するステージ出力の最大件数
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.cache_dir)
+
+    def _output_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _done_path(self, stage_name: str) -> str:
+        return os.path.join(self.cache_dir, f"{stage_name}.done")
+
+    def get(self, key: str) -> Any | None:
+        """キーに対応する出力を返す。無い場合は None"""
+        if not self.enabled:
+            return None
+        path = self._output_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            os.remove(path)
+            return None
+        os.utime(path)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        """出力を保存し、上限を超えた古い出力を削除する"""
+        if not self.enabled:
+            return
+        path = self._output_path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def get_or_compute(self, stage_name: str, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        キーに対応する出力がキャッシュにあればそれを返し、無ければ compute を実行して保存する
+
+        Args:
+            stage_name (str): ステージ名（ログ表示用）
+            key (str): stage_key で作ったキー
+            compute (Callable[[], Any]): 出力を計算する関数
+
+        Returns:
+            Any: ステージの出力
+        """
+        value = self.get(key)
+        if value is not None:
+            print(f"⏭️ {stage_name}: 入力が変わっていないため、キャッシュを使用します。")
+            return value
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def done_key(self, stage_name: str) -> str | None:
+        """出力を持たないステージが最後に成功した時のキーを返す。無い場合は None"""
+        if not self.enabled:
+            return None
+        path = self._done_path(stage_name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return f.read().strip()
+
+    def is_done(self, stage_name: str, key: str) -> bool:
+        """出力を持たないステージが、同じキーで既に成功しているかを返す"""
+        return self.done_key(stage_name) == key
+
+    def mark_done(self, stage_name: str, key: str) -> None:
+        """出力を持たないステージが成功したことを記録する"""
+        if not self.enabled:
+            return
+        with open(self._done_path(stage_name), "w") as f:
+            f.write(key)
+
+    def run_once(self, stage_name: str, key: str, run: Callable[[], Any]) -> None:
+        """
+        出力を持たないステージを、前回成功時とキーが変わった場合だけ実行する
+
+        Args:
+            stage_name (str): ステージ名
+            key (str): stage_key で作ったキー
+            run (Callable[[], Any]): ステージの処理
+
+        Returns:
+            None
+        """
+        if self.is_done(stage_name, key):
+            print(f"⏭️ {stage_name}: 入力が変わっていないため、スキップします。")
+            return
+        run()
+        self.mark_done(stage_name, key)
+
+    def _evict(self) -> None:
+        """保存件数が上限を超えた分を、最後に使われた時刻が古い順に削除する"""
+        entries = [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(".pkl")
+        ]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - self.max_entries]:
+            os.remove(path)
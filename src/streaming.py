@@ -0,0 +1,201 @@
+import os
+import pandas as pd
+from typing import Any, Callable, Iterable, Iterator
+
+from .add_card_info import process_record_df
+from .transfer import process_transfer_df
+from .make_final_balance import (
+    build_daily_balance_df,
+    normalize_balance_dates,
+    normalize_flow_dates,
+    to_balance_events,
+    to_flow_events,
+)
+from .finalbalance2db import insert_final_balance_df_to_db
+from .finalbalance_long import FINAL_LAYOUTS, upsert_long_balance_df_to_db
+from .finalbalance_sparse import insert_sparse_balance_df_to_db
+from .record2db import insert_record_chunks_to_postgres
+from .metrics import PipelineMetrics
+from .schema import BALANCE_SCHEMA, RECORD_SCHEMA, TRANSFER_SCHEMA, iter_typed_csv
+
+# 1チャンクあたりの行数（メモリ使用量の上限の目安）
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def tap_chunks(chunks: Iterable[pd.DataFrame], consumer: Callable[[pd.DataFrame], Any]) -> Iterator[pd.DataFrame]:
+    """
+    各チャンクを consumer に渡してから、そのまま次の処理に流すジェネレータ
+    1回の読み込みで、DBへの投入と残高の集計のように複数の処理にチャンクを使うためのものです。
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): 入力のチャンク
+        consumer (Callable[[pd.DataFrame], Any]): 各チャンクを受け取る関数
+
+    Yields:
+        pd.DataFrame: 入力のチャンク
+    """
+    for chunk in chunks:
+        consumer(chunk)
+        yield chunk
+
+
+class DailyBalanceAccumulator:
+    """
+    チャンクごとに渡される収支データと残高データを、アカウント × 日の集計値として蓄積し、最終残高データを作るクラス
+    残高の計算は「その日の最後の残高イベントでリセットし、その日の入出金の合計を加える」ことと等価なので、
+    保持するのはアカウント × 日ごとの入出金の合計と最後の残高だけです。
+    そのため、メモリ使用量は日数 × アカウント数で決まり、レコードの行数にはよりません。
+    出力は build_final_balance_df と同じです。
+    """
+
+    def __init__(self, accounts: dict[str, str]) -> None:
+        """
+        Args:
+            accounts (dict[str, str]): meta.json の accounts_ja_en
+        """
+        self.accounts = accounts
+        self._flows: pd.Series | None = None
+        self._balances: pd.Series | None = None
+        self._min_date = None
+        self._max_date = None
+
+    def _extend_date_range(self, dates: pd.Series) -> None:
+        dates = dates.dropna()
+        if dates.empty:
+            return
+        low, high = dates.min(), dates.max()
+        self._min_date = low if self._min_date is None else min(self._min_date, low)
+        self._max_date = high if self._max_date is None else max(self._max_date, high)
+
+    def add_flows(self, flow_df: pd.DataFrame) -> None:
+        """クレジットカード情報付加済みの収支データ（振替・収支）のチャンクを追加する"""
+        data2 = normalize_flow_dates(flow_df)
+        self._extend_date_range(data2['withdrawal_date'])
+        daily = to_flow_events(data2, self.accounts).groupby(['account', 'event_date'], observed=True)['収支'].sum()
+        if self._flows is not None:
+            daily = pd.concat([self._flows, daily]).groupby(level=[0, 1]).sum()
+        self._flows = daily
+
+    def add_balances(self, balance_df: pd.DataFrame) -> None:
+        """balance.csv のチャンクを追加する（同じ日の残高は後に追加したものが優先されます）"""
+        data1 = normalize_balance_dates(balance_df)
+        self._extend_date_range(data1['日付'])
+        daily = to_balance_events(data1, self.accounts).groupby(['account', 'event_date'], observed=True)['balance'].last()
+        if self._balances is not None:
+            daily = pd.concat([self._balances, daily]).groupby(level=[0, 1]).last()
+        self._balances = daily
+
+    def build(self) -> pd.DataFrame:
+        """
+        蓄積した集計値から最終残高データを作る
+
+        Returns:
+            pd.DataFrame: date, {account}_収支, {account}_残高 の列を持つデータフレーム
+        """
+        if self._min_date is None:
+            raise ValueError("残高データ・収支データがありません。")
+        date_range = pd.date_range(start=self._min_date, end=self._max_date, freq='D', tz='UTC')
+
+        flows = self._flows if self._flows is not None else pd.Series(
+            [], index=pd.MultiIndex.from_tuples([], names=['account', 'event_date']), dtype='int64'
+        )
+        flow_events = flows.rename('収支').reset_index().assign(is_balance_event=0)
+        balances = self._balances if self._balances is not None else pd.Series(
+            [], index=pd.MultiIndex.from_tuples([], names=['account', 'event_date']), dtype='float64'
+        )
+        balance_events = balances.rename('balance').reset_index().assign(収支=0.0, is_balance_event=1)
+        return build_daily_balance_df(flow_events, balance_events, date_range, list(self.accounts.keys()))
+
+
+def run_pipeline_streaming(
+        db_config: dict[str, Any],
+        input_transfer_path: str,
+        input_record_path: str,
+        input_balance_path: str,
+        meta: dict[str, Any],
+        table_name_record: str = 'kakeibo',
+        table_name_final: str = 'kakeibo_2',
+        record_mode: str = 'full',
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        metrics: PipelineMetrics | None = None,
+        final_layout: str = 'wide',
+        dry_run: bool = False,
+        on_final_balance: Callable[[pd.DataFrame, dict[str, str], pd.Timestamp | None], Any] | None = None
+    ) -> pd.DataFrame:
+    """
+    入力CSVを chunk_size 行ずつ読み込み、クレジットカード情報の付加・DBへの投入・残高の集計をチャンク単位で行う関数
+    record.csv は1回だけ読み込み、各チャンクをDBへの投入と残高の集計の両方に使います。
+    メモリ上に保持するのは1チャンク分のデータと、アカウント × 日の集計値だけです。
+
+    Args:
+        db_config (dict[str, Any]): データベース接続情報
+        input_transfer_path (str): transfer.csv のパス
+        input_record_path (str): record.csv のパス
+        input_balance_path (str): balance.csv のパス
+        meta (dict[str, Any]): meta.json の内容
+        table_name_record (str): recordデータの挿入先テーブル名
+        table_name_final (str): 最終残高データの挿入先テーブル名
+        record_mode (str): recordデータの挿入モード（'full' または 'delta'）
+        chunk_size (int): 1チャンクあたりの行数
+        metrics (PipelineMetrics | None): ステージごとの計測値の記録先。指定しない場合は計測しません。
+        final_layout (str): 最終残高データのレイアウト（'wide'、'long' または 'sparse'。run_pipeline と同じ）
+        dry_run (bool): True の場合はDBに接続せず、書き込む行数の表示だけを行います。
+        on_final_balance (Callable | None): 最終残高データをDBに反映した後に呼び出す関数（run_pipeline と同じ）
+
+    Returns:
+        pd.DataFrame: 最終残高データ
+    """
+    if final_layout not in FINAL_LAYOUTS:
+        raise ValueError(f"final_layout は {', '.join(FINAL_LAYOUTS)} のいずれかを指定してください: {final_layout}")
+    card_settings = meta["card_settings"]
+    bank_closures = meta.get("bank_closures", [])
+    accounts = meta["accounts_ja_en"]
+    accumulator = DailyBalanceAccumulator(accounts)
+    metrics = metrics or PipelineMetrics(enabled=False)
+
+    # record.csv: DBへの投入とクレジットカード情報の付加・残高の集計を同じチャンクで行う
+    with metrics.stage('insert_record_chunks') as stage:
+        stage.rows_in = 0
+
+        def add_record_chunk(chunk: pd.DataFrame) -> None:
+            stage.rows_in += len(chunk)
+            accumulator.add_flows(process_record_df(chunk, card_settings, bank_closures))
+
+        record_chunks = tap_chunks(
+            iter_typed_csv(input_record_path, RECORD_SCHEMA, chunk_size, encoding='utf-8'),
+            add_record_chunk
+        )
+        if dry_run:
+            for _ in record_chunks:
+                pass
+            print(f"🧪 ドライラン: {table_name_record} に {stage.rows_in:,} 行を投入します（{record_mode}）。")
+        else:
+            insert_record_chunks_to_postgres(db_config, record_chunks, table_name=table_name_record, mode=record_mode)
+        stage.bytes_read = os.path.getsize(input_record_path)
+
+    with metrics.stage('process_transfer_chunks') as stage:
+        for chunk in iter_typed_csv(input_transfer_path, TRANSFER_SCHEMA, chunk_size, encoding='utf-8'):
+            accumulator.add_flows(process_transfer_df(chunk, card_settings, bank_closures=bank_closures))
+        stage.bytes_read = os.path.getsize(input_transfer_path)
+    print("✅ 振替データの変換が完了しました。")
+
+    with metrics.stage('generate_final_balance_df') as stage:
+        for chunk in iter_typed_csv(input_balance_path, BALANCE_SCHEMA, chunk_size):
+            accumulator.add_balances(chunk)
+        final_balance_df = accumulator.build()
+        stage.bytes_read = os.path.getsize(input_balance_path)
+        stage.rows_out = len(final_balance_df)
+    print("✅ 最終残高データの生成が完了しました。")
+
+    with metrics.stage('insert_final_balance_to_db', rows_in=len(final_balance_df)):
+        if dry_run:
+            print(f"🧪 ドライラン: {table_name_final}（{final_layout}）に {len(final_balance_df):,} 日分を反映します（全期間）。")
+        elif final_layout == 'sparse':
+            insert_sparse_balance_df_to_db(db_config, final_balance_df, accounts, table_name_final)
+        elif final_layout == 'long':
+            upsert_long_balance_df_to_db(db_config, final_balance_df, accounts, table_name_final)
+        else:
+            insert_final_balance_df_to_db(db_config, final_balance_df, accounts, table_name_final)
+    if on_final_balance is not None and not dry_run:
+        on_final_balance(final_balance_df, accounts, None)
+    return final_balance_df
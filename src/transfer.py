@@ -1,16 +1,40 @@
 import json
+import numpy as np
 import pandas as pd
 from typing import Any, Callable
 
 if __name__ == "__main__":
     from add_card_info import add_credit_withdrawal_info
+    from schema import TRANSFER_SCHEMA, read_typed_csv
 else:
     from .add_card_info import add_credit_withdrawal_info
+    from .schema import TRANSFER_SCHEMA, read_typed_csv
+
+
+def _as_text(values: pd.Series) -> np.ndarray:
+    """
+    メモに埋め込むために列を文字列の配列にする（欠損値は f-string と同じく 'nan' にする）
+    """
+    return values.astype(object).where(values.notna(), 'nan').to_numpy(dtype=object)
+
+
+def _memo_prefix(account: pd.Series, suffix: str) -> np.ndarray:
+    """
+    口座ごとのメモの先頭部分（'振替: {口座}{suffix}'）を、口座の種類ごとに1回だけ作って各行に展開する
+    """
+    codes, uniques = pd.factorize(account, use_na_sentinel=True)
+    prefixes = np.array(
+        [f'振替: {value}{suffix}' for value in uniques] + [f'振替: nan{suffix}'], dtype=object
+    )
+    # 欠損値のコード -1 は末尾の 'nan' を指す
+    return prefixes[codes]
 
 
 def transform_transfer_data(transfer_df: pd.DataFrame) -> pd.DataFrame:
     """
     振替データを収支に変換する
+    各振替を出金側の支出と入金側の収入の2行にし、振替1件ごとに「支出, 収入」の順で並べます。
+    行ごとのPython処理はせず、支出側・収入側をそれぞれ列単位で作ってから交互に並べます。
     
     Parameters:
         transfer_df (pd.DataFrame): 振替データのデータフレーム
@@ -18,55 +42,65 @@ def transform_transfer_data(transfer_df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         pd.DataFrame: 変換された収支データのデータフレーム
     """
-    def transform_row(row):
-        """
-        各振替データの行を収支データに変換する
-        """
-        date = row['日付']
-        amount = row['金額']
-        from_account = row['出金']
-        to_account = row['入金']
-        memo = row.get('メモ', '')
-        return [
-            {
-                'date': date,
-                'type': '支出',
-                'category': '振替',
-                'subcategory': '',
-                'amount': amount,
-                'place': '',
-                'memo': f'振替: {to_account}へ。{memo}',
-                'payment_method': '振替',
-                'account': from_account,
-                'tag': ''
-            },
-            {
-                'date': date,
-                'type': '収入',
-                'category': '振替',
-                'subcategory': '',
-                'amount': amount,
-                'place': '',
-                'memo': f'振替: {from_account}から。{memo}',
-                'payment_method': '振替',
-                'account': to_account,
-                'tag': ''
-            }
-        ]
+    date = transfer_df['日付'].to_numpy()
+    amount = transfer_df['金額'].to_numpy()
+    from_account = transfer_df['出金'].astype(object)
+    to_account = transfer_df['入金'].astype(object)
+    memo = _as_text(transfer_df['メモ']) if 'メモ' in transfer_df.columns else ''
+
+    def leg(flow_type: str, account: pd.Series, memo_text: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame({
+            'date': date,
+            'type': flow_type,
+            'category': '振替',
+            'subcategory': '',
+            'amount': amount,
+            'place': '',
+            'memo': memo_text,
+            'payment_method': '振替',
+            'account': account.to_numpy(),
+            'tag': ''
+        })
+
+    expense = leg('支出', from_account, _memo_prefix(to_account, 'へ。') + memo)
+    income = leg('収入', to_account, _memo_prefix(from_account, 'から。') + memo)
+
+    # 支出側（0..n-1）と収入側（n..2n-1）を、振替ごとに支出・収入の順になるよう交互に並べる
+    n = len(transfer_df)
+    order = np.arange(2 * n).reshape(2, n).T.ravel()
+    return pd.concat([expense, income], ignore_index=True).take(order).reset_index(drop=True)
+
+
+def process_transfer_df(
+        transfer_df: pd.DataFrame, 
+        card_settings: dict[str, Any], 
+        add_credit_info_func: Callable[..., pd.DataFrame]=add_credit_withdrawal_info,
+        bank_closures: list[str] | None = None
+    ) -> pd.DataFrame:
+    """
+    読み込み済みの振替データを収支データに変換し、クレジットカードの情報を追加する
     
-    # 各行を変換して flatten
-    records_series = transfer_df.apply(transform_row, axis=1)
-    flat_records = [item for sublist in records_series for item in sublist]
+    Parameters:
+        transfer_df (pd.DataFrame): 振替データのデータフレーム（TRANSFER_SCHEMA で読み込んだもの）
+        card_settings (dict[str, Any]): meta.jsonのカード設定
+        add_credit_info_func (function): クレジットカード情報を追加する処理関数（df, card_settings, bank_closures を受け取る）
+        bank_closures (list[str] | None): meta.json の bank_closures（祝日以外の銀行の休業日）
+        
+    Returns:
+        pd.DataFrame: クレジットカード情報を追加した収支データ
+    """
+    # 振替データを収支データに変換
+    transformed_df = transform_transfer_data(transfer_df)
     
-    # DataFrame化して返す
-    return pd.DataFrame(flat_records)
+    # クレジットカード関連情報の付加
+    return add_credit_info_func(transformed_df, card_settings, bank_closures)
 
 
 def process_transfer_csv(
         transfer_csv_file_path: str, 
         card_settings_file_path: str, 
         output_file_path: str, 
-        add_credit_info_func: Callable[[pd.DataFrame, dict[str, Any]], pd.DataFrame]=add_credit_withdrawal_info
+        add_credit_info_func: Callable[..., pd.DataFrame]=add_credit_withdrawal_info
     ) -> None:
     """
     振替CSVデータを収支データに変換し、クレジットカードの情報を追加して保存
@@ -81,15 +115,14 @@ def process_transfer_csv(
         None
     """
     # CSV読み込み
-    transfer_df = pd.read_csv(transfer_csv_file_path, encoding='utf-8', parse_dates=['日付'])
-    
-    # 振替データを収支データに変換
-    transformed_df = transform_transfer_data(transfer_df)
+    transfer_df = read_typed_csv(transfer_csv_file_path, TRANSFER_SCHEMA, encoding='utf-8')
     with open(card_settings_file_path, "r") as f:
-        card_settings = json.load(f)["card_settings"]
+        meta = json.load(f)
     
-    # クレジットカード関連情報の付加
-    df_with_credit_info = add_credit_info_func(transformed_df, card_settings)
+    # 振替データを収支データに変換し、クレジットカード関連情報を付加
+    df_with_credit_info = process_transfer_df(
+        transfer_df, meta["card_settings"], add_credit_info_func, meta.get("bank_closures")
+    )
     
     # CSVに保存
     df_with_credit_info.to_csv(output_file_path, index=False)
@@ -0,0 +1,283 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from typing import Any, Callable, Iterable
+
+# inotify のイベント（linux/inotify.h）
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+# 書き込みの途中（IN_MODIFY）ではなく、書き込み後に閉じた時点・リネームされた時点で通知を受ける
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+# 監視対象のファイル（main.py が読み込むカケイのCSV）
+WATCHED_FILES = ('balance.csv', 'record.csv', 'transfer.csv')
+
+
+class InotifyWatcher:
+    """
+    inotify（ctypes経由）でディレクトリ内のファイルの変更を待つクラス（Linuxのみ）
+    イベントはカーネルから通知されるため、変更から数ミリ秒で検知できます。
+    """
+
+    def __init__(self, directory: str) -> None:
+        """
+        Args:
+            directory (str): 監視するディレクトリ
+
+        Raises:
+            OSError: inotify が使えない場合（Linux以外、上限に達した場合など）
+        """
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise OSError("libc が見つかりません。")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify が使えません。")
+
+        self.directory = directory
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 に失敗しました。")
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch に失敗しました: {directory}")
+
+    def wait(self, timeout: float) -> set[str]:
+        """
+        変更があったファイル名を返す（timeout 秒以内に変更が無ければ空集合）
+        イベントが溢れた場合は、ディレクトリ内の全ファイルを変更ありとして返します。
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed = set()
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buffer):
+            _, mask, _, name_length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = buffer[offset:offset + name_length].rstrip(b'\0')
+            offset += name_length
+            if mask & IN_Q_OVERFLOW:
+                changed.update(os.listdir(self.directory))
+            elif mask & IN_IGNORED:
+                raise OSError(f"監視中のディレクトリが削除されました: {self.directory}")
+            elif name:
+                changed.add(os.fsdecode(name))
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """
+    ディレクトリ内のファイルのサイズと更新日時を一定間隔で比べて変更を待つクラス
+    inotify が使えない環境や、ネットワークドライブのように inotify のイベントが届かない場所で使います。
+    """
+
+    def __init__(self, directory: str, poll_interval: float = 1.0) -> None:
+        """
+        Args:
+            directory (str): 監視するディレクトリ
+            poll_interval (float): ディレクトリを調べる間隔（秒）
+        """
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return snapshot
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def wait(self, timeout: float) -> set[str]:
+        """変更があったファイル名を返す（timeout 秒以内に変更が無ければ空集合）"""
+        deadline = time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changed = {
+                name for name in set(snapshot) | set(self._snapshot)
+                if snapshot.get(name) != self._snapshot.get(name)
+            }
+            self._snapshot = snapshot
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(self.poll_interval, remaining))
+
+    def close(self) -> None:
+        pass
+
+
+def open_watcher(directory: str, use_inotify: bool = True, poll_interval: float = 1.0) -> InotifyWatcher | PollingWatcher:
+    """
+    inotify が使えれば InotifyWatcher、使えなければ PollingWatcher を返す関数
+
+    Args:
+        directory (str): 監視するディレクトリ
+        use_inotify (bool): False の場合は常にポーリングで監視する
+        poll_interval (float): ポーリングの間隔（秒）
+
+    Returns:
+        InotifyWatcher | PollingWatcher: 監視オブジェクト
+    """
+    os.makedirs(directory, exist_ok=True)
+    if use_inotify:
+        try:
+            watcher = InotifyWatcher(directory)
+            print(f"👀 inotify で {directory} を監視します。")
+            return watcher
+        except (OSError, AttributeError) as e:
+            print(f"⚠️ inotify が使えないため、ポーリングで監視します: {e}")
+    print(f"👀 {poll_interval} 秒ごとのポーリングで {directory} を監視します。")
+    return PollingWatcher(directory, poll_interval)
+
+
+def files_signature(paths: Iterable[str]) -> tuple | None:
+    """
+    ファイルのサイズと更新日時の組を返す関数（どれかが存在しない場合は None）
+
+    Args:
+        paths (Iterable[str]): ファイルのパス
+
+    Returns:
+        tuple | None: ファイルごとの (サイズ, 更新日時[ns]) のタプル
+    """
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        signature.append((stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def wait_until_stable(
+        paths: list[str],
+        settle_seconds: float = 2.0,
+        poll_interval: float = 0.5,
+        timeout: float = 300.0
+    ) -> tuple | None:
+    """
+    全てのファイルが存在し、サイズと更新日時が settle_seconds 秒間変わらなくなるまで待つ関数
+    同期ツールが書き込み中のCSVを読まないようにするためのものです。
+
+    Args:
+        paths (list[str]): ファイルのパス
+        settle_seconds (float): 変化が無いことを確認する時間（秒）
+        poll_interval (float): 確認の間隔（秒）
+        timeout (float): 待つ時間の上限（秒）
+
+    Returns:
+        tuple | None: 安定した時点の files_signature。timeout までに安定しなければ None
+    """
+    deadline = time.monotonic() + timeout
+    last_signature = files_signature(paths)
+    stable_since = time.monotonic()
+    while True:
+        now = time.monotonic()
+        if last_signature is not None and now - stable_since >= settle_seconds:
+            return last_signature
+        if now >= deadline:
+            return None
+        time.sleep(poll_interval)
+        signature = files_signature(paths)
+        if signature != last_signature:
+            last_signature = signature
+            stable_since = time.monotonic()
+
+
+class StableInputRunner:
+    """
+    PipelineWorker から呼び出され、入力のCSVが揃って書き込みが終わるのを待ってからパイプラインを実行するクラス
+    前回実行した時からサイズ・更新日時が変わっていない場合（同期ツールが触っただけの場合など）は実行しません。
+    """
+
+    def __init__(
+            self,
+            paths: list[str],
+            run_func: Callable[[], Any],
+            settle_seconds: float = 2.0,
+            stable_timeout: float = 300.0
+        ) -> None:
+        """
+        Args:
+            paths (list[str]): 入力のCSVのパス
+            run_func (Callable[[], Any]): パイプラインを実行する関数
+            settle_seconds (float): 書き込みが終わったとみなすまでの、変化が無い時間（秒）
+            stable_timeout (float): 書き込みが終わるのを待つ時間の上限（秒）
+        """
+        self.paths = paths
+        self.run_func = run_func
+        self.settle_seconds = settle_seconds
+        self.stable_timeout = stable_timeout
+        self.last_signature: tuple | None = None
+
+    def __call__(self, batch: list[Any]) -> None:
+        signature = wait_until_stable(self.paths, self.settle_seconds, timeout=self.stable_timeout)
+        if signature is None:
+            print(f"⚠️ {self.stable_timeout:.0f} 秒待ってもCSVが揃わない、または書き込みが終わらないため、実行しません。")
+            return
+        if signature == self.last_signature:
+            print("⏭️ CSVが前回の実行時から変わっていないため、実行しません。")
+            return
+        self.run_func()
+        self.last_signature = signature
+
+
+def watch_directory(
+        watcher: InotifyWatcher | PollingWatcher,
+        on_change: Callable[[set[str]], Any],
+        filenames: Iterable[str] = WATCHED_FILES,
+        stop_event: threading.Event | None = None,
+        timeout: float = 1.0
+    ) -> None:
+    """
+    監視対象のファイルが変更されるたびに、変更されたファイル名を on_change に渡す関数
+    filenames 以外のファイル（ダウンロード途中の一時ファイルなど）の変更は無視します。stop_event がセットされるまで続けます。
+
+    Args:
+        watcher (InotifyWatcher | PollingWatcher): open_watcher で作った監視オブジェクト
+        on_change (Callable[[set[str]], Any]): 変更されたファイル名を受け取る関数（PipelineWorker.submit など）
+        filenames (Iterable[str]): 監視対象のファイル名
+        stop_event (threading.Event | None): 監視を止めるためのイベント
+        timeout (float): stop_event を確認する間隔（秒）
+
+    Returns:
+        None
+    """
+    targets = set(filenames)
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        changed = watcher.wait(timeout) & targets
+        if changed:
+            print(f"📂 変更を検知しました: {', '.join(sorted(changed))}")
+            on_change(changed)
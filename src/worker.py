@@ -0,0 +1,110 @@
+import threading
+import time
+import traceback
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+
+class PipelineWorker:
+    """
+    パイプラインを常駐スレッド1本で実行するワーカー
+    submit で受け付けた通知は、最後の通知から debounce_seconds 秒間新しい通知が来なくなるまで待ってから、
+    まとめて1回の実行として run_func に渡します。実行は常に1本のスレッドで行うため、
+    パイプラインが同時に2つ動くことはありません。実行中に届いた通知は、次の実行にまとめられます。
+    """
+
+    def __init__(
+            self,
+            run_func: Callable[[list[Any]], None],
+            debounce_seconds: float = 10.0
+        ) -> None:
+        """
+        Args:
+            run_func (Callable[[list[Any]], None]): 実行する処理。まとめた通知のリストを受け取る
+            debounce_seconds (float): 通知をまとめる待ち時間（秒）
+        """
+        self.run_func = run_func
+        self.debounce_seconds = debounce_seconds
+
+        self._cond = threading.Condition()
+        self._pending: list[Any] = []
+        self._last_submitted = 0.0
+        self._running = False
+        self._runs = 0
+        self._last_run: dict[str, Any] | None = None
+        self._thread = threading.Thread(target=self._loop, name="pipeline-worker", daemon=True)
+
+    def start(self) -> "PipelineWorker":
+        """ワーカースレッドを起動する"""
+        self._thread.start()
+        return self
+
+    def submit(self, payload: Any) -> int:
+        """
+        通知を受け付ける
+
+        Args:
+            payload (Any): run_func に渡す通知の内容
+
+        Returns:
+            int: 受け付け後の未処理の通知数
+        """
+        with self._cond:
+            self._pending.append(payload)
+            self._last_submitted = time.monotonic()
+            self._cond.notify()
+            return len(self._pending)
+
+    def status(self) -> dict[str, Any]:
+        """キューの状態と直近の実行結果を返す"""
+        with self._cond:
+            return {
+                "queue_depth": len(self._pending),
+                "running": self._running,
+                "debounce_seconds": self.debounce_seconds,
+                "runs": self._runs,
+                "last_run": dict(self._last_run) if self._last_run else None,
+            }
+
+    def _wait_for_batch(self) -> list[Any]:
+        """通知が来てから、debounce_seconds 秒間新しい通知が来なくなるまで待ち、通知をまとめて取り出す"""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            while True:
+                remaining = self._last_submitted + self.debounce_seconds - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, self._pending = self._pending, []
+            self._running = True
+            return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._wait_for_batch()
+            started_at = datetime.now(timezone.utc)
+            start = time.perf_counter()
+            error = None
+            print(f"▶️ パイプラインを実行します（通知 {len(batch)} 件）")
+            try:
+                self.run_func(batch)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                print(f"❌ パイプライン実行中にエラー: {e}")
+                traceback.print_exc()
+            duration = time.perf_counter() - start
+
+            with self._cond:
+                self._running = False
+                self._runs += 1
+                self._last_run = {
+                    "started_at": started_at.isoformat(),
+                    "finished_at": datetime.now(timezone.utc).isoformat(),
+                    "duration_seconds": round(duration, 3),
+                    "notifications": len(batch),
+                    "status": "error" if error else "success",
+                    "error": error,
+                }
+            if error is None:
+                print(f"✅ パイプライン実行成功（{duration:.2f} 秒）")
@@ -0,0 +1,213 @@
+import calendar
+import datetime
+import numpy as np
+import pandas as pd
+from typing import Any, Iterable
+
+# ベクトル化する前の、行ごとに処理していた実装（テストで結果を比べるための基準）
+# 支払日の繰り下げは、元は土日だけだったものに closed_days（祝日・銀行の休業日）を加えています。
+
+
+def add_credit_withdrawal_info_rowwise(
+        df: pd.DataFrame,
+        card_settings: dict[str, Any],
+        closed_days: Iterable[datetime.date] = ()
+    ) -> pd.DataFrame:
+    """
+    クレジットカードの引き落とし日と引き落とし口座を、1行ずつ計算して追加する関数
+
+    Args:
+        df (pd.DataFrame): date, account 列を持つデータフレーム
+        card_settings (dict[str, Any]): meta.json の card_settings
+        closed_days (Iterable[datetime.date]): 土日以外の休業日
+
+    Returns:
+        pd.DataFrame: withdrawal_date, withdrawal_account 列を追加したデータフレーム
+    """
+    closed_days = set(closed_days)
+
+    def get_next_business_day(year, month, day):
+        """土日・休業日なら次の営業日に"""
+        dt = datetime.date(year, month, day)
+        while dt.weekday() >= 5 or dt in closed_days:
+            dt += datetime.timedelta(days=1)
+        return dt
+
+    def calculate_withdrawal_info(row):
+        account = row['account']
+        tx_date = pd.to_datetime(row['date']).date()
+        if account in card_settings:
+            config = card_settings[account]
+            closing_day = config['closing_day']
+            payment_offset = config['payment_offset_months']
+            payment_day = config['payment_day']
+            withdrawal_account = config['withdrawal_account']
+
+            # 月末締めの場合
+            if closing_day == -1:
+                closing_day = calendar.monthrange(tx_date.year, tx_date.month)[1]
+
+            closing_date = datetime.date(tx_date.year, tx_date.month, closing_day)
+            if tx_date > closing_date:
+                next_month = tx_date.month + 1
+                next_year = tx_date.year + (next_month - 1) // 12
+                next_month = (next_month - 1) % 12 + 1
+                last_day = calendar.monthrange(next_year, next_month)[1]
+                real_closing_day = min(closing_day, last_day)
+                closing_date = datetime.date(next_year, next_month, real_closing_day)
+
+            payment_month = closing_date.month + payment_offset
+            payment_year = closing_date.year + (payment_month - 1) // 12
+            payment_month = (payment_month - 1) % 12 + 1
+
+            last_day = calendar.monthrange(payment_year, payment_month)[1]
+            raw_payment_day = min(payment_day, last_day)
+            payment_date = get_next_business_day(payment_year, payment_month, raw_payment_day)
+
+            return pd.Series([payment_date, withdrawal_account])
+        else:
+            return pd.Series([row['date'], row['account']])
+
+    df = df.copy()
+    df[['withdrawal_date', 'withdrawal_account']] = df.apply(calculate_withdrawal_info, axis=1)
+    return df
+
+
+def build_final_balance_df_rowwise(
+        balance_df: pd.DataFrame,
+        flow_df: pd.DataFrame,
+        accounts: dict[str, str]
+    ) -> pd.DataFrame:
+    """
+    残高データと収支データから、アカウントごとにイベントを1件ずつ処理して最終残高データを作る関数
+
+    Args:
+        balance_df (pd.DataFrame): 日付（JST）, 資産, 金額 の列を持つ残高データ
+        flow_df (pd.DataFrame): type, amount, withdrawal_date（JST）, withdrawal_account の列を持つ収支データ
+        accounts (dict[str, str]): meta.json の accounts_ja_en
+
+    Returns:
+        pd.DataFrame: date, {account}_収支, {account}_残高 の列を持つデータフレーム
+    """
+    data1 = balance_df.copy()
+    data2 = flow_df.copy()
+
+    # --- タイムゾーン処理 ---
+    data1['日付'] = pd.to_datetime(data1['日付']).dt.tz_localize(
+        'Asia/Tokyo', ambiguous='NaT', nonexistent='shift_forward'
+    ).dt.tz_convert('UTC').dt.normalize()
+
+    data2['withdrawal_date'] = pd.to_datetime(
+        data2['withdrawal_date'], format='mixed', errors='coerce'
+    ).dt.tz_localize('Asia/Tokyo', ambiguous='NaT', nonexistent='shift_forward').dt.tz_convert('UTC').dt.normalize()
+
+    # --- 日付範囲 ---
+    min_date = min(data1['日付'].min(), data2['withdrawal_date'].min())
+    max_date = max(data1['日付'].max(), data2['withdrawal_date'].max())
+    date_range = pd.date_range(start=min_date, end=max_date, freq='D', tz='UTC')
+    final_df = pd.DataFrame({'date': date_range})
+
+    for account in accounts.keys():
+        # --- 入出金イベント ---
+        df = data2[data2["withdrawal_account"] == account].copy()
+        df['event_date'] = df['withdrawal_date']
+        df["amount"] = pd.to_numeric(df["amount"], errors="coerce").fillna(0)
+        df['収支'] = np.where(df['type'] == '収入', df['amount'], -df['amount'])
+        df['is_balance_event'] = 0
+
+        # --- 残高イベント ---
+        account_balance_df = data1[data1["資産"] == account][["日付", "金額"]].rename(
+            columns={'日付': 'event_date', '金額': 'balance'}
+        ).sort_values("event_date")
+        account_balance_df['収支'] = 0.0
+        account_balance_df['is_balance_event'] = 1
+
+        # --- イベント統合 ---
+        all_events = pd.concat([
+            df[['event_date', '収支', 'is_balance_event']],
+            account_balance_df[['event_date', '収支', 'is_balance_event', 'balance']]
+        ], ignore_index=True, sort=False).sort_values(['event_date', 'is_balance_event'], ascending=[True, False])
+        all_events.reset_index(drop=True, inplace=True)
+
+        # --- 残高計算 ---
+        cur_balance = 0
+        balances_by_datetime = []
+        for _, row in all_events.iterrows():
+            d = row['event_date']
+            if row['is_balance_event'] == 1:
+                cur_balance = row['balance']
+            else:
+                cur_balance += row['収支']
+            balances_by_datetime.append((d, cur_balance))
+
+        # --- 日別残高へ変換 ---
+        # 元の実装はイベントの無いアカウントで例外になったため、空の場合も日時型の列にする
+        balance_df_by_day = pd.DataFrame(balances_by_datetime, columns=['datetime', 'balance']).astype(
+            {'datetime': date_range.dtype}
+        )
+        balance_df_by_day = balance_df_by_day.groupby(balance_df_by_day['datetime'].dt.normalize()).last()
+        daily_balance_series = pd.Series(index=date_range, dtype='float64')
+        daily_balance_series.update(balance_df_by_day['balance'])
+        daily_balance_series = daily_balance_series.ffill()
+
+        # --- 収支計算 ---
+        income_ts = pd.Series(0, index=date_range)
+        daily_income = df.groupby('event_date')['収支'].sum()
+        income_ts.update(daily_income)
+
+        temp_df = pd.DataFrame({
+            'date': date_range,
+            f'{account}_収支': income_ts.values,
+            f'{account}_残高': daily_balance_series.values
+        })
+        final_df = final_df.merge(temp_df, on='date', how='left')
+
+    return final_df
+
+
+def transform_transfer_data_rowwise(transfer_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    振替データの各行を、出金側の支出と入金側の収入の2行に変換する関数
+
+    Args:
+        transfer_df (pd.DataFrame): 日付, 金額, 出金, 入金, メモ の列を持つ振替データ
+
+    Returns:
+        pd.DataFrame: 収支データ
+    """
+    def transform_row(row):
+        date = row['日付']
+        amount = row['金額']
+        from_account = row['出金']
+        to_account = row['入金']
+        memo = row.get('メモ', '')
+        return [
+            {
+                'date': date,
+                'type': '支出',
+                'category': '振替',
+                'subcategory': '',
+                'amount': amount,
+                'place': '',
+                'memo': f'振替: {to_account}へ。{memo}',
+                'payment_method': '振替',
+                'account': from_account,
+                'tag': ''
+            },
+            {
+                'date': date,
+                'type': '収入',
+                'category': '振替',
+                'subcategory': '',
+                'amount': amount,
+                'place': '',
+                'memo': f'振替: {from_account}から。{memo}',
+                'payment_method': '振替',
+                'account': to_account,
+                'tag': ''
+            }
+        ]
+
+    records_series = transfer_df.apply(transform_row, axis=1)
+    flat_records = [item for sublist in records_series for item in sublist]
+    return pd.DataFrame(flat_records)
@@ -0,0 +1,116 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.add_card_info import add_credit_withdrawal_info
+from src.jp_calendar import bank_holidays
+from rowwise_reference import add_credit_withdrawal_info_rowwise
+
+CARD_SETTINGS = {
+    # 月末締め・翌月27日払い
+    'カードA': {'closing_day': -1, 'payment_offset_months': 1, 'payment_day': 27, 'withdrawal_account': '銀行A'},
+    # 15日締め・翌月10日払い
+    'カードB': {'closing_day': 15, 'payment_offset_months': 1, 'payment_day': 10, 'withdrawal_account': '銀行B'},
+    # 28日締め・翌々月31日払い（短い月は月末）
+    'カードC': {'closing_day': 28, 'payment_offset_months': 2, 'payment_day': 31, 'withdrawal_account': '銀行A'},
+}
+
+
+def make_records(dates: list[str], accounts: list[str]) -> pd.DataFrame:
+    return pd.DataFrame({'date': dates, 'amount': 1000, 'account': accounts})
+
+
+def expected_withdrawal(df: pd.DataFrame, card_settings: dict, closures: list[str] = ()) -> pd.DataFrame:
+    """行ごとの実装で計算した引き落とし日・口座（引き落とし日は日時型に揃える）"""
+    closed_days = bank_holidays(2022, 2026, closures).astype(datetime.date)
+    expected = add_credit_withdrawal_info_rowwise(df, card_settings, closed_days)
+    expected['withdrawal_date'] = pd.to_datetime(expected['withdrawal_date'].astype(str), format='mixed')
+    return expected
+
+
+def assert_matches_rowwise(df: pd.DataFrame, card_settings: dict, closures: list[str] = ()) -> None:
+    expected = expected_withdrawal(df, card_settings, closures)
+    actual = add_credit_withdrawal_info(df.copy(), card_settings, list(closures))
+    pd.testing.assert_series_equal(
+        actual['withdrawal_date'], expected['withdrawal_date'], check_dtype=False, check_names=False
+    )
+    assert actual['withdrawal_account'].tolist() == expected['withdrawal_account'].tolist()
+
+
+def test_matches_rowwise_around_month_end_closing():
+    # 月末・締め日の当日と翌日、年をまたぐ場合
+    dates = [
+        '2023/01/31 23:59', '2023/02/01 00:00', '2023/03/15 12:00', '2023/03/16 08:00',
+        '2023/12/28 10:00', '2023/12/29 10:00', '2023/12/31 22:00', '2024/01/01 09:00',
+    ]
+    for card in CARD_SETTINGS:
+        assert_matches_rowwise(make_records(dates, [card] * len(dates)), CARD_SETTINGS)
+
+
+@pytest.mark.parametrize('dates', [
+    # 2月（平年・閏年）
+    ['2023/02/15 10:00', '2023/02/28 23:00', '2024/02/28 10:00', '2024/02/29 10:00'],
+    # 30日の月
+    ['2023/04/28 10:00', '2023/04/29 10:00', '2023/04/30 10:00', '2023/06/30 10:00', '2023/09/29 10:00'],
+])
+def test_matches_rowwise_in_short_months(dates):
+    for card in CARD_SETTINGS:
+        assert_matches_rowwise(make_records(dates, [card] * len(dates)), CARD_SETTINGS)
+
+
+def test_matches_rowwise_for_mixed_accounts():
+    rng = np.random.default_rng(0)
+    days = pd.date_range('2023-01-01', '2024-12-31', freq='D')
+    picked = days[rng.integers(0, len(days), 300)] + pd.to_timedelta(rng.integers(0, 24 * 60, 300), 'min')
+    accounts = rng.choice(list(CARD_SETTINGS) + ['財布', '銀行A'], 300)
+    df = make_records(list(picked.strftime('%Y/%m/%d %H:%M')), list(accounts))
+    assert_matches_rowwise(df, CARD_SETTINGS, closures=['2024-05-07'])
+
+
+def test_closing_day_beyond_month_end_raises_like_rowwise():
+    # 30日締めのカードを2月に使うと、締め日が存在しない（行ごとの実装と同じく例外）
+    card_settings = {'カードD': {**CARD_SETTINGS['カードB'], 'closing_day': 30}}
+    df = make_records(['2023/02/10 10:00'], ['カードD'])
+    with pytest.raises(ValueError):
+        add_credit_withdrawal_info_rowwise(df, card_settings)
+    with pytest.raises(ValueError):
+        add_credit_withdrawal_info(df.copy(), card_settings)
+
+
+def test_payment_on_holiday_rolls_to_next_business_day():
+    df = make_records(
+        # 2024-02-12（振替休日）、2024-12-31（年末の休業日）、2024-05-07（bank_closures）に支払日が当たる
+        ['2024/01/10 10:00', '2024/10/20 10:00', '2024/04/01 10:00'],
+        ['カードE', 'カードF', 'カードG'],
+    )
+    card_settings = {
+        'カードE': {'closing_day': 15, 'payment_offset_months': 1, 'payment_day': 12, 'withdrawal_account': '銀行A'},
+        'カードF': {'closing_day': 31, 'payment_offset_months': 2, 'payment_day': 31, 'withdrawal_account': '銀行A'},
+        'カードG': {'closing_day': 15, 'payment_offset_months': 1, 'payment_day': 7, 'withdrawal_account': '銀行B'},
+    }
+    actual = add_credit_withdrawal_info(df.copy(), card_settings, ['2024-05-07'])
+    assert actual['withdrawal_date'].dt.strftime('%Y-%m-%d').tolist() == ['2024-02-13', '2025-01-06', '2024-05-08']
+    assert_matches_rowwise(df, card_settings, closures=['2024-05-07'])
+
+
+def test_without_card_rows_keeps_datetime_dtype():
+    # カードを使った行が無い場合も、引き落とし日は利用日時と同じ日時型になる
+    df = make_records(['2024/01/10 10:00', '2024/01/11 12:30'], ['財布', '銀行A'])
+    actual = add_credit_withdrawal_info(df.copy(), CARD_SETTINGS)
+    assert pd.api.types.is_datetime64_dtype(actual['withdrawal_date'])
+    assert actual['withdrawal_date'].tolist() == [pd.Timestamp('2024-01-10 10:00'), pd.Timestamp('2024-01-11 12:30')]
+    assert actual['withdrawal_account'].tolist() == ['財布', '銀行A']
+
+
+def test_card_row_without_date_raises():
+    df = make_records(['2024/01/10 10:00', None], ['財布', 'カードB'])
+    with pytest.raises(ValueError, match='日付の無いカード利用の行'):
+        add_credit_withdrawal_info(df.copy(), CARD_SETTINGS)
+
+
+def test_non_card_row_without_date_passes_through():
+    df = make_records(['2024/01/10 10:00', None], ['カードB', '財布'])
+    actual = add_credit_withdrawal_info(df.copy(), CARD_SETTINGS)
+    assert actual['withdrawal_date'].iloc[0] == pd.Timestamp('2024-02-13')
+    assert pd.isna(actual['withdrawal_date'].iloc[1])
@@ -0,0 +1,50 @@
+import pandas as pd
+
+from benchmarks.generate_data import generate_kakei_data
+from src.add_card_info import process_record_df
+from src.balance_checkpoint import build_final_balance_df_incremental
+from src.config import load_meta
+from src.make_final_balance import build_final_balance_df
+from src.schema import BALANCE_SCHEMA, RECORD_SCHEMA, TRANSFER_SCHEMA, read_typed_csv
+from src.transfer import process_transfer_df
+
+
+def test_incremental_window_matches_full_rebuild(tmp_path):
+    generate_kakei_data(str(tmp_path), years=1, tx_per_day=5, start='2023-01-01', seed=1)
+    meta = load_meta(str(tmp_path / 'meta.json'))
+    csv_dir = tmp_path / 'csvoutputs'
+    record_df = read_typed_csv(str(csv_dir / 'record.csv'), RECORD_SCHEMA)
+    transfer_df = read_typed_csv(str(csv_dir / 'transfer.csv'), TRANSFER_SCHEMA)
+    balance_df = read_typed_csv(str(csv_dir / 'balance.csv'), BALANCE_SCHEMA)
+    accounts = meta['accounts_ja_en']
+    transfer_flow_df = process_transfer_df(transfer_df, meta['card_settings'])
+
+    def flows(records: pd.DataFrame) -> list[pd.DataFrame]:
+        return [transfer_flow_df, process_record_df(records, meta['card_settings'])]
+
+    _, from_date, state = build_final_balance_df_incremental(balance_df, flows(record_df), accounts, None)
+    assert from_date is None
+    latest_checkpoint = max(state['checkpoints'])
+
+    # 最新のチェックポイントより前の、収支1件と残高1件を変更する
+    record_df = record_df.copy()
+    changed_record = record_df.index[record_df['日付'].dt.strftime('%Y-%m') == '2023-07'][0]
+    record_df.loc[changed_record, '金額'] += 12345
+    balance_df = balance_df.copy()
+    changed_balance = balance_df.index[balance_df['日付'].dt.strftime('%Y-%m') == '2023-09'][0]
+    balance_df.loc[changed_balance, '金額'] -= 777
+
+    window_df, from_date, new_state = build_final_balance_df_incremental(
+        balance_df, flows(record_df), accounts, state
+    )
+    assert from_date is not None
+    assert from_date.strftime('%Y-%m-%d') < latest_checkpoint
+    assert from_date <= record_df.loc[changed_record, '日付'].tz_localize('Asia/Tokyo').tz_convert('UTC')
+
+    full_df = build_final_balance_df(balance_df, flows(record_df), accounts)
+    expected = full_df[full_df['date'] >= from_date].reset_index(drop=True)
+    pd.testing.assert_frame_equal(window_df, expected, check_dtype=False)
+
+    # 新しいチェックポイントは全期間を計算し直した場合と同じ
+    _, _, rebuilt_state = build_final_balance_df_incremental(balance_df, flows(record_df), accounts, None)
+    assert new_state['checkpoints'] == rebuilt_state['checkpoints']
@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+from src.balance_series import BalanceSeriesStore, to_series_frame
+
+ASSETS = {'財布': 'wallet'}
+
+
+def make_final_df(start: str, flows: list[int], balances: list[float]) -> pd.DataFrame:
+    return pd.DataFrame({
+        'date': pd.date_range(start, periods=len(flows), freq='D', tz='UTC'),
+        '財布_収支': flows,
+        '財布_残高': balances,
+    })
+
+
+def test_query_downsamples_flows_and_balances():
+    store = BalanceSeriesStore()
+    store.update(make_final_df('2024-01-01', [1, 2, 3, 4, 5], [10, 12, 15, 19, 24]), ASSETS)
+    timestamps, values = store.query(
+        ['wallet_flow', 'wallet_balance'], pd.Timestamp('2024-01-01'), pd.Timestamp('2024-01-05 18:00'), max_points=3
+    )
+    # 2日ごとの区間: 収支は合計、残高は区間の最終日の値
+    assert [pd.Timestamp(ms, unit='ms').strftime('%m-%d') for ms in timestamps] == ['01-02', '01-04', '01-05']
+    assert values == {'wallet_flow': [3, 7, 5], 'wallet_balance': [12, 19, 24]}
+    with pytest.raises(KeyError):
+        store.query(['bank_balance'], pd.Timestamp('2024-01-01'), pd.Timestamp('2024-01-05'))
+
+
+def test_incremental_update_replaces_only_the_tail():
+    store = BalanceSeriesStore()
+    store.update(make_final_df('2024-01-01', [1, 1, 1], [1, 2, 3]), ASSETS)
+    store.update(make_final_df('2024-01-02', [5, 5], [6, 11]), ASSETS, from_date=pd.Timestamp('2024-01-02', tz='UTC'))
+    _, values = store.query(['wallet_balance'], pd.Timestamp('2024-01-01'), pd.Timestamp('2024-01-03'))
+    assert values == {'wallet_balance': [1, 6, 11]}
+
+
+def test_replace_during_a_query_does_not_mix_generations():
+    old_frame = to_series_frame(make_final_df('2024-01-01', [1, 1], [100, 101]), ASSETS)
+    new_frame = to_series_frame(make_final_df('2024-01-01', [2, 2], [200, 202]), ASSETS)
+    store = BalanceSeriesStore()
+    store.replace(old_frame)
+
+    # クエリがデータを取得した直後に、別のスレッドがデータを入れ替えた場合
+    take_snapshot = store._snapshot
+
+    def snapshot_then_replace():
+        snapshot = take_snapshot()
+        store._snapshot = take_snapshot
+        store.replace(new_frame)
+        return snapshot
+
+    store._snapshot = snapshot_then_replace
+    span = (pd.Timestamp('2024-01-01'), pd.Timestamp('2024-01-02'))
+    _, values = store.query(['wallet_balance'], *span)
+    # 取得した時点（古い世代）のデータで答え、新しいデータを古い世代として扱わない
+    assert values == {'wallet_balance': [100, 101]}
+    # 古い世代の結果は入れ替え後のキャッシュに残さない
+    assert store.status()['cache']['size'] == 0
+
+    _, values = store.query(['wallet_balance'], *span)
+    assert values == {'wallet_balance': [200, 202]}
+    _, values = store.query(['wallet_balance'], *span)
+    assert values == {'wallet_balance': [200, 202]}
+    assert store.status()['cache'] == {'hits': 1, 'misses': 2, 'size': 1, 'max_size': 256}
+
+
+def test_cache_keeps_the_most_recently_used_results():
+    store = BalanceSeriesStore(cache_size=2)
+    store.update(make_final_df('2024-01-01', [1, 2, 3], [1, 3, 6]), ASSETS)
+    spans = [(pd.Timestamp('2024-01-01'), pd.Timestamp(f'2024-01-0{day}')) for day in (1, 2, 3)]
+    store.query(['wallet_flow'], *spans[0])
+    store.query(['wallet_flow'], *spans[1])
+    store.query(['wallet_flow'], *spans[0])
+    store.query(['wallet_flow'], *spans[2])
+    assert store.status()['cache']['size'] == 2
+    # 最も長く使われていない spans[1] が追い出される
+    store.query(['wallet_flow'], *spans[0])
+    store.query(['wallet_flow'], *spans[1])
+    assert store.status()['cache']['hits'] == 2
@@ -0,0 +1,69 @@
+import json
+import os
+
+from benchmarks.generate_data import generate_kakei_data
+from src.batch import load_households, run_batch
+
+
+def make_household(root, name: str, seed: int = 0) -> str:
+    base_dir = os.path.join(str(root), name)
+    generate_kakei_data(base_dir, years=1, tx_per_day=2, start='2024-01-01', seed=seed)
+    return base_dir
+
+
+def test_load_households_from_a_directory(tmp_path):
+    for name in ['bob', 'alice', 'Bad-Name']:
+        os.makedirs(tmp_path / name)
+        (tmp_path / name / 'meta.json').write_text('{}')
+    os.makedirs(tmp_path / 'no_meta')
+
+    households = load_households(str(tmp_path))
+    # meta.json の無いディレクトリは世帯ではない。使えない世帯名は失敗として扱うため、一覧から外さない
+    assert [household['name'] for household in households] == ['Bad-Name', 'alice', 'bob']
+    assert 'error' in households[0] and 'record' not in households[0]
+
+    alice = households[1]
+    assert alice['meta'] == os.path.join(str(tmp_path), 'alice', 'meta.json')
+    assert alice['record'] == os.path.join(str(tmp_path), 'alice', 'csvoutputs', 'record.csv')
+    assert (alice['table_name_record'], alice['table_name_final']) == ('alice_kakeibo', 'alice_kakeibo_2')
+    assert 'error' not in alice
+
+
+def test_manifest_paths_are_relative_to_the_manifest(tmp_path):
+    os.makedirs(tmp_path / 'conf')
+    manifest_path = tmp_path / 'conf' / 'households.json'
+    manifest_path.write_text(json.dumps({'households': [
+        {'name': 'alice', 'dir': '../data/alice', 'record': 'shared/record.csv', 'cache_dir': None},
+        {'name': 'bob', 'table_name_final': 'bob_balance'},
+        {'name': 'bad name'},
+    ]}))
+
+    alice, bob, bad = load_households(str(manifest_path))
+    conf_dir = str(tmp_path / 'conf')
+    assert alice['meta'] == os.path.join(conf_dir, '../data/alice', 'meta.json')
+    assert os.path.normpath(alice['meta']) == str(tmp_path / 'data' / 'alice' / 'meta.json')
+    assert alice['record'] == os.path.join(conf_dir, 'shared/record.csv')
+    assert alice['cache_dir'] is None
+    # dir を省略すると世帯名のディレクトリ
+    assert bob['balance'] == os.path.join(conf_dir, 'bob', 'csvoutputs', 'balance.csv')
+    assert bob['table_name_final'] == 'bob_balance'
+    assert bad['name'] == 'bad name' and 'error' in bad
+
+
+def test_run_batch_isolates_failing_households(tmp_path):
+    make_household(tmp_path, 'alice', seed=1)
+    make_household(tmp_path, 'bob', seed=2)
+    make_household(tmp_path, 'Bad-Name', seed=3)
+    make_household(tmp_path, 'carol', seed=4)
+    os.remove(tmp_path / 'carol' / 'csvoutputs' / 'record.csv')
+
+    households = load_households(str(tmp_path))
+    results = run_batch(households, {}, max_workers=2, dry_run=True)
+
+    assert [result['name'] for result in results] == ['Bad-Name', 'alice', 'bob', 'carol']
+    by_name = {result['name']: result for result in results}
+    for name in ['alice', 'bob']:
+        assert by_name[name]['ok'] and by_name[name]['error'] is None
+        assert by_name[name]['rows'] > 300
+    assert not by_name['Bad-Name']['ok'] and '世帯名' in by_name['Bad-Name']['error']
+    assert not by_name['carol']['ok'] and 'record.csv' in by_name['carol']['error']
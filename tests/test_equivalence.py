@@ -0,0 +1,97 @@
+import datetime
+import pandas as pd
+import pytest
+
+from benchmarks.generate_data import generate_kakei_data
+from src.add_card_info import RECORD_COLUMNS_EN, process_record_df
+from src.config import load_meta
+from src.jp_calendar import bank_holidays
+from src.make_final_balance import build_final_balance_df
+from src.schema import BALANCE_SCHEMA, RECORD_SCHEMA, TRANSFER_SCHEMA, read_typed_csv
+from src.transfer import process_transfer_df
+from rowwise_reference import (
+    add_credit_withdrawal_info_rowwise,
+    build_final_balance_df_rowwise,
+    transform_transfer_data_rowwise,
+)
+
+# ベクトル化した各ステージの出力が、行ごとに処理していた元の実装の出力と一致することを確認する
+# （生成データは benchmarks/generate_data.py と同じもの。カードの締め日・支払日の分岐を網羅している）
+
+
+@pytest.fixture(scope='module', params=[3, 0], ids=['cards', 'no_cards'])
+def dataset(request, tmp_path_factory):
+    out_dir = tmp_path_factory.mktemp(f'kakei_{request.param}_cards')
+    generate_kakei_data(str(out_dir), years=2, tx_per_day=4, n_cards=request.param, start='2022-06-01', seed=3)
+    meta = load_meta(str(out_dir / 'meta.json'))
+    meta['bank_closures'] = ['2023-05-08']
+    csv_dir = out_dir / 'csvoutputs'
+    paths = {name: str(csv_dir / f'{name}.csv') for name in ('record', 'transfer', 'balance')}
+    closed_days = bank_holidays(2022, 2025, meta['bank_closures']).astype(datetime.date)
+
+    # 行ごとの実装（元のパイプラインと同じく、CSVを型を指定せずに読み込む）
+    raw_record = pd.read_csv(paths['record'], parse_dates=['日付'])
+    raw_record.columns = RECORD_COLUMNS_EN
+    expected_record = add_credit_withdrawal_info_rowwise(raw_record, meta['card_settings'], closed_days)
+    expected_transfer = add_credit_withdrawal_info_rowwise(
+        transform_transfer_data_rowwise(pd.read_csv(paths['transfer'])), meta['card_settings'], closed_days
+    )
+    expected_final = build_final_balance_df_rowwise(
+        pd.read_csv(paths['balance'], parse_dates=['日付']),
+        pd.concat([expected_transfer, expected_record], axis=0),
+        meta['accounts_ja_en'],
+    )
+
+    # ベクトル化した実装
+    closures = meta['bank_closures']
+    record = process_record_df(read_typed_csv(paths['record'], RECORD_SCHEMA), meta['card_settings'], closures)
+    transfer = process_transfer_df(
+        read_typed_csv(paths['transfer'], TRANSFER_SCHEMA), meta['card_settings'], bank_closures=closures
+    )
+    final = build_final_balance_df(read_typed_csv(paths['balance'], BALANCE_SCHEMA), [transfer, record], meta['accounts_ja_en'])
+
+    return {
+        'meta': meta,
+        'expected': {'record': expected_record, 'transfer': expected_transfer, 'final': expected_final},
+        'actual': {'record': record, 'transfer': transfer, 'final': final},
+    }
+
+
+def as_dates(values: pd.Series) -> pd.Series:
+    """日付・日時・文字列が混在する列を datetime64 に揃える"""
+    return pd.to_datetime(values.astype(str), format='mixed').reset_index(drop=True)
+
+
+def as_text(values: pd.Series) -> list[str]:
+    """文字列の列を比べるため、欠損値を空文字にする"""
+    return values.astype(object).where(values.notna(), '').astype(str).tolist()
+
+
+@pytest.mark.parametrize('name', ['record', 'transfer'])
+def test_flow_stages_match_rowwise(dataset, name):
+    expected = dataset['expected'][name].reset_index(drop=True)
+    actual = dataset['actual'][name].reset_index(drop=True)
+    assert list(actual.columns) == list(expected.columns)
+    assert len(actual) == len(expected)
+
+    for column in ['date', 'withdrawal_date']:
+        pd.testing.assert_series_equal(as_dates(actual[column]), as_dates(expected[column]), check_names=False)
+    assert actual['amount'].astype('int64').tolist() == expected['amount'].astype('int64').tolist()
+    for column in ['type', 'category', 'subcategory', 'place', 'memo', 'payment_method', 'account', 'tag', 'withdrawal_account']:
+        assert as_text(actual[column]) == as_text(expected[column]), column
+
+
+def test_final_balance_matches_rowwise(dataset):
+    pd.testing.assert_frame_equal(dataset['actual']['final'], dataset['expected']['final'], check_dtype=False)
+
+
+def test_card_rows_are_present(dataset):
+    # カードの有無で2通りのデータになっていること（カード無しは引き落とし日が利用日時のまま）
+    record = dataset['actual']['record']
+    is_card = record['account'].isin(list(dataset['meta']['card_settings']))
+    if dataset['meta']['card_settings']:
+        assert is_card.sum() > 100
+    else:
+        assert not is_card.any()
+        assert pd.api.types.is_datetime64_dtype(record['withdrawal_date'])
+        assert (record['withdrawal_date'] == record['date']).all()
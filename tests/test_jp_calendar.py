@@ -0,0 +1,71 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from src.jp_calendar import bank_holidays, japanese_holidays, roll_forward_to_business_day
+
+
+def holiday_list(year: int) -> list[tuple[str, str]]:
+    return [(day.strftime('%m-%d'), name) for day, name in japanese_holidays(year).items()]
+
+
+def test_holidays_1998_substitute_is_the_next_day_and_beats_citizens_holiday():
+    # 5/3（日）の振替休日は翌日の5/4。5/4 が振替休日になるので 5/6 は平日
+    assert holiday_list(1998) == [
+        ('01-01', '元日'), ('01-15', '成人の日'), ('02-11', '建国記念の日'), ('03-21', '春分の日'),
+        ('04-29', 'みどりの日'), ('05-03', '憲法記念日'), ('05-04', '振替休日'), ('05-05', 'こどもの日'),
+        ('07-20', '海の日'), ('09-15', '敬老の日'), ('09-23', '秋分の日'), ('10-10', '体育の日'),
+        ('11-03', '文化の日'), ('11-23', '勤労感謝の日'), ('12-23', '天皇誕生日'),
+    ]
+
+
+def test_holidays_2006():
+    assert holiday_list(2006) == [
+        ('01-01', '元日'), ('01-02', '振替休日'), ('01-09', '成人の日'), ('02-11', '建国記念の日'),
+        ('03-21', '春分の日'), ('04-29', 'みどりの日'), ('05-03', '憲法記念日'), ('05-04', '国民の休日'),
+        ('05-05', 'こどもの日'), ('07-17', '海の日'), ('09-18', '敬老の日'), ('09-23', '秋分の日'),
+        ('10-09', '体育の日'), ('11-03', '文化の日'), ('11-23', '勤労感謝の日'), ('12-23', '天皇誕生日'),
+    ]
+
+
+def test_holidays_2019_with_the_enthronement():
+    # 5/1 の前後が国民の休日、5/5（日）の振替休日は最も近い祝日でない 5/6
+    assert holiday_list(2019) == [
+        ('01-01', '元日'), ('01-14', '成人の日'), ('02-11', '建国記念の日'), ('03-21', '春分の日'),
+        ('04-29', '昭和の日'), ('04-30', '国民の休日'), ('05-01', '天皇の即位の日'), ('05-02', '国民の休日'),
+        ('05-03', '憲法記念日'), ('05-04', 'みどりの日'), ('05-05', 'こどもの日'), ('05-06', '振替休日'),
+        ('07-15', '海の日'), ('08-11', '山の日'), ('08-12', '振替休日'), ('09-16', '敬老の日'),
+        ('09-23', '秋分の日'), ('10-14', '体育の日'), ('10-22', '即位礼正殿の儀'), ('11-03', '文化の日'),
+        ('11-04', '振替休日'), ('11-23', '勤労感謝の日'),
+    ]
+
+
+def test_sunday_between_holidays_is_not_a_citizens_holiday_before_2007():
+    # 1986年は 5/4 が日曜日で、5/3・5/5 は平日・祝日のまま（振替休日も国民の休日も無い）
+    holidays = japanese_holidays(1986)
+    assert datetime.date(1986, 5, 4) not in holidays
+    assert datetime.date(1986, 5, 6) not in holidays
+
+
+def test_year_out_of_range():
+    with pytest.raises(ValueError):
+        japanese_holidays(1948)
+
+
+def test_bank_holidays_and_roll_forward_with_a_closure():
+    closures = ['2020-01-06']
+    days = bank_holidays(2019, 2020, closures)
+    assert np.all(days[:-1] < days[1:])
+    for day in ['2019-05-06', '2019-12-31', '2020-01-02', '2020-01-03', '2020-01-06']:
+        assert np.datetime64(day) in days
+    # 祝日でない土日は含めない（土日の判定は営業日カレンダーで行う）
+    assert np.datetime64('2019-05-04') in days and np.datetime64('2020-01-04') not in days
+
+    dates = np.array(['2019-04-27', '2019-12-30', '2019-12-31', '2020-01-01', '2020-01-06'], dtype='datetime64[D]')
+    assert roll_forward_to_business_day(dates, closures).tolist() == [
+        datetime.date(2019, 5, 7), datetime.date(2019, 12, 30), datetime.date(2020, 1, 7),
+        datetime.date(2020, 1, 7), datetime.date(2020, 1, 7),
+    ]
+    # 追加の休業日が無ければ、年末年始の後の最初の営業日
+    assert roll_forward_to_business_day(dates[2:3]).tolist() == [datetime.date(2020, 1, 6)]
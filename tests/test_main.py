@@ -0,0 +1,83 @@
+import contextlib
+
+import pytest
+
+import main
+import src
+import watch
+from benchmarks.generate_data import generate_kakei_data
+from src.config import PIPELINE_STAGES, load_meta, pipeline_stage_keys, target_tables
+from src.stage_cache import StageCache
+
+
+def test_config_errors_return_exit_code_2_however_main_is_called(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    # webhook.py・watch.py と同じ引数なしの呼び出しでも、例外ではなく終了コードを返す
+    assert main.main() == 2
+    assert main.main(argv=['--check']) == 2
+    assert 'meta.json' in capsys.readouterr().out
+
+
+def test_watch_reports_a_failed_exit_code_to_the_worker(monkeypatch):
+    monkeypatch.setattr(watch, 'run_main', lambda **kwargs: 2)
+    with pytest.raises(RuntimeError, match='終了コード 2'):
+        watch.run_pipeline()
+    monkeypatch.setattr(watch, 'run_main', lambda **kwargs: 0)
+    watch.run_pipeline()
+
+
+@pytest.fixture
+def unchanged_inputs(tmp_path, monkeypatch):
+    """前回成功時と同じ入力（両方のDBステージが完了済み）の状態と、run_pipeline の呼び出しの記録"""
+    generate_kakei_data(str(tmp_path), years=1, tx_per_day=2, start='2024-01-01', seed=3)
+    argv = [
+        '--input-dir', str(tmp_path / 'csvoutputs'), '--meta', str(tmp_path / 'meta.json'),
+        '--state', str(tmp_path / 'state.json'), '--cache-dir', str(tmp_path / 'cache'),
+    ]
+    keys = pipeline_stage_keys(
+        str(tmp_path / 'csvoutputs' / 'transfer.csv'), str(tmp_path / 'csvoutputs' / 'record.csv'),
+        str(tmp_path / 'csvoutputs' / 'balance.csv'), load_meta(str(tmp_path / 'meta.json')),
+        'kakeibo', 'kakeibo_2', main.build_parser().parse_args([]).record_mode, str(tmp_path / 'state.json'), 'wide'
+    )
+    cache = StageCache(str(tmp_path / 'cache'))
+    for stage in ('insert_csv_to_postgres', 'insert_final_balance_to_db'):
+        cache.mark_done(stage, keys[stage])
+    (tmp_path / 'state.json').write_text('{}')
+
+    calls = []
+    monkeypatch.setattr(src, 'run_pipeline', lambda db_config, **kwargs: calls.append(kwargs))
+    monkeypatch.setattr(main, 'recording', lambda metrics, db_config, save=True: contextlib.nullcontext(metrics))
+    return argv, calls, tmp_path / 'state.json'
+
+
+def test_unchanged_inputs_with_populated_tables_do_nothing(unchanged_inputs, monkeypatch):
+    argv, calls, state_path = unchanged_inputs
+    checked = []
+    monkeypatch.setattr(main, 'tables_have_rows', lambda db_config, tables: checked.append(tables) or True)
+    assert main.main(argv=argv) == 0
+    assert checked == [['kakeibo', 'kakeibo_2']]
+    assert calls == [] and state_path.exists()
+
+
+@pytest.mark.parametrize('tables_ready, extra_args', [(False, []), (True, ['--force'])], ids=['missing_tables', 'force'])
+def test_missing_tables_or_force_rerun_every_stage(unchanged_inputs, monkeypatch, tables_ready, extra_args):
+    argv, calls, state_path = unchanged_inputs
+    monkeypatch.setattr(main, 'tables_have_rows', lambda db_config, tables: tables_ready)
+    assert main.main(argv=argv + extra_args) == 0
+    # 全ステージをキャッシュ・完了の記録を使わずに実行し、最終残高は状態ファイルを消して全期間で作り直す
+    assert len(calls) == 1 and calls[0]['stages'] == list(PIPELINE_STAGES)
+    assert not state_path.exists()
+
+
+def test_target_tables_follow_the_final_layout():
+    assert target_tables('kakeibo', 'kakeibo_2', 'wide') == ['kakeibo', 'kakeibo_2']
+    assert target_tables('kakeibo', 'kakeibo_2', 'long') == ['kakeibo', 'kakeibo_2_long']
+    assert target_tables('kakeibo', 'kakeibo_2', 'sparse') == ['kakeibo', 'kakeibo_2_changes']
+
+
+def test_record_mode_defaults_to_full_and_delta_is_opt_in(monkeypatch):
+    monkeypatch.delenv('RECORD_MODE', raising=False)
+    assert main.build_parser().parse_args([]).record_mode == 'full'
+    assert main.build_parser().parse_args(['--record-mode', 'delta']).record_mode == 'delta'
+    monkeypatch.setenv('RECORD_MODE', 'delta')
+    assert main.build_parser().parse_args([]).record_mode == 'delta'
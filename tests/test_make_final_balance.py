@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+from src.make_final_balance import build_final_balance_df
+from rowwise_reference import build_final_balance_df_rowwise
+
+ACCOUNTS = {'財布': 'wallet', '銀行A': 'bank_a'}
+
+
+def make_balances(rows: list[tuple[str, str, int]]) -> pd.DataFrame:
+    """(日時（JST）, 資産, 金額) の行から、BALANCE_SCHEMA で読み込んだのと同じ形の残高データを作る"""
+    return pd.DataFrame({
+        '日付': pd.to_datetime([row[0] for row in rows]),
+        '資産': pd.Series([row[1] for row in rows], dtype='category'),
+        '金額': np.array([row[2] for row in rows], dtype='int64'),
+    })
+
+
+def make_flows(rows: list[tuple[str, str, str, int]]) -> pd.DataFrame:
+    """(引き落とし日時（JST）, 口座, 収入/支出, 金額) の行から、FLOW_SCHEMA の形の収支データを作る"""
+    return pd.DataFrame({
+        'type': pd.Series([row[2] for row in rows], dtype='category'),
+        'amount': np.array([row[3] for row in rows], dtype='int64'),
+        'withdrawal_date': pd.to_datetime([row[0] for row in rows]),
+        'withdrawal_account': pd.Series([row[1] for row in rows], dtype='category'),
+    })
+
+
+def build_both(balance_df: pd.DataFrame, flow_df: pd.DataFrame, accounts: dict[str, str]) -> pd.DataFrame:
+    """ベクトル化した実装の結果を、行ごとの実装の結果と比べてから返す"""
+    actual = build_final_balance_df(balance_df, [flow_df.iloc[:0], flow_df], accounts)
+    expected = build_final_balance_df_rowwise(balance_df, flow_df, accounts)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    return actual.set_index(actual['date'].dt.strftime('%Y-%m-%d'))
+
+
+def test_same_day_events_apply_balances_first_then_flows():
+    # JSTの正午はUTCでも同じ日。同じ日の残高は後の行が優先され、その日の入出金は残高の後に加算される
+    balance_df = make_balances([
+        ('2024-01-10 12:00', '財布', 1000),
+        ('2024-01-10 12:00', '財布', 1500),
+    ])
+    flow_df = make_flows([
+        ('2024-01-10 10:00', '財布', '支出', 200),
+        ('2024-01-10 18:00', '財布', '収入', 50),
+        ('2024-01-10 13:00', '財布', '支出', 100),
+        ('2024-01-11 10:00', '財布', '支出', 30),
+    ])
+    result = build_both(balance_df, flow_df, ACCOUNTS)
+    assert result.loc['2024-01-10', '財布_収支'] == -250
+    assert result.loc['2024-01-10', '財布_残高'] == 1250
+    assert result.loc['2024-01-11', '財布_残高'] == 1220
+
+
+def test_balance_anchor_in_the_middle_of_the_period_resets_the_running_total():
+    balance_df = make_balances([('2024-03-03 12:00', '銀行A', 5000)])
+    flow_df = make_flows([
+        ('2024-03-01 12:00', '銀行A', '支出', 100),
+        ('2024-03-02 12:00', '財布', '支出', 10),
+        ('2024-03-04 12:00', '銀行A', '支出', 300),
+        ('2024-03-06 12:00', '銀行A', '収入', 1000),
+    ])
+    result = build_both(balance_df, flow_df, ACCOUNTS)
+    # 残高の記録より前は0からの累計、記録の日以降は記録した残高からの累計（記録の無い日は前日の値）
+    assert result['銀行A_残高'].tolist() == [-100, -100, 5000, 4700, 4700, 5700]
+    assert result['銀行A_収支'].tolist() == [-100, 0, 0, -300, 0, 1000]
+    assert result.loc['2024-03-02', '財布_残高'] == -10
+
+
+def test_account_without_events_has_zero_flows_and_no_balance():
+    accounts = {**ACCOUNTS, 'カードA': 'card_a'}
+    balance_df = make_balances([('2024-05-01 12:00', '財布', 100)])
+    flow_df = make_flows([('2024-05-03 12:00', '財布', '支出', 40)])
+    result = build_both(balance_df, flow_df, accounts)
+    assert list(result.columns[1:]) == [f'{account}_{kind}' for account in accounts for kind in ['収支', '残高']]
+    for account in ['銀行A', 'カードA']:
+        assert (result[f'{account}_収支'] == 0).all()
+        assert result[f'{account}_残高'].isna().all()
+    assert result['財布_残高'].tolist() == [100, 100, 60]
+
+
+def test_events_of_accounts_outside_meta_are_ignored():
+    balance_df = make_balances([('2024-05-01 12:00', '財布', 100), ('2024-05-01 12:00', '証券', 9999)])
+    flow_df = make_flows([('2024-05-02 12:00', '証券', '収入', 500), ('2024-05-02 12:00', '財布', '収入', 5)])
+    result = build_both(balance_df, flow_df, ACCOUNTS)
+    assert list(result.columns[1:]) == ['財布_収支', '財布_残高', '銀行A_収支', '銀行A_残高']
+    assert result['財布_残高'].tolist() == [100, 105]
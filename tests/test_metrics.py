@@ -0,0 +1,29 @@
+from src import metrics as metrics_module
+from src.metrics import PipelineMetrics
+
+
+def count_resets(monkeypatch) -> list[None]:
+    resets = []
+    monkeypatch.setattr(metrics_module, '_reset_peak_rss', lambda: resets.append(None))
+    return resets
+
+
+def test_peak_memory_is_not_reset_by_default(monkeypatch):
+    # 常駐プロセス（webhook.py・watch.py）では、プロセス全体のピークメモリを変えない
+    resets = count_resets(monkeypatch)
+    metrics = PipelineMetrics(trigger='webhook')
+    with metrics.stage('outer'):
+        with metrics.stage('inner'):
+            pass
+    assert resets == []
+    assert all(stage.peak_memory_bytes > 0 for stage in metrics.stages)
+
+
+def test_peak_memory_is_reset_per_stage_when_requested(monkeypatch):
+    resets = count_resets(monkeypatch)
+    metrics = PipelineMetrics(trigger='cli', reset_peak_memory=True)
+    with metrics.stage('outer'):
+        with metrics.stage('inner'):
+            pass
+    assert len(resets) == 2
+    assert metrics.stages[0].peak_memory_bytes >= metrics.stages[1].peak_memory_bytes > 0
@@ -0,0 +1,93 @@
+import pandas as pd
+import pytest
+
+from benchmarks.generate_data import generate_kakei_data
+from src import pipeline
+from src.add_card_info import process_record_df
+from src.config import load_meta
+from src.make_final_balance import build_final_balance_df
+from src.schema import BALANCE_SCHEMA, RECORD_SCHEMA, TRANSFER_SCHEMA, read_typed_csv
+from src.transfer import process_transfer_df
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    generate_kakei_data(str(tmp_path), years=1, tx_per_day=4, start='2023-01-01', seed=2)
+    csv_dir = tmp_path / 'csvoutputs'
+    return {
+        'input_transfer_path': str(csv_dir / 'transfer.csv'),
+        'input_record_path': str(csv_dir / 'record.csv'),
+        'input_balance_path': str(csv_dir / 'balance.csv'),
+        'meta_json_path': str(tmp_path / 'meta.json'),
+    }
+
+
+@pytest.fixture
+def db_writes(monkeypatch):
+    """DBに書き込む関数を、呼び出しを記録するだけの関数に置き換える"""
+    calls = []
+    monkeypatch.setattr(pipeline, 'insert_record_df_to_postgres', lambda *args, **kwargs: None)
+    monkeypatch.setattr(
+        pipeline, 'insert_final_balance_df_to_db',
+        lambda db_config, final_df, assets, table_name: calls.append(('insert', None, len(final_df)))
+    )
+
+    def upsert(db_config, final_df, assets, table_name, from_date):
+        calls.append(('upsert', from_date, len(final_df)))
+        return True
+
+    monkeypatch.setattr(pipeline, 'upsert_final_balance_df_to_db', upsert)
+    return calls
+
+
+def full_rebuild(paths: dict[str, str]) -> pd.DataFrame:
+    meta = load_meta(paths['meta_json_path'])
+    transfer_flow_df = process_transfer_df(read_typed_csv(paths['input_transfer_path'], TRANSFER_SCHEMA), meta['card_settings'])
+    record_flow_df = process_record_df(read_typed_csv(paths['input_record_path'], RECORD_SCHEMA), meta['card_settings'])
+    balance_df = read_typed_csv(paths['input_balance_path'], BALANCE_SCHEMA)
+    return build_final_balance_df(balance_df, [transfer_flow_df, record_flow_df], meta['accounts_ja_en'])
+
+
+def change_one_record(paths: dict[str, str], month: str) -> None:
+    """record.csv の month（YYYY/MM）の最初の行の金額を変える"""
+    records = pd.read_csv(paths['input_record_path'], dtype=str, keep_default_na=False)
+    row = records.index[records['日付'].str.startswith(month)][0]
+    records.loc[row, '金額'] = str(int(records.loc[row, '金額']) + 4321)
+    records.to_csv(paths['input_record_path'], index=False)
+
+
+@pytest.mark.parametrize('use_cache', [True, False])
+def test_incremental_and_cached_runs_return_the_full_final_balance(dataset, db_writes, tmp_path, monkeypatch, use_cache):
+    options = {
+        'state_path': str(tmp_path / 'state.json'),
+        'cache_dir': str(tmp_path / 'cache') if use_cache else None,
+    }
+    updates = []
+
+    def on_final_balance(final_df, accounts, from_date):
+        updates.append((len(final_df), from_date))
+
+    first = pipeline.run_pipeline({}, **dataset, **options, on_final_balance=on_final_balance)
+    pd.testing.assert_frame_equal(first, full_rebuild(dataset), check_dtype=False)
+    assert db_writes[-1][:2] == ('insert', None)
+
+    change_one_record(dataset, '2023/06')
+    rebuilds = []
+    monkeypatch.setattr(
+        pipeline, 'build_final_balance_df', lambda *args: rebuilds.append(args) or build_final_balance_df(*args)
+    )
+    second = pipeline.run_pipeline({}, **dataset, **options, on_final_balance=on_final_balance)
+    # キャッシュがあれば前回の全期間のデータとつなげ、無ければ全期間を計算し直す
+    assert len(rebuilds) == (0 if use_cache else 1)
+    expected = full_rebuild(dataset)
+    pd.testing.assert_frame_equal(second, expected, check_dtype=False)
+
+    # DBと on_final_balance には再計算した期間だけを渡す
+    kind, from_date, rows = db_writes[-1]
+    assert kind == 'upsert' and from_date is not None
+    assert rows == (expected['date'] >= from_date).sum() < len(expected)
+    assert updates[-1] == (rows, from_date)
+
+    # 入力が同じなら、キャッシュから同じ全期間のデータを返す（キャッシュが無ければ変更なしとして全期間を返す）
+    third = pipeline.run_pipeline({}, **dataset, **options, on_final_balance=on_final_balance)
+    pd.testing.assert_frame_equal(third, expected, check_dtype=False)
@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+
+from benchmarks.generate_data import generate_kakei_data
+from src import schema
+from src.schema import BALANCE_SCHEMA, RECORD_SCHEMA, TRANSFER_SCHEMA, iter_typed_csv, read_typed_csv
+from src.transfer import transform_transfer_data
+
+TRANSFER_WITHOUT_MEMO = "日付,金額,出金,入金\n2024/01/05,10000,銀行A,財布\n2024/01/06,,財布,電子マネー\n"
+
+
+def test_transfer_csv_without_memo_column(tmp_path):
+    path = tmp_path / 'transfer.csv'
+    path.write_text(TRANSFER_WITHOUT_MEMO, encoding='utf-8')
+
+    df = read_typed_csv(str(path), TRANSFER_SCHEMA, encoding='utf-8')
+    assert list(df.columns) == list(TRANSFER_SCHEMA)
+    assert df['メモ'].tolist() == ['', '']
+    assert df['金額'].tolist() == [10000, 0]
+    # メモの列が無い振替は、元の実装（row.get('メモ', '')）と同じく空のメモになる
+    assert transform_transfer_data(df)['memo'].tolist()[:2] == ['振替: 財布へ。', '振替: 銀行Aから。']
+
+    chunks = list(iter_typed_csv(str(path), TRANSFER_SCHEMA, 1, encoding='utf-8'))
+    assert [chunk['メモ'].tolist() for chunk in chunks] == [[''], ['']]
+
+
+def test_missing_required_column_is_an_error(tmp_path):
+    path = tmp_path / 'transfer.csv'
+    path.write_text("日付,金額,出金,メモ\n2024/01/05,100,銀行A,x\n", encoding='utf-8')
+    with pytest.raises(ValueError, match='入金'):
+        read_typed_csv(str(path), TRANSFER_SCHEMA)
+
+
+def test_pyarrow_engine_reads_the_same_frames(tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    generate_kakei_data(str(tmp_path), years=1, tx_per_day=3, start='2024-01-01', seed=5)
+    (tmp_path / 'no_memo.csv').write_text(TRANSFER_WITHOUT_MEMO, encoding='utf-8')
+    csv_dir = tmp_path / 'csvoutputs'
+    cases = [
+        (csv_dir / 'record.csv', RECORD_SCHEMA),
+        (csv_dir / 'transfer.csv', TRANSFER_SCHEMA),
+        (csv_dir / 'balance.csv', BALANCE_SCHEMA),
+        (tmp_path / 'no_memo.csv', TRANSFER_SCHEMA),
+    ]
+    for path, columns in cases:
+        monkeypatch.setattr(schema, 'CSV_ENGINE', 'c')
+        expected = read_typed_csv(str(path), columns, encoding='utf-8')
+        monkeypatch.setattr(schema, 'CSV_ENGINE', 'pyarrow')
+        actual = read_typed_csv(str(path), columns, encoding='utf-8')
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False, check_categorical=False)
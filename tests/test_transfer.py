@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from src.transfer import transform_transfer_data
+from rowwise_reference import transform_transfer_data_rowwise
+
+
+def make_transfers(rows: list[tuple[str, int, object, object, object]]) -> pd.DataFrame:
+    """(日付, 金額, 出金, 入金, メモ) の行から、TRANSFER_SCHEMA で読み込んだのと同じ形の振替データを作る"""
+    return pd.DataFrame({
+        '日付': pd.to_datetime([row[0] for row in rows]),
+        '金額': np.array([row[1] for row in rows], dtype='int64'),
+        '出金': pd.Series([row[2] for row in rows], dtype='category'),
+        '入金': pd.Series([row[3] for row in rows], dtype='category'),
+        'メモ': pd.Series([row[4] for row in rows], dtype='string'),
+    })
+
+
+def assert_same_as_rowwise(transfer_df: pd.DataFrame) -> pd.DataFrame:
+    actual = transform_transfer_data(transfer_df)
+    # 元の実装は型を指定せずにCSVを読み込んでいたため、欠損値は float の NaN（メモには 'nan' と書かれる）
+    untyped_df = transfer_df.astype(object).where(transfer_df.notna(), np.nan)
+    expected = transform_transfer_data_rowwise(untyped_df)
+    assert list(actual.columns) == list(expected.columns)
+    pd.testing.assert_series_equal(actual['date'], expected['date'], check_dtype=False)
+    assert actual['amount'].tolist() == expected['amount'].tolist()
+    for column in ['type', 'category', 'memo', 'payment_method']:
+        assert actual[column].tolist() == expected[column].tolist(), column
+    # 口座の欠損値は、どちらの実装でも欠損値のまま
+    assert actual['account'].isna().tolist() == expected['account'].isna().tolist()
+    assert actual['account'].dropna().tolist() == expected['account'].dropna().tolist()
+    return actual
+
+
+def test_each_transfer_becomes_expense_then_income():
+    transfer_df = make_transfers([
+        ('2024-01-05 09:00', 10000, '銀行A', '財布', '引き出し'),
+        ('2024-01-03 20:00', 3000, '財布', '電子マネー', 'チャージ'),
+        ('2024-01-05 09:00', 500, '銀行A', '財布', ''),
+    ])
+    actual = assert_same_as_rowwise(transfer_df)
+    # 入力の並び順のまま、振替ごとに「支出, 収入」の2行になる
+    assert actual['type'].tolist() == ['支出', '収入'] * 3
+    assert actual['account'].tolist() == ['銀行A', '財布', '財布', '電子マネー', '銀行A', '財布']
+    assert actual['amount'].tolist() == [10000, 10000, 3000, 3000, 500, 500]
+    assert actual['memo'].tolist()[:2] == ['振替: 財布へ。引き出し', '振替: 銀行Aから。引き出し']
+
+
+def test_missing_memo_and_account_are_written_as_nan():
+    transfer_df = make_transfers([
+        ('2024-02-01 12:00', 2000, '銀行A', '財布', None),
+        ('2024-02-02 12:00', 700, None, '財布', 'メモあり'),
+        ('2024-02-03 12:00', 300, '財布', None, None),
+    ])
+    actual = assert_same_as_rowwise(transfer_df)
+    assert actual['memo'].tolist() == [
+        '振替: 財布へ。nan', '振替: 銀行Aから。nan',
+        '振替: 財布へ。メモあり', '振替: nanから。メモあり',
+        '振替: nanへ。nan', '振替: 財布から。nan',
+    ]
+
+
+def test_without_memo_column():
+    transfer_df = make_transfers([('2024-03-01 12:00', 100, '銀行A', '財布', None)]).drop(columns='メモ')
+    actual = transform_transfer_data(transfer_df)
+    assert actual['memo'].tolist() == ['振替: 財布へ。', '振替: 銀行Aから。']
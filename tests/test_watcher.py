@@ -0,0 +1,141 @@
+import os
+import threading
+
+import pytest
+
+from src.watcher import (
+    InotifyWatcher,
+    PollingWatcher,
+    StableInputRunner,
+    files_signature,
+    wait_until_stable,
+    watch_directory,
+)
+
+
+def write(path, text: str, mtime_ns: int | None = None) -> None:
+    path.write_text(text, encoding='utf-8')
+    if mtime_ns is not None:
+        # 更新日時の分解能に左右されないよう、明示的に変える
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_polling_watcher_detects_create_modify_and_delete(tmp_path):
+    write(tmp_path / 'record.csv', 'a', mtime_ns=1_000_000_000)
+    watcher = PollingWatcher(str(tmp_path), poll_interval=0.01)
+    assert watcher.wait(0.05) == set()
+
+    write(tmp_path / 'balance.csv', 'b')
+    assert watcher.wait(1.0) == {'balance.csv'}
+
+    write(tmp_path / 'record.csv', 'a', mtime_ns=2_000_000_000)
+    assert watcher.wait(1.0) == {'record.csv'}
+
+    (tmp_path / 'balance.csv').unlink()
+    assert watcher.wait(1.0) == {'balance.csv'}
+    watcher.close()
+
+
+def test_polling_watcher_on_a_missing_directory(tmp_path):
+    watcher = PollingWatcher(str(tmp_path / 'missing'), poll_interval=0.01)
+    assert watcher.wait(0.05) == set()
+
+
+def test_inotify_watcher_reports_closed_files(tmp_path):
+    try:
+        watcher = InotifyWatcher(str(tmp_path))
+    except OSError as e:
+        pytest.skip(f"inotify が使えません: {e}")
+    try:
+        write(tmp_path / 'transfer.csv', 'c')
+        assert 'transfer.csv' in watcher.wait(1.0)
+    finally:
+        watcher.close()
+
+
+def test_wait_until_stable(tmp_path):
+    paths = [str(tmp_path / 'record.csv'), str(tmp_path / 'balance.csv')]
+    write(tmp_path / 'record.csv', 'a')
+    # ファイルが揃わなければ timeout で None
+    assert wait_until_stable(paths, settle_seconds=0.02, poll_interval=0.01, timeout=0.1) is None
+
+    write(tmp_path / 'balance.csv', 'b')
+    signature = wait_until_stable(paths, settle_seconds=0.02, poll_interval=0.01, timeout=1.0)
+    assert signature is not None and signature == files_signature(paths)
+    # settle_seconds の間変化が無いことを確認できるまでに timeout になれば None
+    assert wait_until_stable(paths, settle_seconds=1.0, poll_interval=0.01, timeout=0.05) is None
+
+
+def test_stable_input_runner_skips_unchanged_inputs(tmp_path):
+    paths = [str(tmp_path / 'record.csv'), str(tmp_path / 'balance.csv')]
+    runs = []
+    runner = StableInputRunner(paths, lambda: runs.append(files_signature(paths)), settle_seconds=0.02, stable_timeout=0.1)
+
+    write(tmp_path / 'record.csv', 'a', mtime_ns=1_000_000_000)
+    runner(['record.csv'])
+    assert runs == []
+
+    write(tmp_path / 'balance.csv', 'b', mtime_ns=1_000_000_000)
+    runner(['balance.csv'])
+    runner(['balance.csv'])
+    assert len(runs) == 1
+
+    write(tmp_path / 'record.csv', 'a', mtime_ns=2_000_000_000)
+    runner(['record.csv'])
+    assert len(runs) == 2 and runs[0] != runs[1]
+
+
+def test_stable_input_runner_retries_after_a_failed_run(tmp_path):
+    paths = [str(tmp_path / 'record.csv')]
+    write(tmp_path / 'record.csv', 'a')
+    calls = []
+
+    def run_func():
+        calls.append(None)
+        if len(calls) == 1:
+            raise RuntimeError("DBに接続できません")
+
+    runner = StableInputRunner(paths, run_func, settle_seconds=0.02, stable_timeout=1.0)
+    with pytest.raises(RuntimeError):
+        runner(['record.csv'])
+    # 失敗した実行は記録しないので、入力が同じでも次の呼び出しで実行し直す
+    runner(['record.csv'])
+    assert len(calls) == 2
+
+
+def test_watch_directory_passes_target_files_and_stops_on_stop_event(tmp_path):
+    watcher = PollingWatcher(str(tmp_path), poll_interval=0.01)
+    stop_event = threading.Event()
+    changes = []
+
+    def on_change(changed):
+        changes.append(changed)
+        stop_event.set()
+
+    write(tmp_path / 'record.csv.part', 'a')
+    write(tmp_path / 'record.csv', 'a')
+    thread = threading.Thread(
+        target=watch_directory, args=(watcher, on_change), kwargs={'stop_event': stop_event, 'timeout': 0.05}
+    )
+    thread.start()
+    thread.join(5.0)
+    assert not thread.is_alive()
+    assert changes == [{'record.csv'}]
+
+
+def test_watch_directory_ignores_other_files_until_stopped(tmp_path):
+    watcher = PollingWatcher(str(tmp_path), poll_interval=0.01)
+    stop_event = threading.Event()
+    changes = []
+    thread = threading.Thread(
+        target=watch_directory, args=(watcher, changes.append),
+        kwargs={'filenames': ['balance.csv'], 'stop_event': stop_event, 'timeout': 0.05}
+    )
+    thread.start()
+    write(tmp_path / 'record.csv', 'a')
+    thread.join(0.2)
+    assert thread.is_alive()
+    stop_event.set()
+    thread.join(5.0)
+    assert not thread.is_alive()
+    assert changes == []
@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+from dotenv import load_dotenv
+
+load_dotenv(".env")
+
+from main import main as run_main
+from src.metrics import PipelineMetrics
+from src.watcher import WATCHED_FILES, StableInputRunner, open_watcher, watch_directory
+from src.worker import PipelineWorker
+
+# main.py が読み込むCSVのディレクトリ
+WATCH_DIR = "./data/csvoutputs"
+
+
+def run_pipeline() -> None:
+    """
+    パイプラインを同じプロセス内で実行する（DB接続プールなどを使い回す）
+    終了コードが0以外の場合は例外にして、ワーカーに失敗として記録させます（StableInputRunner は次の変更で再実行します）。
+    """
+    exit_code = run_main(metrics=PipelineMetrics(trigger='watch', profile_dir=os.getenv('PROFILE_DIR')))
+    if exit_code != 0:
+        raise RuntimeError(f"パイプラインが終了コード {exit_code} で終了しました。")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=f"{WATCH_DIR} のCSVの変更を監視し、変更があるたびにパイプラインを実行します。"
+    )
+    parser.add_argument('--debounce', type=float, default=float(os.getenv('WATCH_DEBOUNCE_SECONDS', '2')),
+                        help="変更をまとめる待ち時間（秒、既定は2秒）")
+    parser.add_argument('--settle', type=float, default=float(os.getenv('WATCH_SETTLE_SECONDS', '1')),
+                        help="CSVのサイズ・更新日時がこの秒数変わらなければ書き込みが終わったとみなす（既定は1秒）")
+    parser.add_argument('--poll', action='store_true', help="inotify を使わずポーリングで監視する（ネットワークドライブなど）")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="ポーリングの間隔（秒）")
+    parser.add_argument('--run-on-start', action='store_true', help="監視を始める前に1回実行する")
+    args = parser.parse_args()
+
+    paths = [os.path.join(WATCH_DIR, filename) for filename in WATCHED_FILES]
+    runner = StableInputRunner(paths, run_pipeline, settle_seconds=args.settle)
+    worker = PipelineWorker(runner, debounce_seconds=args.debounce).start()
+
+    watcher = open_watcher(WATCH_DIR, use_inotify=not args.poll, poll_interval=args.poll_interval)
+    if args.run_on_start:
+        worker.submit(set(WATCHED_FILES))
+
+    try:
+        watch_directory(watcher, worker.submit)
+    except KeyboardInterrupt:
+        print("👋 監視を終了します。")
+    finally:
+        watcher.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,43 +1,87 @@
+import contextvars
 import os
-import subprocess
+import tempfile
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from flask import Flask, request, jsonify
+from flask import Flask, abort, request, jsonify
+import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+
+from main import main as run_main
+from src.balance_series import BalanceSeriesStore, load_series_frame_from_db
+from src.metrics import PipelineMetrics, record_io
+from src.worker import PipelineWorker
 
 app = Flask(__name__)
 
-@app.route('/drive-webhook', methods=['GET', 'POST'])
-def drive_webhook():
-    if request.method == 'GET':
-        return "OK", 200  # ブラウザからアクセスした時に表示される
+# 通知をまとめる待ち時間（秒）
+PIPELINE_DEBOUNCE_SECONDS = float(os.getenv("PIPELINE_DEBOUNCE_SECONDS", "10"))
 
-    try:
-        data = request.json
-        if not data:
-            return jsonify({"error": "No JSON received"}), 400
+# GRAFANA_API=1 の場合、最終残高の時系列をメモリから返す /grafana/* のエンドポイントを有効にする
+GRAFANA_API_ENABLED = os.getenv("GRAFANA_API", "0") == "1"
+FINAL_BALANCE_TABLE = "kakeibo_2"
 
-        print("📥 新着ファイル通知:", data)
+# ダウンロード設定
+DOWNLOAD_DIR = "./data/csvoutputs"
+DRIVE_DOWNLOAD_URL = "https://drive.google.com/uc?export=download&id={file_id}"
+MAX_DOWNLOAD_WORKERS = 4
+DOWNLOAD_TIMEOUT = (10, 120)  # (接続, 読み取り) 秒
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
 
-        for file in data.get("files", []):
-            try:
-                url = file["url"]
-                filename = file["name"]
-                file_id = file["id"]
-                download_url = f"https://drive.google.com/uc?export=download&id={file_id}"
+# keep-alive で接続を使い回すための共有セッション
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_DOWNLOAD_WORKERS))
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_DOWNLOAD_WORKERS))
 
-                print(f"⬇️ {filename} をダウンロード中...")
 
-                response = requests.get(download_url)
-                response.raise_for_status()
+def download_file(file: dict) -> str:
+    """
+    GoogleDriveのファイルを1件ダウンロードして DOWNLOAD_DIR に保存する
+    本文はチャンク単位で一時ファイルに書き込み、完了後にリネームで置き換えるため、
+    パイプラインが書きかけのCSVを読むことはありません。
+    """
+    filename = os.path.basename(file["name"])
+    download_url = DRIVE_DOWNLOAD_URL.format(file_id=file["id"])
+    save_path = os.path.join(DOWNLOAD_DIR, filename)
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+
+    print(f"⬇️ {filename} をダウンロード中...")
+    start = time.perf_counter()
+    size = 0
+
+    with session.get(download_url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        response.raise_for_status()
+        fd, tmp_path = tempfile.mkstemp(dir=DOWNLOAD_DIR, prefix=f".{filename}.", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, save_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
 
-                save_path = f"./data/csvoutputs/{filename}"
-                os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    print(f"✅ {filename} を保存しました（{size:,} バイト, {time.perf_counter() - start:.2f} 秒）")
+    record_io(bytes_read=size)
+    return save_path
 
-                with open(save_path, "wb") as f:
-                    f.write(response.content)
-                    print(f"✅ {filename} を保存しました")
 
+def download_files(files: list[dict]) -> list[str]:
+    """通知されたファイルを並列にダウンロードし、保存できたファイルのパスを返す"""
+    saved_paths = []
+    if not files:
+        return saved_paths
+
+    with ThreadPoolExecutor(max_workers=min(MAX_DOWNLOAD_WORKERS, len(files))) as executor:
+        # 計測中のステージをダウンロードのスレッドにも引き継ぐ
+        futures = [executor.submit(contextvars.copy_context().run, download_file, file) for file in files]
+        for future in as_completed(futures):
+            try:
+                saved_paths.append(future.result())
             except KeyError as e:
                 print(f"❌ ファイル情報に必要なキーがありません: {e}")
             except requests.RequestException as e:
@@ -45,27 +89,150 @@ def drive_webhook():
             except Exception as e:
                 print(f"❌ ファイル保存時に予期せぬエラー: {e}")
                 traceback.print_exc()
+    return saved_paths
 
-        try:
-            print("▶️ main.py を実行します")
-            result = subprocess.run(
-                ["/home/ttoku/Environments/grafana/bin/python", "main.py"],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            print("✅ main.py 実行成功")
-            print(result.stdout)
-        except subprocess.CalledProcessError as e:
-            print(f"❌ main.py 実行中にエラー: {e}")
-            print(e.stderr)
-
-        return "", 200
+
+def process_notifications(batch: list[list[dict]]) -> None:
+    """
+    まとめた通知のファイルをダウンロードしてから、パイプラインを同じプロセス内で実行する
+    同じ名前のファイルが複数の通知に含まれる場合は、最後の通知のものを使います。
+    """
+    files = {}
+    for notified_files in batch:
+        for file in notified_files:
+            files[file.get("name", id(file))] = file
+
+    metrics = PipelineMetrics(trigger='webhook', profile_dir=os.getenv('PROFILE_DIR'))
+    start = time.perf_counter()
+    with metrics.stage('download_files', rows_in=len(files)) as stage:
+        stage.rows_out = len(download_files(list(files.values())))
+    print(f"⏱️ ダウンロード合計: {time.perf_counter() - start:.2f} 秒")
+
+    exit_code = run_main(metrics=metrics, on_final_balance=balance_store.update if GRAFANA_API_ENABLED else None)
+    if exit_code != 0:
+        # ワーカーに失敗として記録させる（/status の last_run に表示される）
+        raise RuntimeError(f"パイプラインが終了コード {exit_code} で終了しました。")
+
+
+db_config = {
+    'host': os.getenv('DB_HOST'),
+    'port': os.getenv('DB_PORT'),
+    'dbname': os.getenv('DB_NAME'),
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD')
+}
+
+# パイプラインの実行結果で更新される最終残高の時系列（起動直後の最初のクエリでDBから読み込む）
+balance_store = BalanceSeriesStore(loader=lambda: load_series_frame_from_db(db_config, FINAL_BALANCE_TABLE))
+
+worker = PipelineWorker(process_notifications, debounce_seconds=PIPELINE_DEBOUNCE_SECONDS).start()
+
+
+@app.route('/drive-webhook', methods=['GET', 'POST'])
+def drive_webhook():
+    if request.method == 'GET':
+        return "OK", 200  # ブラウザからアクセスした時に表示される
+
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"error": "No JSON received"}), 400
+
+        print("📥 新着ファイル通知:", data)
+
+        # ダウンロードとパイプラインの実行はワーカーに任せてすぐに返す
+        queue_depth = worker.submit(data.get("files", []))
+        return jsonify({"status": "queued", "queue_depth": queue_depth}), 202
 
     except Exception as e:
         print(f"❌ 全体処理でエラー: {e}")
         traceback.print_exc()
         return jsonify({"error": "Internal server error"}), 500
 
+
+@app.route('/status', methods=['GET'])
+def status():
+    """ワーカーのキューの深さと直近の実行結果を返す"""
+    return jsonify(worker.status()), 200
+
+
+def parse_grafana_time(value: str | int | None, default: pd.Timestamp) -> pd.Timestamp:
+    """Grafana の日時（ISO形式の文字列、またはUNIXミリ秒）を pd.Timestamp にする"""
+    if value is None or value == "":
+        return default
+    if isinstance(value, int) or str(value).isdigit():
+        return pd.Timestamp(int(value), unit='ms')
+    return pd.Timestamp(value)
+
+
+def grafana_api_enabled() -> None:
+    if not GRAFANA_API_ENABLED:
+        abort(404)
+
+
+@app.route('/grafana', methods=['GET'])
+@app.route('/grafana/', methods=['GET'])
+def grafana_health():
+    """データソースの接続確認（時系列の件数とキャッシュの状態を返す）"""
+    grafana_api_enabled()
+    return jsonify(balance_store.status()), 200
+
+
+@app.route('/grafana/search', methods=['POST'])
+def grafana_search():
+    """JSON データソース: 選択できる系列名（{account}_flow / {account}_balance）の一覧"""
+    grafana_api_enabled()
+    return jsonify(balance_store.series_names()), 200
+
+
+@app.route('/grafana/query', methods=['POST'])
+def grafana_query():
+    """JSON データソース: targets の系列の、range の期間の値を [[値, UNIXミリ秒], ...] で返す"""
+    grafana_api_enabled()
+    body = request.json or {}
+    time_range = body.get("range", {})
+    now = pd.Timestamp.now(tz='UTC')
+    targets = [target["target"] for target in body.get("targets", []) if target.get("target")]
+    try:
+        timestamps, values = balance_store.query(
+            targets,
+            parse_grafana_time(time_range.get("from"), now - pd.Timedelta(days=365)),
+            parse_grafana_time(time_range.get("to"), now),
+            interval_ms=body.get("intervalMs"),
+            max_points=body.get("maxDataPoints"),
+        )
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify([
+        {"target": target, "datapoints": [list(point) for point in zip(values[target], timestamps)]}
+        for target in targets
+    ]), 200
+
+
+@app.route('/grafana/series', methods=['GET'])
+def grafana_series():
+    """
+    Infinity データソース: accounts（カンマ区切りの英語名）の残高と収支を、1日（または間引いた区間）1行の表で返す
+    例: /grafana/series?accounts=wallet,bank&from=${__from}&to=${__to}&maxDataPoints=500
+    """
+    grafana_api_enabled()
+    accounts = [account for account in request.args.get("accounts", "").split(",") if account]
+    series = [f"{account}_{value}" for account in accounts for value in ["balance", "flow"]]
+    now = pd.Timestamp.now(tz='UTC')
+    try:
+        timestamps, values = balance_store.query(
+            series,
+            parse_grafana_time(request.args.get("from"), now - pd.Timedelta(days=365)),
+            parse_grafana_time(request.args.get("to"), now),
+            interval_ms=request.args.get("intervalMs", type=int),
+            max_points=request.args.get("maxDataPoints", type=int),
+        )
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify([
+        {"time": timestamp, **{name: values[name][i] for name in series}}
+        for i, timestamp in enumerate(timestamps)
+    ]), 200
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5001, debug=False)